@@ -0,0 +1,216 @@
+"""
+Motor de reglas de alerta declarativas (alert_rules.json) con overrides por contenedor
+
+Las reglas se compilan una sola vez en arreglos NumPy (una fila por regla) y se
+evalúan juntas sobre todo el snapshot de la flota: agregar reglas o
+contenedores no agrega código ni pasadas por regla.
+
+Tipos de regla:
+- "threshold": valor actual de `metric` comparado con `value` (op: >=, >, <=, <, ==, !=).
+  Se resuelve cuando sale de la condición por más de `clear_margin`.
+- "drop": caída de `metric` respecto al snapshot anterior, absoluta o en % (`percent`).
+  `increase_metric` cuenta también el aumento de otra métrica (ej: mineros offline).
+  Se resuelve cuando vuelve a (100 - `clear_percent`)% del valor previo.
+
+Overrides: {"containers": {"C02": {"temp": {"value": 58}, "power": {"enabled": false}}}}
+"""
+import os
+import json
+import math
+import operator
+from pathlib import Path
+
+import numpy as np
+
+DEFAULT_RULES_FILE = Path(__file__).parent / "alert_rules.json"
+
+OPERATORS = {">=": operator.ge, ">": operator.gt, "<=": operator.le,
+             "<": operator.lt, "==": operator.eq, "!=": operator.ne}
+KINDS = ("threshold", "drop")
+
+
+class RuleConfigError(Exception):
+    """Regla mal definida en alert_rules.json"""
+
+
+def _to_float(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return math.nan
+    return float(value)
+
+
+def _clean(value):
+    """3.0 -> 3 para los mensajes (caídas y umbrales)"""
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+class RuleEngine:
+    """
+    Args:
+        config: {"rules": {tipo: regla}, "containers": {contenedor: {tipo: override}}}
+    """
+
+    def __init__(self, config):
+        rules = config.get("rules") or {}
+        if not rules:
+            raise RuleConfigError("alert_rules: no hay reglas definidas")
+        self.overrides = config.get("containers") or {}
+
+        self.types = list(rules)
+        self.rules = []
+        for alert_type in self.types:
+            rule = dict(rules[alert_type])
+            if rule.get("kind") not in KINDS:
+                raise RuleConfigError(f"alert_rules: tipo desconocido en '{alert_type}': {rule.get('kind')}")
+            if rule["kind"] == "threshold" and rule.get("op") not in OPERATORS:
+                raise RuleConfigError(f"alert_rules: operador inválido en '{alert_type}': {rule.get('op')}")
+            if not all(k in rule for k in ("metric", "value", "message")):
+                raise RuleConfigError(f"alert_rules: '{alert_type}' necesita metric, value y message")
+            self.rules.append(rule)
+
+        for container, per_type in self.overrides.items():
+            unknown = set(per_type) - set(self.types)
+            if unknown:
+                raise RuleConfigError(f"alert_rules: {container} tiene overrides de reglas inexistentes: {sorted(unknown)}")
+
+        # Métricas leídas del snapshot (una fila de la matriz por métrica)
+        metrics = []
+        for rule in self.rules:
+            for key in ("metric", "increase_metric"):
+                if rule.get(key) and rule[key] not in metrics:
+                    metrics.append(rule[key])
+        self.metrics = metrics
+
+        # Vectores por regla (compilados una vez)
+        self.metric_idx = np.array([metrics.index(r["metric"]) for r in self.rules])
+        self.increase_idx = np.array([metrics.index(r["increase_metric"]) if r.get("increase_metric") else -1
+                                      for r in self.rules])
+        self.is_drop = np.array([r["kind"] == "drop" for r in self.rules])
+        self.is_percent = np.array([bool(r.get("percent")) for r in self.rules])
+        self.op_masks = {op: np.array([r.get("op") == op for r in self.rules]) for op in OPERATORS}
+        self._columns = {}
+
+        self.labels = {t: r.get("label", t) for t, r in zip(self.types, self.rules)}
+        self.edge_types = tuple(t for t, r in zip(self.types, self.rules) if r["kind"] == "drop")
+        self.clear_checks = {t: self._clear_check(i) for i, t in enumerate(self.types)}
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def rule_for(self, container, index):
+        """Regla efectiva (con override) de un contenedor"""
+        rule = self.rules[index]
+        override = self.overrides.get(container, {}).get(self.types[index])
+        return {**rule, **override} if override else rule
+
+    def _column(self, container):
+        """Umbrales del contenedor, uno por regla (NaN = regla deshabilitada)"""
+        column = self._columns.get(container)
+        if column is None:
+            column = np.array([
+                float(r["value"]) if r.get("enabled", True) else math.nan
+                for r in (self.rule_for(container, i) for i in range(len(self.rules)))
+            ])
+            self._columns[container] = column
+        return column
+
+    def _matrix(self, state, containers):
+        """Métricas x contenedores (NaN para valores faltantes o no numéricos como "N/A")"""
+        return np.array([[_to_float((state.get(c) or {}).get(m)) for c in containers]
+                         for m in self.metrics]).reshape(len(self.metrics), len(containers))
+
+    def evaluate(self, old_state, new_state):
+        """
+        Evalúa todas las reglas sobre todos los contenedores de una vez
+
+        Returns:
+            eventos [{"container", "type", "message", "baseline"}] para el AlertTracker
+        """
+        containers = [c for c, d in new_state.items() if isinstance(d, dict)]
+        if not containers:
+            return []
+
+        current = self._matrix(new_state, containers)
+        previous = self._matrix(old_state, containers)
+        thresholds = np.column_stack([self._column(c) for c in containers])  # reglas x contenedores
+
+        value = current[self.metric_idx]
+        prev = previous[self.metric_idx]
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            # Umbral: cada regla con su operador
+            threshold_hit = np.zeros_like(value, dtype=bool)
+            for op, mask in self.op_masks.items():
+                if mask.any():
+                    threshold_hit[mask] = OPERATORS[op](value[mask], thresholds[mask])
+            # Código ausente (None) cuenta como distinto de cualquier valor
+            if self.op_masks["!="].any():
+                ne = self.op_masks["!="]
+                threshold_hit[ne] |= np.isnan(value[ne])
+
+            # Caída respecto al snapshot anterior (absoluta o %)
+            change = np.where(self.is_percent[:, None], (prev - value) / prev * 100, prev - value)
+            has_increase = self.increase_idx >= 0
+            if has_increase.any():
+                inc_idx = np.where(has_increase, self.increase_idx, 0)
+                increase = np.where(has_increase[:, None], current[inc_idx] - previous[inc_idx], np.nan)
+                change = np.fmax(change, increase)
+                prev_valid = (prev > 0) | (has_increase[:, None] & (previous[inc_idx] > 0))
+            else:
+                prev_valid = prev > 0
+            # En % se exige potencia actual > 0 (una caída a 0 la cubre la alerta OFFLINE)
+            prev_valid &= ~self.is_percent[:, None] | (value > 0)
+            drop_hit = prev_valid & (change >= thresholds)
+
+        fired = np.where(self.is_drop[:, None], drop_hit, threshold_hit) & ~np.isnan(thresholds)
+
+        events = []
+        # Orden de salida: por contenedor y luego por regla, como en el snapshot
+        for c_idx, r_idx in sorted(zip(*np.nonzero(fired.T))):
+            container = containers[c_idx]
+            rule = self.rule_for(container, r_idx)
+            data = new_state.get(container) or {}
+            raw_value = data.get(rule["metric"])
+            raw_prev = (old_state.get(container) or {}).get(rule["metric"])
+            fields = {**data, "container": container, "value": raw_value,
+                      "previous": raw_prev, "threshold": _clean(rule["value"]),
+                      "change": _clean(float(change[r_idx, c_idx])) if rule["kind"] == "drop" else None}
+            events.append({
+                "container": container,
+                "type": self.types[r_idx],
+                "message": rule["message"].format(**fields),
+                "baseline": raw_prev if rule["kind"] == "drop" else None,
+            })
+        return events
+
+    def _clear_check(self, index):
+        """Chequeo de despeje (histéresis) para el AlertTracker, con los umbrales del contenedor"""
+        def check(data, entry):
+            rule = self.rule_for(entry.get("container"), index)
+            value = _to_float(data.get(rule["metric"]))
+            if rule["kind"] == "drop":
+                baseline = entry.get("baseline")
+                if not baseline or math.isnan(value):
+                    return False
+                return value >= baseline * (1 - rule.get("clear_percent", 0) / 100)
+
+            op, threshold = rule["op"], float(rule["value"])
+            margin = rule.get("clear_margin", 0)
+            if op in (">=", ">"):
+                return not math.isnan(value) and value < threshold - margin
+            if op in ("<=", "<"):
+                return not math.isnan(value) and value > threshold + margin
+            return not math.isnan(value) and not OPERATORS[op](value, threshold)
+        return check
+
+
+def load_rules(path=None):
+    """Carga y compila las reglas (una vez por ejecución). Ruta: ALERT_RULES_FILE o alert_rules.json"""
+    engine = RuleEngine.from_file(path or os.environ.get("ALERT_RULES_FILE") or DEFAULT_RULES_FILE)
+    print(f"📐 Reglas de alerta: {len(engine.types)} ({', '.join(engine.types)}), "
+          f"overrides para {len(engine.overrides)} contenedor(es)")
+    return engine
@@ -0,0 +1,154 @@
+"""
+Máquina de estados de alertas por contenedor y tipo: OK -> FIRING -> RESUELTA
+
+- Una alerta nueva se notifica una vez; mientras siga activa solo se repite
+  cada `renotify_minutes` (no en cada ejecución)
+- Sale de FIRING cuando su chequeo de "despeje" lo indica (histéresis), y en
+  ese momento se envía una notificación de resuelta
+- Se persiste compacto: solo las alertas activas, {"C01|temp": [desde, última_notif, base]}
+"""
+from datetime import datetime
+
+ALERT_STATE_FILE = "alert_state.json"
+
+ALERT_LABELS = {
+    "offline": "Contenedor OFFLINE",
+    "temp": "Temperatura alta",
+    "miners": "Mineros caídos",
+    "power": "Potencia anormal",
+    "anomaly_oil_temp": "Anomalía temp. aceite",
+    "anomaly_container_temp": "Anomalía temp. contenedor",
+    "anomaly_hashrate_ph": "Anomalía hashrate",
+    "anomaly_power_kw": "Anomalía potencia",
+    "anomaly_miner_online": "Anomalía mineros online",
+    "forecast_oil_temp": "Pronóstico temp. aceite",
+    "forecast_container_temp": "Pronóstico temp. contenedor",
+    "miners_window": "Desgaste de mineros",
+    "miners_flap": "Mineros intermitentes",
+}
+
+
+def _format_duration(seconds):
+    minutes = int(seconds // 60)
+    if minutes < 60:
+        return f"{minutes} min"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 48:
+        return f"{hours} h {minutes} min"
+    return f"{hours // 24} días"
+
+
+class AlertTracker:
+    """
+    Args:
+        data: estado persistido ({clave: [desde, última_notif, base]})
+        renotify_minutes: cada cuánto repetir una alerta que sigue activa (0 = nunca)
+        clear_checks: {tipo: f(datos_contenedor, entrada) -> bool} indica si la alerta se despejó
+            (entrada: {container, since, notified, baseline}).
+            Los tipos sin chequeo se despejan cuando dejan de detectarse.
+        edge_types: tipos que representan un cambio (ej: caída de mineros); cada
+            detección nueva se notifica aunque la alerta ya esté activa
+        labels: {tipo: nombre} para los mensajes de resuelta (se suman a ALERT_LABELS)
+    """
+
+    def __init__(self, data=None, renotify_minutes=360, clear_checks=None, edge_types=(), labels=None):
+        self.active = dict(data or {})
+        self.renotify_seconds = renotify_minutes * 60
+        self.clear_checks = clear_checks or {}
+        self.edge_types = set(edge_types)
+        self.labels = {**ALERT_LABELS, **(labels or {})}
+        self.changed = False
+
+    @classmethod
+    def load(cls, storage, **kwargs):
+        data = storage.read_json(ALERT_STATE_FILE, {})
+        return cls(data if isinstance(data, dict) else {}, **kwargs)
+
+    def save(self, storage):
+        """Guarda solo si hubo cambios"""
+        if self.changed:
+            storage.write_json(ALERT_STATE_FILE, self.active)
+            self.changed = False
+
+    @staticmethod
+    def key(container, alert_type):
+        return f"{container}|{alert_type}"
+
+    def entry(self, container, alert_type):
+        """Entrada activa como dict ({since, notified, baseline}) o None"""
+        raw = self.active.get(self.key(container, alert_type))
+        if raw is None:
+            return None
+        return {"since": raw[0], "notified": raw[1], "baseline": raw[2]}
+
+    def active_containers(self, alert_type):
+        """Contenedores con una alerta activa del tipo dado"""
+        return {key.split("|", 1)[0] for key in self.active if key.split("|", 1)[1] == alert_type}
+
+    def process(self, events, snapshot, now=None):
+        """
+        Aplica las alertas detectadas en esta ejecución
+
+        Args:
+            events: [{"container", "type", "message", "baseline"(opcional)}]
+            snapshot: estado actual {contenedor: datos} para los chequeos de despeje
+            now: datetime actual
+
+        Returns:
+            lista de notificaciones {"kind": "fire"|"renotify"|"resolve", "container", "type", "message"}
+        """
+        now_ts = int((now or datetime.now()).timestamp())
+        notifications = []
+        seen = set()
+
+        for event in events:
+            container, alert_type = event["container"], event["type"]
+            key = self.key(container, alert_type)
+            seen.add(key)
+            raw = self.active.get(key)
+
+            if raw is None:
+                self.active[key] = [now_ts, now_ts, event.get("baseline")]
+                self.changed = True
+                notifications.append(self._notification("fire", event, event["message"]))
+            elif alert_type in self.edge_types:
+                raw[1] = now_ts
+                self.changed = True
+                notifications.append(self._notification("fire", event, event["message"]))
+            elif self.renotify_seconds and now_ts - raw[1] >= self.renotify_seconds:
+                raw[1] = now_ts
+                self.changed = True
+                duration = _format_duration(now_ts - raw[0])
+                notifications.append(self._notification(
+                    "renotify", event, f"🔁 PERSISTE ({duration}): {event['message']}"))
+
+        for key in list(self.active):
+            if key in seen:
+                continue
+            container, alert_type = key.split("|", 1)
+            data = snapshot.get(container)
+            if data is None:
+                continue  # Sin datos del contenedor en esta ejecución: mantener estado
+
+            check = self.clear_checks.get(alert_type)
+            raw = self.active[key]
+            entry = {"container": container, "since": raw[0], "notified": raw[1], "baseline": raw[2]}
+            if check is not None and not check(data, entry):
+                continue  # Histéresis: todavía no volvió a la zona normal
+
+            del self.active[key]
+            self.changed = True
+            label = self.labels.get(alert_type, alert_type)
+            duration = _format_duration(now_ts - raw[0])
+            notifications.append({
+                "kind": "resolve",
+                "container": container,
+                "type": alert_type,
+                "message": f"✅ RESUELTA: {container} - {label} (duró {duration})",
+            })
+
+        return notifications
+
+    @staticmethod
+    def _notification(kind, event, message):
+        return {"kind": kind, "container": event["container"], "type": event["type"], "message": message}
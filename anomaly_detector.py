@@ -0,0 +1,206 @@
+"""
+Detección de anomalías por contenedor y métrica con EWMA (media y varianza móviles)
+
+A diferencia de los umbrales fijos, cada métrica se compara con su propio
+comportamiento reciente: se marca anomalía cuando una muestra se aleja más
+de `k` desvíos de la media EWMA. El estado es O(1) por contenedor y métrica
+({"C01|power_kw": [media, varianza, n]} en anomaly_state.json) y se actualiza
+con cada muestra nueva.
+
+Backtest (vectorizado sobre fbox_history.json) para ajustar parámetros:
+    python anomaly_detector.py --backtest [--alpha 0.05 0.1 0.2] [--k 3 4 5]
+"""
+import math
+import argparse
+
+ANOMALY_STATE_FILE = "anomaly_state.json"
+
+# Valores por defecto (fbox_telegram.py los toma de ANOMALY_ALPHA, ANOMALY_K y ANOMALY_WARMUP del .env)
+ANOMALY_ALPHA = 0.1
+ANOMALY_K = 4.0
+ANOMALY_WARMUP = 12  # muestras antes de empezar a alertar
+
+# Métricas vigiladas y desvío mínimo (evita alertas por ruido cuando la serie es casi constante).
+# Los mineros online no se vigilan aquí: ya los cubren la regla "miners" y el desgaste
+# en ventana (miner_window.py); una caída daría tres avisos por lo mismo
+ANOMALY_METRICS = {
+    "oil_temp": {"label": "Temp. aceite", "unit": "°C", "min_std": 0.5},
+    "container_temp": {"label": "Temp. contenedor", "unit": "°C", "min_std": 0.5},
+    "hashrate_ph": {"label": "Hashrate", "unit": " PH/s", "min_std": 0.5},
+    "power_kw": {"label": "Potencia", "unit": " kW", "min_std": 10.0},
+}
+
+
+def anomaly_type(metric):
+    """Tipo de alerta para el AlertTracker (ej: "anomaly_power_kw")"""
+    return f"anomaly_{metric}"
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return None if math.isnan(value) else float(value)
+
+
+class AnomalyDetector:
+    """
+    Args:
+        data: estado persistido {"contenedor|métrica": [media, varianza, n]}
+        alpha: peso de la muestra nueva en la EWMA (0-1; más alto = reacciona más rápido)
+        k: desvíos para considerar anomalía
+        warmup: muestras necesarias antes de alertar
+        metrics: {métrica: {"label", "unit", "min_std"}}
+    """
+
+    def __init__(self, data=None, alpha=ANOMALY_ALPHA, k=ANOMALY_K, warmup=ANOMALY_WARMUP,
+                 metrics=None):
+        self.state = dict(data) if isinstance(data, dict) else {}
+        self.alpha = alpha
+        self.k = k
+        self.warmup = warmup
+        self.metrics = metrics or ANOMALY_METRICS
+        self.changed = False
+
+    @classmethod
+    def load(cls, storage, **kwargs):
+        return cls(storage.read_json(ANOMALY_STATE_FILE, {}), **kwargs)
+
+    def save(self, storage):
+        """Guarda solo si hubo cambios"""
+        if self.changed:
+            storage.write_json(ANOMALY_STATE_FILE, self.state)
+            self.changed = False
+
+    def update(self, container, metric, value):
+        """
+        Compara la muestra con la EWMA actual y luego actualiza el estado
+
+        Returns:
+            (z, media, desvío) antes de actualizar; z es None durante el calentamiento
+        """
+        key = f"{container}|{metric}"
+        entry = self.state.get(key)
+        self.changed = True
+        if entry is None:
+            self.state[key] = [value, 0.0, 1]
+            return None, value, 0.0
+
+        mean, var, n = entry
+        std = max(math.sqrt(var), self.metrics[metric]["min_std"])
+        z = (value - mean) / std if n >= self.warmup else None
+
+        diff = value - mean
+        incr = self.alpha * diff
+        mean += incr
+        var = (1 - self.alpha) * (var + diff * incr)
+        self.state[key] = [round(mean, 4), round(var, 4), n + 1]
+        return z, entry[0], std
+
+    def process(self, snapshot):
+        """
+        Actualiza con el snapshot {contenedor: datos} y retorna eventos de anomalía
+        ({container, type, message, baseline}) para el AlertTracker.
+        Los contenedores OFFLINE no actualizan el estado (ya tienen su propia alerta).
+        """
+        events = []
+        for container, data in snapshot.items():
+            if not isinstance(data, dict) or data.get("code") != 1:
+                continue
+            for metric, conf in self.metrics.items():
+                value = _number(data.get(metric))
+                if value is None:
+                    continue
+                z, mean, std = self.update(container, metric, value)
+                if z is None or abs(z) < self.k:
+                    continue
+                arrow = "📈" if z > 0 else "📉"
+                events.append({
+                    "container": container,
+                    "type": anomaly_type(metric),
+                    "message": (f"{arrow} ANOMALÍA: {container} - {conf['label']} {round(value, 1):g}{conf['unit']} "
+                                f"(esperado {mean:.1f} ± {std:.1f}{conf['unit']}, z={z:+.1f})"),
+                    "baseline": round(mean, 2),
+                })
+        return events
+
+
+# ============ BACKTEST ============
+def backtest(history, alpha=ANOMALY_ALPHA, k=ANOMALY_K, warmup=ANOMALY_WARMUP, metrics=None):
+    """
+    Reproduce el historial con la misma recursión EWMA que AnomalyDetector, vectorizado
+
+    Returns:
+        DataFrame con una fila por (contenedor, métrica): muestras y anomalías detectadas
+    """
+    import numpy as np
+    import pandas as pd
+    from fleet_analytics import history_to_frame
+
+    metrics = metrics or ANOMALY_METRICS
+    df = history_to_frame(history)
+    if not df.empty:
+        df = df[df["code"] == 1]
+    rows = []
+    if df.empty:
+        return pd.DataFrame(rows, columns=["container", "metric", "samples", "anomalies", "rate %"])
+
+    for metric, conf in metrics.items():
+        values = df[metric]
+        valid = values.notna()
+        series = values[valid]
+        by_container = series.groupby(df.loc[valid, "container"])
+        ewm = by_container.ewm(alpha=alpha, adjust=False)
+        # Estado previo a cada muestra: EWMA desplazada una posición por contenedor
+        mean = ewm.mean().groupby(level=0).shift(1).droplevel(0)
+        var = ewm.var(bias=True).groupby(level=0).shift(1).droplevel(0)
+        position = by_container.cumcount()
+        std = np.maximum(np.sqrt(var.fillna(0)), conf["min_std"])
+        z = (series - mean) / std
+        flagged = (position >= warmup) & (z.abs() >= k)
+
+        counts = flagged.groupby(df.loc[valid, "container"]).agg(["size", "sum"])
+        for container, (samples, anomalies) in counts.iterrows():
+            rows.append({
+                "container": container, "metric": metric,
+                "samples": int(samples), "anomalies": int(anomalies),
+                "rate %": round(anomalies / samples * 100, 2) if samples else 0.0,
+            })
+    return pd.DataFrame(rows, columns=["container", "metric", "samples", "anomalies", "rate %"])
+
+
+def backtest_grid(history, alphas, ks, warmup=ANOMALY_WARMUP):
+    """Anomalías totales por métrica para cada combinación (alpha, k)"""
+    import pandas as pd
+
+    results = []
+    for alpha in alphas:
+        for k in ks:
+            result = backtest(history, alpha=alpha, k=k, warmup=warmup)
+            totals = result.groupby("metric")["anomalies"].sum()
+            results.append({"alpha": alpha, "k": k, **totals.to_dict(), "total": int(totals.sum())})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Detección de anomalías EWMA sobre el historial FBOX")
+    parser.add_argument("--backtest", action="store_true", help="Reproducir fbox_history.json")
+    parser.add_argument("--alpha", type=float, nargs="+", default=[ANOMALY_ALPHA],
+                        help="Valores de alpha a probar")
+    parser.add_argument("--k", type=float, nargs="+", default=[ANOMALY_K],
+                        help="Valores de k (desvíos) a probar")
+    parser.add_argument("--warmup", type=int, default=ANOMALY_WARMUP,
+                        help="Muestras de calentamiento")
+    args = parser.parse_args()
+
+    if not args.backtest:
+        parser.print_help()
+        raise SystemExit(0)
+
+    from storage import default_storage
+    history = default_storage().read_json("fbox_history.json", []) or []
+    print(f"📂 Historial: {len(history)} registros")
+
+    if len(args.alpha) == 1 and len(args.k) == 1:
+        print(backtest(history, alpha=args.alpha[0], k=args.k[0], warmup=args.warmup).to_string(index=False))
+    else:
+        print(backtest_grid(history, args.alpha, args.k, warmup=args.warmup).to_string(index=False))
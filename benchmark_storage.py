@@ -0,0 +1,115 @@
+"""
+Benchmark de backends de almacenamiento (storage.py)
+Mide latencia y throughput de lectura, escritura y append para cada backend
+
+Uso: python benchmark_storage.py [--iterations 50] [--size 200000] [--latency 0.15] [--json salida.json]
+"""
+import argparse
+import json
+import statistics
+import tempfile
+import time
+
+from storage import LocalStorage, MemoryStorage, get_storage
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def _measure(fn, iterations, payload_size):
+    """Ejecuta fn iterations veces y retorna estadísticas de latencia y throughput"""
+    latencies = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - start)
+
+    total = sum(latencies)
+    return {
+        "ops": iterations,
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 3),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 3),
+        "max_ms": round(max(latencies) * 1000, 3),
+        "ops_per_s": round(iterations / total, 1) if total else None,
+        "mb_per_s": round(iterations * payload_size / total / 1e6, 2) if total and payload_size else None,
+    }
+
+
+def benchmark_backend(backend, iterations=50, size=200_000, record_size=200):
+    """Mide write/read/append de un backend y limpia los archivos de prueba"""
+    payload = b"x" * size
+    record = {"timestamp": "2026-01-01T00:00:00-03:00", "data": "y" * max(0, record_size - 50)}
+    blob_name = "__bench_blob.bin"
+    jsonl_name = "__bench_append.jsonl"
+
+    results = {}
+    try:
+        results["write"] = _measure(lambda i: backend.write_bytes(blob_name, payload), iterations, size)
+        results["read"] = _measure(lambda i: backend.read_bytes(blob_name), iterations, size)
+        results["append"] = _measure(lambda i: backend.append_jsonl(jsonl_name, record), iterations, record_size)
+    finally:
+        backend.delete(blob_name)
+        backend.delete(jsonl_name)
+    return results
+
+
+def build_backends(latency, jitter, bandwidth, include_remote):
+    backends = {
+        "local": LocalStorage(tempfile.mkdtemp(prefix="fbox_bench_")),
+        "memory": MemoryStorage(),
+        "fake-remote": MemoryStorage(latency=latency, jitter=jitter, bandwidth=bandwidth),
+    }
+    if include_remote:
+        remote = get_storage("dropbox")
+        if remote.name != "local":
+            backends["dropbox"] = remote
+        else:
+            print("⚠️ Dropbox API no disponible, se omite")
+    return backends
+
+
+def print_table(results):
+    print(f"\n{'Backend':<12} {'Op':<7} {'mean ms':>9} {'p95 ms':>9} {'ops/s':>9} {'MB/s':>8}")
+    print("━" * 58)
+    for backend_name, ops in results.items():
+        for op, stats in ops.items():
+            mb = stats["mb_per_s"] if stats["mb_per_s"] is not None else "-"
+            print(f"{backend_name:<12} {op:<7} {stats['mean_ms']:>9} {stats['p95_ms']:>9} "
+                  f"{stats['ops_per_s']:>9} {mb:>8}")
+    print()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark de backends de almacenamiento FBOX')
+    parser.add_argument('--iterations', type=int, default=50,
+                        help='Operaciones por prueba')
+    parser.add_argument('--size', type=int, default=200_000,
+                        help='Tamaño en bytes del archivo para read/write (~historial de 7 días)')
+    parser.add_argument('--latency', type=float, default=0.15,
+                        help='Latencia fija (s) del backend fake-remote')
+    parser.add_argument('--jitter', type=float, default=0.05,
+                        help='Latencia aleatoria adicional (s) del backend fake-remote')
+    parser.add_argument('--bandwidth', type=float, default=5e6,
+                        help='Ancho de banda (bytes/s) del backend fake-remote')
+    parser.add_argument('--dropbox', action='store_true',
+                        help='Incluir Dropbox API real (requiere DROPBOX_ACCESS_TOKEN)')
+    parser.add_argument('--json', type=str, default=None,
+                        help='Guardar resultados en un archivo JSON')
+
+    args = parser.parse_args()
+
+    results = {}
+    for name, backend in build_backends(args.latency, args.jitter, args.bandwidth, args.dropbox).items():
+        print(f"⏱️ Midiendo backend: {name}")
+        results[name] = benchmark_backend(backend, iterations=args.iterations, size=args.size)
+
+    print_table(results)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"params": vars(args), "results": results}, f, indent=2)
+        print(f"✅ Resultados guardados en: {args.json}")
@@ -0,0 +1,331 @@
+"""
+Benchmark de punta a punta: poll -> detección -> persistencia -> reportes
+
+Genera flotas e historiales sintéticos de varios tamaños y mide las rutas
+calientes contra servidores locales que imitan FBox (fbox_mock_server.py) y la
+API de Telegram, sin red ni Dropbox. Cada escenario corre en una carpeta
+temporal propia. El resultado es un JSON comparable entre versiones.
+
+Fases medidas por escenario (contenedores x días de historial):
+- check_status: poll de todos los contenedores al FBox simulado
+- detect_alerts: reglas de alerta entre dos estados consecutivos
+- save_to_history: escritura del historial (+ analítica y agregados semanales)
+- send_report: envío del reporte por la cola de Telegram
+- get_alerts_summary: resumen de alertas del día (comando /resumen del bot)
+- excel_historial / excel_alertas: los dos generadores de Excel
+
+Uso:
+    python benchmark_suite.py [--containers 2 50 500] [--days 1 30 365] [--json resultado.json]
+    python benchmark_suite.py --quick --json antes.json
+    python benchmark_suite.py --compare antes.json despues.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+from benchmark_storage import _measure
+from fbox_mock_server import start_mock_server, start_telegram_stand_in, container_names
+
+PARAGUAY_TZ = ZoneInfo("America/Asuncion")
+SAMPLE_INTERVAL_MIN = 60       # una muestra por hora, como el workflow (cron "0 * * * *"); --interval
+MAX_CONTAINER_SAMPLES = 2_000_000  # escenarios más grandes se omiten (memoria / tiempo de armado)
+ALERTS_PER_DAY = 4             # alertas sintéticas por contenedor y día
+REGRESSION_PCT = 20            # --compare: más lento que esto (%) se marca como regresión
+
+ALERT_TEMPLATES = (
+    "🚨 CRÍTICO: {c} está OFFLINE",
+    "⚠️ TEMPERATURA ALTA: {c} - 56.2°C (umbral: 55°C)",
+    "⚠️ 🔻 ALERTA: MINEROS CAÍDOS\n📍 Contenedor: {c}\n📉 Cantidad caída: 2 minero(s)",
+    "⚡ POTENCIA ANORMAL: {c} - Cayó 35.0% (900 → 585 kW)",
+    "🔥 PUNTO CALIENTE: {c} - tanque Tanque 3 a 61.0°C (promedio aceite 47.5°C)",
+)
+
+
+# ---------------- Datos sintéticos ----------------
+def synthetic_state(names, rng, offline_rate=0.01):
+    """Estado {contenedor: datos} con la misma forma que el de check_status()"""
+    state = {}
+    for i, name in enumerate(names):
+        if rng.random() < offline_rate:
+            state[name] = {"code": 0, "miner_online": "N/A", "miner_offline": "N/A", "oil_temp": None,
+                           "container_temp": None, "hashrate_ph": None, "power_kw": None}
+            continue
+        oil = round(45 + (i % 7) + rng.gauss(0, 1.5), 1)
+        online = 160 - rng.randrange(0, 4)
+        tanks = [round(oil + t * 0.8 + rng.gauss(0, 0.5), 1) for t in range(4)]
+        state[name] = {
+            "code": 1,
+            "miner_online": online,
+            "miner_offline": 160 - online,
+            "oil_temp": oil,
+            "container_temp": round(oil - 8, 1),
+            "hashrate_ph": round(online * 0.295, 2),
+            "power_kw": round(online * 5.6 + rng.gauss(0, 5), 1),
+            "sub_boxes": {"names": [f"Tanque {t + 1}" for t in range(4)], "max": tanks,
+                          "p95": tanks, "spread": [0.6] * 4, "sensors": [[t] for t in tanks]},
+            "oil_temp_max": max(tanks),
+            "oil_temp_p95": max(tanks),
+            "oil_spread": round(tanks[-1] - tanks[0], 1),
+            "hotspot": "Tanque 4",
+            "hotspot_sensor": 1,
+        }
+    return state
+
+
+def synthetic_history(names, days, rng, interval_min=SAMPLE_INTERVAL_MIN, now=None):
+    """Historial de estados de `days` días (una muestra cada `interval_min`) que termina ahora"""
+    now = now or datetime.now(PARAGUAY_TZ)
+    samples = max(1, days * 24 * 60 // interval_min)
+    start = now - timedelta(minutes=interval_min * samples)
+    return [{"timestamp": (start + timedelta(minutes=interval_min * (i + 1))).isoformat(),
+             "data": synthetic_state(names, rng)}
+            for i in range(samples)]
+
+
+def synthetic_alerts(names, days, rng, per_day=ALERTS_PER_DAY, now=None):
+    """Historial de alertas: `per_day` alertas por contenedor y día, repartidas al azar"""
+    now = now or datetime.now(PARAGUAY_TZ)
+    total = max(1, int(len(names) * days * per_day))
+    offsets = sorted(rng.uniform(0, days * 86400) for _ in range(total))
+    return [{"timestamp": (now - timedelta(seconds=days * 86400 - s)).isoformat(),
+             "alerts": [rng.choice(ALERT_TEMPLATES).format(c=rng.choice(names))]}
+            for s in offsets]
+
+
+# ---------------- Escenarios ----------------
+def configure(workdir, fbox_url, containers, telegram_url):
+    """Apunta los módulos del monitor a la carpeta temporal y a los servidores simulados"""
+    import storage as storage_module
+    import fbox_client
+    import fbox_telegram
+    import telegram_sender
+
+    backend = storage_module.LocalStorage(workdir)
+    storage_module._default_storage = backend
+    fbox_telegram.storage = backend
+    fbox_client.FBOX_BASE_URL = fbox_url
+    fbox_client.FBOX_CONTAINERS = containers
+    # El .env de desarrollo se carga al importar fbox_telegram: se pisa después
+    os.environ["TELEGRAM_API_URL"] = telegram_url
+    os.environ["BOT_TOKEN"] = "benchmark"
+    telegram_sender._sender = None
+    return fbox_telegram, backend
+
+
+def run_scenario(n_containers, days, iterations, excel_iterations, seed, fbox_latency, telegram_url,
+                 interval_min=SAMPLE_INTERVAL_MIN):
+    """Arma un escenario (flota + historial) y mide cada fase"""
+    import fbox_telegram
+    from generate_excel_report import generate_excel
+    from generate_alerts_excel import generate_excel_report
+    from telegram_bot_handler import get_alerts_summary
+
+    rng = random.Random(seed)
+    containers = container_names(n_containers)
+    names = list(containers)
+    server, fbox_url = start_mock_server(containers=n_containers, latency=fbox_latency, seed=seed)
+    workdir = tempfile.mkdtemp(prefix=f"fbox_bench_{n_containers}c_{days}d_")
+    fbox_telegram, backend = configure(workdir, fbox_url, containers, telegram_url)
+    out = Path(workdir)
+    results = {}
+
+    try:
+        setup_start = time.perf_counter()
+        history = synthetic_history(names, days, rng, interval_min)
+        backend.write_json(fbox_telegram.HISTORY_FILE, history)
+        backend.write_json(fbox_telegram.ALERTS_HISTORY_FILE, synthetic_alerts(names, days, rng))
+        setup_s = time.perf_counter() - setup_start
+
+        state = {}
+
+        def poll(i):
+            nonlocal state
+            _, state = fbox_telegram.check_status()
+
+        results["check_status"] = _measure(poll, iterations, 0)
+
+        states = [synthetic_state(names, rng, offline_rate=0.05) for _ in range(iterations + 1)]
+        results["detect_alerts"] = _measure(
+            lambda i: fbox_telegram.detect_alerts(states[i], states[i + 1]), iterations, 0)
+
+        # La primera escritura siembra analítica y agregados semanales desde el historial completo
+        results["save_to_history_first"] = _measure(lambda i: fbox_telegram.save_to_history(state), 1, 0)
+        results["save_to_history"] = _measure(lambda i: fbox_telegram.save_to_history(state), iterations, 0)
+
+        # Un chat distinto por envío: si no, mide el límite de 1 msg/s por chat y no el envío
+        msg, _ = fbox_telegram.check_status()
+
+        def send_report(i):
+            fbox_telegram.CHAT_ID = str(1000 + i)
+            fbox_telegram.send_telegram(msg)
+
+        results["send_report"] = _measure(send_report, iterations, 0)
+
+        results["get_alerts_summary"] = _measure(lambda i: get_alerts_summary(), iterations, 0)
+
+        # Los generadores leen el historial completo del escenario (se vuelve a escribir:
+        # save_to_history lo recorta a 7 días)
+        backend.write_json(fbox_telegram.HISTORY_FILE, history)
+        results["excel_historial"] = _measure(
+            lambda i: generate_excel(output_file=str(out / f"historial_{i}.xlsx")), excel_iterations, 0)
+        results["excel_alertas"] = _measure(
+            lambda i: generate_excel_report(days=0, output_file=str(out / f"alertas_{i}.xlsx")),
+            excel_iterations, 0)
+    finally:
+        server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for stats in results.values():
+        stats.pop("mb_per_s", None)
+    return {
+        "containers": n_containers,
+        "days": days,
+        "history_records": len(history),
+        "setup_s": round(setup_s, 2),
+        "fbox_requests": server.fbox.stats["requests"],
+        "phases": results,
+    }
+
+
+def run_suite(fleets, day_options, iterations=5, excel_iterations=1, seed=42, fbox_latency=0.0,
+              telegram_latency=0.0, max_samples=MAX_CONTAINER_SAMPLES, verbose=False,
+              interval_min=SAMPLE_INTERVAL_MIN):
+    """Corre todos los escenarios. Retorna el reporte (dict serializable)"""
+    import contextlib
+    import io
+
+    telegram_server, telegram_url = start_telegram_stand_in(telegram_latency)
+    scenarios = []
+    try:
+        for n_containers in fleets:
+            for days in day_options:
+                key = f"{n_containers}c_{days}d"
+                samples = n_containers * days * 24 * 60 // interval_min
+                if samples > max_samples:
+                    print(f"⏭️ {key}: {samples:,} muestras de contenedor > {max_samples:,}, se omite")
+                    scenarios.append({"key": key, "containers": n_containers, "days": days,
+                                      "skipped": f"{samples} muestras > max_samples"})
+                    continue
+                print(f"⏱️ Escenario {key} ({samples:,} muestras de contenedor)")
+                # Los módulos imprimen en cada operación: se silencian salvo --verbose
+                sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+                with sink:
+                    result = run_scenario(n_containers, days, iterations, excel_iterations, seed,
+                                          fbox_latency, telegram_url, interval_min)
+                scenarios.append({"key": key, **result})
+    finally:
+        telegram_server.shutdown()
+
+    return {
+        "timestamp": datetime.now(PARAGUAY_TZ).isoformat(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "params": {"iterations": iterations, "excel_iterations": excel_iterations, "seed": seed,
+                   "fbox_latency": fbox_latency, "telegram_latency": telegram_latency,
+                   "sample_interval_min": interval_min},
+        "telegram_calls": telegram_server.calls,
+        "scenarios": scenarios,
+    }
+
+
+def print_table(report):
+    print(f"\n{'Escenario':<12} {'Fase':<22} {'mean ms':>10} {'p95 ms':>10} {'ops/s':>9}")
+    print("━" * 67)
+    for scenario in report["scenarios"]:
+        if "skipped" in scenario:
+            print(f"{scenario['key']:<12} {'(omitido)':<22}")
+            continue
+        for phase, stats in scenario["phases"].items():
+            print(f"{scenario['key']:<12} {phase:<22} {stats['mean_ms']:>10} {stats['p95_ms']:>10} "
+                  f"{stats['ops_per_s']:>9}")
+    print()
+
+
+def compare_reports(before, after, threshold=REGRESSION_PCT):
+    """
+    Compara dos reportes por escenario y fase (p50)
+
+    Returns:
+        lista de (escenario, fase, p50 antes, p50 después, % de cambio, es_regresión)
+    """
+    old = {s["key"]: s for s in before["scenarios"] if "phases" in s}
+    rows = []
+    for scenario in after["scenarios"]:
+        base = old.get(scenario["key"])
+        if base is None or "phases" not in scenario:
+            continue
+        for phase, stats in scenario["phases"].items():
+            if phase not in base["phases"]:
+                continue
+            prev, curr = base["phases"][phase]["p50_ms"], stats["p50_ms"]
+            change = (curr - prev) / prev * 100 if prev else 0.0
+            rows.append((scenario["key"], phase, prev, curr, round(change, 1), change > threshold))
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark de punta a punta del monitor FBOX')
+    parser.add_argument('--containers', type=int, nargs='+', default=[2, 50, 500],
+                        help='Tamaños de flota')
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 30, 365],
+                        help='Días de historial sintético')
+    parser.add_argument('--quick', action='store_true',
+                        help='Escenarios chicos (2 y 50 contenedores, 1 y 7 días)')
+    parser.add_argument('--iterations', type=int, default=5,
+                        help='Repeticiones de cada fase')
+    parser.add_argument('--excel-iterations', type=int, default=1,
+                        help='Repeticiones de los generadores de Excel')
+    parser.add_argument('--fbox-latency', type=float, default=0.0,
+                        help='Latencia (s) de cada respuesta del FBox simulado')
+    parser.add_argument('--telegram-latency', type=float, default=0.0,
+                        help='Latencia (s) de cada respuesta de Telegram simulado')
+    parser.add_argument('--interval', type=int, default=SAMPLE_INTERVAL_MIN,
+                        help='Minutos entre muestras del historial sintético (el workflow corre cada hora)')
+    parser.add_argument('--max-samples', type=int, default=MAX_CONTAINER_SAMPLES,
+                        help='Omitir escenarios con más muestras de contenedor (contenedores x muestras)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--verbose', action='store_true',
+                        help='Mostrar la salida de los módulos medidos')
+    parser.add_argument('--json', type=str, default=None,
+                        help='Guardar resultados en un archivo JSON')
+    parser.add_argument('--compare', type=str, nargs=2, metavar=('ANTES', 'DESPUES'),
+                        help='Comparar dos reportes JSON y salir')
+
+    args = parser.parse_args()
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path, encoding='utf-8') as f:
+                reports.append(json.load(f))
+        rows = compare_reports(*reports)
+        print(f"\n{'Escenario':<12} {'Fase':<22} {'antes ms':>10} {'después ms':>11} {'cambio':>8}")
+        print("━" * 68)
+        for key, phase, prev, curr, change, regression in rows:
+            flag = " ⚠️" if regression else ""
+            print(f"{key:<12} {phase:<22} {prev:>10} {curr:>11} {change:>7}%{flag}")
+        regressions = sum(1 for row in rows if row[-1])
+        print(f"\n{'⚠️' if regressions else '✅'} {regressions} regresiones (> {REGRESSION_PCT}% más lento)")
+        raise SystemExit(1 if regressions else 0)
+
+    fleets, day_options = ([2, 50], [1, 7]) if args.quick else (args.containers, args.days)
+    report = run_suite(fleets, day_options, iterations=args.iterations,
+                       excel_iterations=args.excel_iterations, seed=args.seed,
+                       fbox_latency=args.fbox_latency, telegram_latency=args.telegram_latency,
+                       max_samples=args.max_samples, verbose=args.verbose,
+                       interval_min=max(1, args.interval))
+
+    print_table(report)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✅ Resultados guardados en: {args.json}")
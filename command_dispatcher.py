@@ -0,0 +1,85 @@
+"""
+Despachador concurrente de comandos del bot de Telegram
+
+- Los comandos se ejecutan en un pool de threads (límite global BOT_MAX_WORKERS)
+- Los comandos de un mismo chat se ejecutan en orden, uno a la vez (ligeros y
+  pesados comparten la cola del chat, así las respuestas no se adelantan)
+- Los comandos pesados (reportes Excel) ocupan como máximo BOT_MAX_HEAVY
+  workers a la vez, así siempre queda un worker libre para los rápidos
+"""
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+
+class CommandDispatcher:
+    """
+    Args:
+        handler: función handler(command, chat_id) que procesa un comando
+        max_workers: límite global de comandos ejecutándose a la vez
+        max_heavy: límite de comandos pesados a la vez (menor que max_workers)
+        is_heavy: función is_heavy(command) -> bool que clasifica el comando
+    """
+
+    def __init__(self, handler, max_workers=4, max_heavy=2, is_heavy=None):
+        self.handler = handler
+        self.max_workers = max(2, max_workers)
+        self.max_heavy = max(1, min(max_heavy, self.max_workers - 1))
+        self.is_heavy = is_heavy or (lambda command: False)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                            thread_name_prefix="bot-cmd")
+        self._lock = threading.Lock()
+        self._chats = {}              # chat_id -> deque de comandos pendientes (existe mientras hay uno en curso)
+        self._heavy_running = 0
+        self._heavy_ready = deque()   # comandos pesados (chat_id, comando) esperando un slot libre
+
+    def submit(self, command, chat_id):
+        """Encola un comando; retorna de inmediato"""
+        with self._lock:
+            pending = self._chats.get(chat_id)
+            if pending is not None:
+                # El chat ya tiene un comando en curso: esperar turno
+                pending.append(command)
+                return
+            self._chats[chat_id] = deque()
+            self._start_locked(chat_id, command)
+
+    def pending_count(self, chat_id=None):
+        """Cantidad de comandos esperando (de un chat o de todos)"""
+        with self._lock:
+            return sum(len(q) for cid, q in self._chats.items()
+                       if chat_id is None or cid == chat_id)
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=not wait)
+
+    # ---------------- Interno (llamar con self._lock tomado) ----------------
+    def _start_locked(self, chat_id, command):
+        heavy = self.is_heavy(command)
+        if heavy:
+            if self._heavy_running >= self.max_heavy:
+                self._heavy_ready.append((chat_id, command))
+                return
+            self._heavy_running += 1
+        self._executor.submit(self._execute, chat_id, command, heavy)
+
+    def _execute(self, chat_id, command, heavy):
+        try:
+            self.handler(command, chat_id)
+        except Exception as e:
+            print(f"❌ Error procesando {command} para {chat_id}: {e}")
+        finally:
+            self._finish(chat_id, heavy)
+
+    def _finish(self, chat_id, heavy):
+        with self._lock:
+            if heavy:
+                self._heavy_running -= 1
+                if self._heavy_ready:
+                    self._start_locked(*self._heavy_ready.popleft())
+
+            pending = self._chats.get(chat_id)
+            if pending:
+                self._start_locked(chat_id, pending.popleft())
+            else:
+                self._chats.pop(chat_id, None)
@@ -0,0 +1,220 @@
+"""
+Exportación de historial de estados y alertas a CSV comprimido (gzip) o Parquet
+El archivo JSON se lee por bloques y los registros se decodifican de a uno (sin
+cargar el archivo ni armar la lista completa), se descartan los anteriores al
+período pedido con el mismo corte que el reporte Excel y las filas se escriben por bloques
+
+Uso: python generate_alerts_excel.py --days 7 --export csv|parquet  (o /exportar en el bot)
+"""
+import codecs
+import csv
+import gzip
+import json
+import re
+from datetime import datetime
+
+import pandas as pd
+
+from storage import default_storage, default_local_path
+from timestamps import PARAGUAY_TZ, within_days
+
+# Parquet es opcional (pyarrow no está en requirements.txt por su tamaño)
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+HISTORY_FILE = "fbox_history.json"
+ALERTS_HISTORY_FILE = "fbox_alerts_history.json"
+EXPORT_FORMATS = ("csv", "parquet")
+CHUNK_ROWS = 50_000
+CHUNK_RECORDS = 1_000      # registros por bloque al filtrar por fecha
+READ_CHUNK_BYTES = 1 << 20  # bloque de lectura del archivo JSON
+
+HISTORY_COLUMNS = ["timestamp", "container", "code", "oil_temp", "container_temp",
+                   "miner_online", "miner_offline", "hashrate_ph", "power_kw"]
+ALERT_COLUMNS = ["timestamp", "container", "category", "alert"]
+
+HISTORY_TYPES = {
+    "timestamp": "string", "container": "string", "code": "int64",
+    "oil_temp": "float64", "container_temp": "float64",
+    "miner_online": "int64", "miner_offline": "int64",
+    "hashrate_ph": "float64", "power_kw": "float64",
+}
+ALERT_TYPES = {c: "string" for c in ALERT_COLUMNS}
+
+
+class ExportError(Exception):
+    """Error de exportación con mensaje para el usuario"""
+
+
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def iter_json_records(storage, filename, chunk_size=READ_CHUNK_BYTES):
+    """
+    Registros de un archivo JSON con una lista, decodificados de a uno a medida que
+    se lee el archivo por bloques: en memoria quedan el bloque y el registro en curso
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    chunks = storage.iter_bytes(filename, chunk_size)
+    buffer, pos, opened, done = "", 0, False, False
+    while not done:
+        chunk = next(chunks, None)
+        done = chunk is None
+        buffer = buffer[pos:] + utf8.decode(chunk or b"", final=done)
+        pos = 0
+        while True:
+            pos = _SEPARATORS.match(buffer, pos).end()
+            if pos >= len(buffer):
+                break
+            if not opened:
+                if buffer[pos] != "[":
+                    print(f"⚠️ {filename} no contiene una lista JSON")
+                    return
+                opened = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                record, pos = decoder.raw_decode(buffer, pos)
+            except ValueError as e:
+                if done:
+                    print(f"⚠️ Error leyendo {filename}: {e}")
+                    return
+                break  # registro incompleto: sigue en el próximo bloque
+            yield record
+
+
+def _number(value):
+    """Valores no numéricos ("N/A", None) se exportan vacíos"""
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def select_days(records, days):
+    """
+    Registros de los últimos `days` días (0 = todos), con el mismo corte exacto que el
+    reporte Excel (timestamps.within_days), filtrados por bloques de CHUNK_RECORDS
+    """
+    if days <= 0:
+        yield from records
+        return
+    now = datetime.now(PARAGUAY_TZ)
+    for chunk in _chunks(records, CHUNK_RECORDS):
+        keep = within_days(pd.Series([r.get("timestamp", "") for r in chunk], dtype=object), days, now)
+        yield from (record for record, k in zip(chunk, keep) if k)
+
+
+def iter_history_rows(history, days=0):
+    """Una fila por contenedor y registro del historial de estados (history: lista o iterador)"""
+    for record in select_days(history, days):
+        timestamp = record.get("timestamp", "")
+        for container, data in (record.get("data") or {}).items():
+            yield (
+                timestamp,
+                container,
+                _number(data.get("code")),
+                _number(data.get("oil_temp")),
+                _number(data.get("container_temp")),
+                _number(data.get("miner_online")),
+                _number(data.get("miner_offline")),
+                _number(data.get("hashrate_ph")),
+                _number(data.get("power_kw")),
+            )
+
+
+def iter_alert_rows(alerts_history, days=0):
+    """
+    Una fila por alerta, con contenedor y categoría (pipeline vectorizado del reporte Excel).
+    alerts_history puede ser una lista o un iterador: se procesa por bloques de CHUNK_ROWS
+    """
+    from generate_alerts_excel import alerts_to_frame, extract_container_series, categorize_series
+
+    for chunk in _chunks(select_days(alerts_history, days)):
+        df = alerts_to_frame(chunk)
+        if df.empty:
+            continue
+        containers = extract_container_series(df["Alerta"])
+        categories = categorize_series(df["Alerta"])
+        yield from zip(df["timestamp"], containers, categories, df["Alerta"])
+
+
+def _chunks(rows, size=CHUNK_ROWS):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_csv_gz(rows, columns, path):
+    """Escribe filas a CSV gzip por bloques. Retorna la cantidad de filas"""
+    count = 0
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in _chunks(rows):
+            writer.writerows(chunk)
+            count += len(chunk)
+    return count
+
+
+def write_parquet(rows, columns, types, path):
+    """Escribe filas a Parquet, un row group por bloque. Retorna la cantidad de filas"""
+    if not PARQUET_AVAILABLE:
+        raise ExportError("Parquet requiere pyarrow (pip install pyarrow)")
+
+    schema = pa.schema([(c, pa.type_for_alias(types[c])) for c in columns])
+    count = 0
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for chunk in _chunks(rows):
+            arrays = [pa.array(col, type=schema.field(i).type) for i, col in enumerate(zip(*chunk))]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            count += len(chunk)
+    return count
+
+
+def export_data(days=7, fmt="csv", output_dir=None):
+    """
+    Exporta historial de estados y alertas de los últimos `days` días (0 = todo)
+
+    Returns:
+        lista de (ruta, filas) de los archivos generados
+    """
+    fmt = fmt.lower()
+    if fmt not in EXPORT_FORMATS:
+        raise ExportError(f"Formato no soportado: {fmt} (usa csv o parquet)")
+    if fmt == "parquet" and not PARQUET_AVAILABLE:
+        raise ExportError("Parquet requiere pyarrow (pip install pyarrow)")
+
+    storage = default_storage()
+    output_dir = output_dir or default_local_path()
+    stamp = datetime.now(PARAGUAY_TZ).strftime("%Y%m%d_%H%M%S")
+    suffix = "csv.gz" if fmt == "csv" else "parquet"
+    window = f"{days}d" if days > 0 else "todo"
+
+    datasets = [
+        ("historial", HISTORY_FILE, iter_history_rows, HISTORY_COLUMNS, HISTORY_TYPES),
+        ("alertas", ALERTS_HISTORY_FILE, iter_alert_rows, ALERT_COLUMNS, ALERT_TYPES),
+    ]
+
+    results = []
+    for name, filename, iter_rows, columns, types in datasets:
+        records = iter_json_records(storage, filename)
+        path = f"{output_dir}/fbox_{name}_{window}_{stamp}.{suffix}"
+        rows = iter_rows(records, days)
+        if fmt == "csv":
+            count = write_csv_gz(rows, columns, path)
+        else:
+            count = write_parquet(rows, columns, types, path)
+        print(f"✅ Exportado {name}: {path} ({count} filas)")
+        results.append((path, count))
+    return results
+
@@ -0,0 +1,410 @@
+"""
+Cliente de la API de FBox: login, detalle de cada contenedor y armado del estado
+
+Sin efectos al importar (no carga el .env, no crea el almacenamiento ni envía
+nada): lo usan el monitor (fbox_telegram.py) y el bot para refrescar /estado.
+La configuración se lee del entorno con configure(); quien cargue un .env
+después de importar este módulo debe volver a llamarla.
+"""
+import json
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import requests
+
+from metrics import record_call, endpoint_name
+from miner_window import extract_miner_ids
+from subbox_stats import subbox_stats
+
+PARAGUAY_TZ = ZoneInfo("America/Asuncion")
+
+AREA = "10000013"
+DEFAULT_BASE_URL = "http://america.fboxdata.com"
+DEFAULT_CONTAINERS = "C01:290,C02:291"
+SNAPSHOT_FILE = "fbox_snapshot.json"  # último reporte renderizado (lo usa /estado en el bot)
+
+def now_paraguay():
+    """Retorna la hora actual en el huso horario de Paraguay"""
+    return datetime.now(PARAGUAY_TZ)
+
+def parse_containers(value):
+    """Contenedores monitoreados desde "C01:290,C02:291" -> {"C01": 290, "C02": 291}"""
+    containers = {}
+    for item in value.split(","):
+        name, _, cid = item.strip().partition(":")
+        if name and cid.strip().isdigit():
+            containers[name.strip()] = int(cid)
+    return containers
+
+# URL de la API de FBox (se puede apuntar a fbox_mock_server.py para pruebas sin red),
+# contenedores monitoreados y cookies de sesión: los completa configure()
+FBOX_BASE_URL = DEFAULT_BASE_URL
+FBOX_CONTAINERS = {}
+
+cookies = {
+    "lang": "en-us",
+    "language": "en",
+    "ssid": "",
+    "Admin-Token": ""
+}
+
+headers = {
+    "User-Agent": "Mozilla/5.0",
+    "Accept": "application/json, text/plain, */*",
+    "Referer": f"{DEFAULT_BASE_URL}/"
+}
+
+def configure(environ=None):
+    """Lee FBOX_BASE_URL, FBOX_CONTAINERS y las cookies (FBOX_SSID, FBOX_ADMIN_TOKEN) del entorno"""
+    global FBOX_BASE_URL, FBOX_CONTAINERS
+    env = os.environ if environ is None else environ
+    FBOX_BASE_URL = env.get("FBOX_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+    FBOX_CONTAINERS = parse_containers(env.get("FBOX_CONTAINERS", DEFAULT_CONTAINERS))
+    cookies["ssid"] = env.get("FBOX_SSID", "")
+    cookies["Admin-Token"] = env.get("FBOX_ADMIN_TOKEN", "")
+    headers["Referer"] = f"{FBOX_BASE_URL}/"
+
+configure()
+
+def check_session_valid():
+    """Verifica si las cookies actuales siguen siendo válidas usando getuserinfo."""
+    url = f"{FBOX_BASE_URL}/api/index/getuserinfo?output=json&area_id={AREA}"
+    start = time.monotonic()
+    ok = False
+    try:
+        r = requests.get(url, headers=headers, cookies=cookies, timeout=10)
+        ok = r.status_code == 200
+        if ok and "application/json" in r.headers.get("Content-Type", ""):
+            data = r.json()
+            if data.get("code") == 1:
+                print("✅ Sesión FBox activa (cookies válidas)")
+                return True
+    except Exception as e:
+        print(f"⚠️ Error verificando sesión: {e}")
+    finally:
+        # Una sola medición por llamada, aunque falle el parseo de la respuesta
+        record_call(endpoint_name(url), (time.monotonic() - start) * 1000, ok)
+    print("❌ Cookies inválidas o expiradas")
+    return False
+
+
+def fbox_login():
+    """Inicia sesión en FBox con usuario/contraseña y actualiza las cookies globales.
+    Retorna True si el login fue exitoso, False si falló o no hay credenciales."""
+    username = os.environ.get("FBOX_USERNAME")
+    password = os.environ.get("FBOX_PASSWORD")
+
+    if not username or not password:
+        print("ℹ️  Sin credenciales FBOX_USERNAME/FBOX_PASSWORD, usando cookies guardadas.")
+        valid = check_session_valid()
+        if not valid:
+            print("❌ Cookies inválidas o expiradas. Actualizar FBOX_SSID y FBOX_ADMIN_TOKEN.")
+        return valid
+
+    print(f"🔐 Intentando login en FBox como: {username}")
+
+    login_endpoints = [
+        f"{FBOX_BASE_URL}/api/index/login/login",
+        f"{FBOX_BASE_URL}/api/index/admin.login/login",
+        f"{FBOX_BASE_URL}/api/index/user.login/login",
+        f"{FBOX_BASE_URL}/api/index/login",
+    ]
+    login_payloads = [
+        {"account": username, "password": password},
+        {"username": username, "password": password},
+        {"email": username, "password": password},
+    ]
+
+    session = requests.Session()
+    attempt = 0
+
+    for endpoint in login_endpoints:
+        for payload in login_payloads:
+            start = time.monotonic()
+            attempt += 1
+            try:
+                r = session.post(endpoint, data=payload, headers=headers, timeout=15)
+                record_call(endpoint_name(endpoint), (time.monotonic() - start) * 1000,
+                            r.status_code == 200, retry=attempt > 1)
+                if r.status_code != 200:
+                    continue
+                ct = r.headers.get("Content-Type", "")
+                if "application/json" not in ct:
+                    continue
+                resp = r.json()
+                if resp.get("code") == 1:
+                    # Actualizar cookies desde la sesión
+                    for name in ("ssid", "Admin-Token"):
+                        val = session.cookies.get(name)
+                        if val:
+                            cookies[name] = val
+                    # Intentar obtener token desde el cuerpo de la respuesta
+                    data_body = resp.get("data") or {}
+                    if isinstance(data_body, dict):
+                        for key in ("ssid", "token", "admin_token", "adminToken"):
+                            val = data_body.get(key)
+                            if val:
+                                if key == "ssid":
+                                    cookies["ssid"] = val
+                                else:
+                                    cookies["Admin-Token"] = val
+                    print(f"✅ Login exitoso via {endpoint}")
+                    return True
+            except Exception as e:
+                record_call(endpoint_name(endpoint), (time.monotonic() - start) * 1000, False,
+                            retry=attempt > 1)
+                print(f"  ⚠️ Error en {endpoint}: {e}")
+                continue
+
+    print("❌ Login fallido en todos los endpoints. Usando cookies guardadas.")
+    return False
+
+def fetch_json(url):
+    r = requests.get(url, headers=headers, cookies=cookies, timeout=30)
+    ct = r.headers.get("Content-Type", "")
+    if r.status_code != 200 or "application/json" not in ct:
+        return {
+            "__error__": True,
+            "status": r.status_code,
+            "content_type": ct,
+            "body_head": r.text[:200]
+        }
+    try:
+        return r.json()
+    except Exception:
+        return {
+            "__error__": True,
+            "status": r.status_code,
+            "content_type": ct,
+            "body_head": r.text[:200]
+        }
+
+def get_detail(container_id):
+    candidates = [
+        f"{FBOX_BASE_URL}/api/index/fbox.boxlist/detail",
+        f"{FBOX_BASE_URL}/api/index/fbox.boxdetail/detail",
+        f"{FBOX_BASE_URL}/api/index/fbox.boxinfo/detail",
+        f"{FBOX_BASE_URL}/api/index/fbox.box/detail",
+        f"{FBOX_BASE_URL}/api/index/fbox.boxlist/index",
+    ]
+
+    params = f"?output=json&area_id={AREA}&id={container_id}"
+
+    last_err = None
+    for attempt, base_url in enumerate(candidates):
+        url = base_url + params
+        start = time.monotonic()
+        out = fetch_json(url)
+        ok = isinstance(out, dict) and not out.get("__error__")
+        # Métricas por endpoint; pasar al siguiente candidato cuenta como reintento
+        record_call(endpoint_name(base_url), (time.monotonic() - start) * 1000, ok, retry=attempt > 0)
+        if ok:
+            out["__endpoint__"] = base_url
+            return out
+        last_err = out
+
+    if isinstance(last_err, dict):
+        last_err["__tried__"] = candidates
+    return last_err
+
+def to_float(x):
+    try:
+        v = float(x)
+        return None if v <= -900 else v
+    except:
+        return None
+
+def calc_oil_temp(detail_json):
+    data = detail_json.get("data") or {}
+    sub_boxes = data.get("sub_box_list") or []
+
+    temps = []
+    for sb in sub_boxes:
+        for t in (sb.get("main_temperatures") or []):
+            v = to_float(t.get("num"))
+            if v is not None:
+                temps.append(v)
+
+    if not temps:
+        return None
+
+    return round(sum(temps) / len(temps), 1)
+
+def extract_container_data(detail_json):
+    """Extrae datos del contenedor: tipo, inmersión, temperatura, etc."""
+    # Los datos pueden estar en 'data' o en 'info' (como string JSON)
+    data = detail_json.get("data")
+    if not data:
+        info_str = detail_json.get("info")
+        if info_str and isinstance(info_str, str):
+            try:
+                data = json.loads(info_str)
+            except:
+                data = {}
+        else:
+            data = info_str if isinstance(info_str, dict) else {}
+    
+    if not isinstance(data, dict):
+        data = {}
+    
+    # Tipo de contenedor (ej: "Exhaust Fan")
+    container_type = data.get("fbox_type_name") or data.get("type_name") or "N/A"
+    
+    # Estado de inmersión
+    immersion_status = data.get("immersion_status") or data.get("immersion")
+    immersion_str = str(immersion_status) if immersion_status else "N/A"
+    
+    # Porcentaje de inmersión
+    immersion_percent = to_float(data.get("immersion_percent"))
+    
+    # Temperatura del contenedor
+    container_temp = to_float(data.get("fbox_temp"))
+    
+    # Hashrate en tiempo real (GH/s a PH/s)
+    try:
+        hashrate_gh = float(data.get("realtime_power", 0))
+        hashrate_ph = round(hashrate_gh / 1000.0, 2) if hashrate_gh > 0 else None
+    except:
+        hashrate_ph = None
+    
+    # Potencia real en kW
+    power_kw = to_float(data.get("total_realtime_power"))
+    
+    return {
+        "container_type": container_type,
+        "immersion_status": immersion_str,
+        "immersion_percent": immersion_percent,
+        "container_temp": container_temp,
+        "hashrate_ph": hashrate_ph,
+        "power_kw": power_kw
+    }
+
+
+# Mineros por id de la última lectura {contenedor: (ids, ids online)}, solo si FBox trae la lista
+latest_miner_ids = {}
+
+def check_status():
+    containers_data = FBOX_CONTAINERS
+    latest_miner_ids.clear()
+    msg = "📦 FBOX STATUS\n"
+    msg += f"{now_paraguay().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
+    state = {}
+    total_power_kw = 0.0
+    power_sources = 0
+
+    for name, cid in containers_data.items():
+        detail = get_detail(cid)
+
+        if isinstance(detail, dict) and detail.get("__error__"):
+            msg += f"🔹 {name}\n"
+            msg += "⚠️ Error leyendo detalle\n\n"
+            continue
+
+        is_online = (detail.get("code") == 1)
+        status_icon = "🟢 ONLINE" if is_online else "🔴 OFFLINE"
+        
+        d = (detail.get("data") or {})
+        
+        # Si el contenedor está OFFLINE, usar N/A para todo
+        if not is_online:
+            msg += f"🔹 {name}\n"
+            msg += f"{status_icon}\n"
+            msg += f"🔥 Aceite: N/A °C\n"
+            msg += f"⛏ Mineros: N/A\n"
+            msg += "⚡ Potencia: N/A\n\n"
+            
+            state[name] = {
+                "code": detail.get("code", -1),
+                "miner_online": "N/A",
+                "miner_offline": "N/A",
+                "oil_temp": None,
+                "container_temp": None,
+                "hashrate_ph": None,
+                "power_kw": None
+            }
+            continue
+        
+        # Si está ONLINE, procesar los datos normalmente
+        oil_temp = calc_oil_temp(detail)
+        temp_txt = f"{oil_temp}" if oil_temp is not None else "N/A"
+        
+        # Convertir mineros a int, si no se puede usar 0
+        try:
+            m_on = int(d.get("miner_online", 0))
+        except (ValueError, TypeError):
+            m_on = 0
+        
+        try:
+            m_off = int(d.get("miner_offline", 0))
+        except (ValueError, TypeError):
+            m_off = 0
+
+        # Extraer datos adicionales del contenedor
+        container_data = extract_container_data(detail)
+
+        # Estadísticas por tanque: el promedio puede esconder un tanque sobrecalentado
+        sub_stats = subbox_stats(detail)
+
+        miner_ids = extract_miner_ids(detail)
+        if miner_ids:
+            latest_miner_ids[name] = miner_ids
+
+        msg += f"🔹 {name}\n"
+        msg += f"{status_icon}\n"
+        msg += f"🔥 Aceite: {temp_txt} °C\n"
+        if sub_stats and len(sub_stats["sub_boxes"]["names"]) > 1:
+            msg += (f"🌡️ Tanque más caliente: {sub_stats['hotspot']} (sensor {sub_stats['hotspot_sensor']}) "
+                    f"{sub_stats['oil_temp_max']} °C\n")
+        
+        # Temperatura del contenedor
+        if container_data["container_temp"] is not None:
+            msg += f"🌡️ Contenedor: {container_data['container_temp']} °C\n"
+        
+        msg += f"⛏ Mineros: {m_on} online / {m_off} offline\n"
+        
+        # Hashrate
+        if container_data["hashrate_ph"] is not None:
+            msg += f"⚙️ Hashrate: {container_data['hashrate_ph']} PH/s\n"
+        
+        # Potencia real desde API
+        if container_data["power_kw"] is not None:
+            msg += f"⚡ Potencia: {container_data['power_kw']} kW\n"
+            total_power_kw += container_data["power_kw"]
+            power_sources += 1
+        else:
+            msg += "⚡ Potencia: N/A\n"
+        
+        msg += "\n"
+
+        state[name] = {
+            "code": detail.get("code"),
+            "miner_online": m_on,
+            "miner_offline": m_off,
+            "oil_temp": oil_temp,
+            "container_temp": container_data["container_temp"],
+            "hashrate_ph": container_data["hashrate_ph"],
+            "power_kw": container_data["power_kw"]
+        }
+        if sub_stats:
+            state[name].update(sub_stats)
+
+    if power_sources > 0:
+        msg += f"⚡ Potencia total: {round(total_power_kw, 2)} kW\n"
+    else:
+        msg += "⚡ Potencia total: N/A\n"
+
+    return msg, state
+
+
+def save_snapshot(msg, state, storage=None):
+    """Guarda el último reporte y estado con su hora, para consultas instantáneas"""
+    if storage is None:
+        from storage import default_storage
+        storage = default_storage()
+    storage.write_json(SNAPSHOT_FILE, {
+        "timestamp": now_paraguay().isoformat(),
+        "message": msg,
+        "state": state
+    })
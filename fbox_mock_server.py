@@ -0,0 +1,356 @@
+"""
+Servidor local que imita la API de FBox (america.fboxdata.com) sin red
+
+Responde login, getuserinfo y el detalle de cada contenedor con payloads
+grabados (--replay) o sintéticos, con latencia, tasa de errores y cantidad de
+contenedores configurables. Sirve para probar check_status()/get_detail()/
+fbox_login() y hacer pruebas de carga del poller con cientos de contenedores.
+start_telegram_stand_in() imita la API de Telegram (responde ok a cualquier método)
+para correr el monitor o el bot sin enviar mensajes reales.
+
+Uso:
+    python fbox_mock_server.py --containers 300 --latency 0.05 --error-rate 0.02
+    # en otra terminal, con las variables que imprime el servidor:
+    FBOX_BASE_URL=http://127.0.0.1:8765 FBOX_CONTAINERS=C01:290,... python fbox_telegram.py
+
+Grabar payloads reales para replay (usa FBOX_BASE_URL/FBOX_CONTAINERS y las cookies del .env):
+    python fbox_mock_server.py --record grabaciones/
+"""
+import argparse
+import json
+import math
+import random
+import secrets
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+DETAIL_PATH = "/api/index/fbox.boxlist/detail"
+BOXLIST_PATH = "/api/index/fbox.boxlist"
+USERINFO_PATH = "/api/index/getuserinfo"
+LOGIN_PATHS = ("/api/index/login/login", "/api/index/admin.login/login",
+               "/api/index/user.login/login", "/api/index/login")
+STATS_PATH = "/__stats"
+
+FIRST_CONTAINER_ID = 290
+MINERS_PER_CONTAINER = 160
+SUB_BOXES = 4
+SENSORS_PER_BOX = 4
+
+
+def container_names(count, first_id=FIRST_CONTAINER_ID):
+    """{nombre: id} de los contenedores simulados (C01: 290, C02: 291, ...)"""
+    return {f"C{i + 1:02d}": first_id + i for i in range(count)}
+
+
+def containers_env(containers):
+    """Valor de FBOX_CONTAINERS para un {nombre: id}"""
+    return ",".join(f"{name}:{cid}" for name, cid in containers.items())
+
+
+def load_recordings(path):
+    """
+    Payloads grabados: un archivo .json por contenedor (un detalle o una lista de
+    detalles que se reproducen en secuencia)
+
+    Returns:
+        lista de secuencias de payloads
+    """
+    sequences = []
+    for file in sorted(Path(path).glob("*.json")):
+        with open(file, encoding="utf-8") as f:
+            payload = json.load(f)
+        sequences.append(payload if isinstance(payload, list) else [payload])
+    if not sequences:
+        raise ValueError(f"No hay payloads .json en {path}")
+    return sequences
+
+
+class MockFBox:
+    """
+    Estado y respuestas del FBox simulado
+
+    Args:
+        containers: cantidad de contenedores
+        latency: latencia fija por respuesta (s)
+        jitter: latencia aleatoria adicional (s)
+        error_rate: fracción de respuestas con error HTTP 500 (HTML, como un fallo del servidor)
+        offline_rate: fracción de detalles con el contenedor OFFLINE (code 0)
+        recordings: secuencias de payloads grabados (None = sintéticos)
+        seed: semilla para respuestas reproducibles
+    """
+
+    def __init__(self, containers=2, latency=0.0, jitter=0.0, error_rate=0.0, offline_rate=0.0,
+                 recordings=None, seed=None):
+        self.containers = container_names(containers)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.offline_rate = offline_rate
+        self.recordings = recordings
+        self.random = random.Random(seed)
+        self.token = secrets.token_hex(16)
+        self.lock = threading.Lock()
+        self.polls = {}
+        self.stats = {"requests": 0, "detail": 0, "login": 0, "errors": 0, "offline": 0}
+
+    def delay(self):
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def fail(self):
+        """Decide si esta respuesta es un error (y lo cuenta)"""
+        with self.lock:
+            self.stats["requests"] += 1
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            if failed:
+                self.stats["errors"] += 1
+        return failed
+
+    def login(self):
+        with self.lock:
+            self.stats["login"] += 1
+        return {"code": 1, "msg": "success", "data": {"ssid": self.token, "token": self.token}}
+
+    def userinfo(self):
+        return {"code": 1, "msg": "success", "data": {"username": "mock", "area_id": "10000013"}}
+
+    def boxlist(self):
+        return {"code": 1, "msg": "success",
+                "data": {"list": [{"id": cid, "name": name} for name, cid in self.containers.items()]}}
+
+    def detail(self, container_id):
+        """Detalle de un contenedor o None si el id no existe"""
+        index = container_id - FIRST_CONTAINER_ID
+        if not 0 <= index < len(self.containers):
+            return None
+        with self.lock:
+            self.stats["detail"] += 1
+            poll = self.polls.get(container_id, 0)
+            self.polls[container_id] = poll + 1
+            offline = self.offline_rate > 0 and self.random.random() < self.offline_rate
+            if offline:
+                self.stats["offline"] += 1
+            noise = [self.random.gauss(0, 0.4) for _ in range(SUB_BOXES * SENSORS_PER_BOX)]
+
+        if offline:
+            return {"code": 0, "msg": "device offline", "data": {}}
+        if self.recordings:
+            sequence = self.recordings[index % len(self.recordings)]
+            return sequence[poll % len(sequence)]
+        return self.synthetic_detail(index, poll, noise)
+
+    def synthetic_detail(self, index, poll, noise):
+        """Detalle con la misma forma que el de FBox: temperaturas por tanque, mineros, potencia"""
+        # Ciclo diario suave (288 lecturas de 5 min) con un desfase por contenedor
+        base = 45 + 4 * math.sin(2 * math.pi * (poll + index * 17) / 288)
+        sub_boxes = []
+        for b in range(SUB_BOXES):
+            temps = [{"name": f"T{s + 1}", "num": round(base + b * 0.8 + noise[b * SENSORS_PER_BOX + s], 1)}
+                     for s in range(SENSORS_PER_BOX)]
+            sub_boxes.append({"name": f"Tanque {b + 1}", "main_temperatures": temps})
+
+        # Pocos mineros caídos fijos y uno intermitente (cae en lecturas alternas)
+        offline_ids = {(index * 7 + k) % MINERS_PER_CONTAINER for k in range(index % 3)}
+        if poll % 2:
+            offline_ids.add(MINERS_PER_CONTAINER - 1)
+        miners = [{"sn": f"{index + 1:02d}-{m:03d}", "status": 0 if m in offline_ids else 1}
+                  for m in range(MINERS_PER_CONTAINER)]
+        online = MINERS_PER_CONTAINER - len(offline_ids)
+
+        return {
+            "code": 1,
+            "msg": "success",
+            "data": {
+                "fbox_type_name": "Exhaust Fan",
+                "immersion_status": 1,
+                "immersion_percent": 98,
+                "fbox_temp": round(base - 8 + noise[0], 1),
+                "miner_online": online,
+                "miner_offline": len(offline_ids),
+                "realtime_power": round(online * 295.0, 1),     # GH/s
+                "total_realtime_power": round(online * 5.6, 1),  # kW
+                "sub_box_list": sub_boxes,
+                "miner_list": miners,
+            },
+        }
+
+
+class MockFBoxHandler(BaseHTTPRequestHandler):
+    """Endpoints de FBox; self.server.fbox es el MockFBox"""
+
+    def _send_json(self, payload, status=200, cookies=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (cookies or {}).items():
+            self.send_header("Set-Cookie", f"{name}={value}; Path=/")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status):
+        body = f"<html><body>{status}</body></html>".encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        fbox = self.server.fbox
+        url = urlparse(self.path)
+        if url.path == STATS_PATH:
+            with fbox.lock:
+                return self._send_json(dict(fbox.stats))
+
+        fbox.delay()
+        if fbox.fail():
+            return self._send_error(500)
+
+        if url.path == DETAIL_PATH:
+            try:
+                container_id = int(parse_qs(url.query).get("id", [""])[0])
+            except ValueError:
+                return self._send_json({"code": 0, "msg": "invalid id"})
+            payload = fbox.detail(container_id)
+            if payload is None:
+                return self._send_json({"code": 0, "msg": "box not found"})
+            return self._send_json(payload)
+        if url.path == USERINFO_PATH:
+            return self._send_json(fbox.userinfo())
+        if url.path == BOXLIST_PATH:
+            return self._send_json(fbox.boxlist())
+        self._send_error(404)
+
+    def do_POST(self):
+        fbox = self.server.fbox
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        self.rfile.read(length)
+        fbox.delay()
+        if fbox.fail():
+            return self._send_error(500)
+        if urlparse(self.path).path in LOGIN_PATHS:
+            return self._send_json(fbox.login(), cookies={"ssid": fbox.token, "Admin-Token": fbox.token})
+        self._send_error(404)
+
+    def log_message(self, format, *args):
+        pass  # Silenciar logs de HTTP
+
+
+def start_mock_server(host="127.0.0.1", port=0, **kwargs):
+    """
+    Levanta el servidor en un thread de fondo
+
+    Args:
+        port: 0 = puerto libre elegido por el sistema
+        **kwargs: parámetros de MockFBox
+
+    Returns:
+        (servidor, url base) - detener con servidor.shutdown()
+    """
+    server = ThreadingHTTPServer((host, port), MockFBoxHandler)
+    server.daemon_threads = True
+    server.fbox = MockFBox(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+# ---------------- Telegram simulado ----------------
+class TelegramStandInHandler(BaseHTTPRequestHandler):
+    """Responde cualquier método /bot<token>/<método> como la API de Telegram"""
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0) or 0)
+        self.rfile.read(length)
+        server = self.server
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.calls += 1
+            message_id = server.calls
+        body = json.dumps({"ok": True, "result": {"message_id": message_id, "date": int(time.time())}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, format, *args):
+        pass  # Silenciar logs de HTTP
+
+
+def start_telegram_stand_in(latency=0.0):
+    """Levanta la API de Telegram simulada en un puerto libre. Retorna (servidor, url base)"""
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramStandInHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.calls = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def record_payloads(output_dir):
+    """Graba el detalle actual de cada contenedor configurado (FBOX_BASE_URL/FBOX_CONTAINERS)"""
+    import fbox_telegram  # carga el .env y configura fbox_client
+    import fbox_client
+
+    out = Path(output_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    fbox_client.fbox_login()
+    for name, cid in fbox_client.FBOX_CONTAINERS.items():
+        detail = fbox_client.get_detail(cid)
+        if not isinstance(detail, dict) or detail.get("__error__"):
+            print(f"⚠️ {name}: error leyendo detalle, se omite")
+            continue
+        detail.pop("__endpoint__", None)
+        with open(out / f"{name}.json", "w", encoding="utf-8") as f:
+            json.dump(detail, f, ensure_ascii=False, indent=2)
+        print(f"💾 {name} grabado")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Servidor FBox simulado para pruebas sin red')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--containers', type=int, default=2,
+                        help='Cantidad de contenedores simulados')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Latencia fija por respuesta (s)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Latencia aleatoria adicional (s)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Fracción de respuestas con error 500')
+    parser.add_argument('--offline-rate', type=float, default=0.0,
+                        help='Fracción de detalles con el contenedor OFFLINE')
+    parser.add_argument('--replay', type=str, default=None,
+                        help='Carpeta con payloads grabados (.json) para reproducir')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='Semilla para respuestas reproducibles')
+    parser.add_argument('--record', type=str, default=None,
+                        help='Grabar los detalles reales en esta carpeta y salir')
+
+    args = parser.parse_args()
+
+    if args.record:
+        record_payloads(args.record)
+        raise SystemExit(0)
+
+    server, base_url = start_mock_server(
+        args.host, args.port, containers=args.containers, latency=args.latency, jitter=args.jitter,
+        error_rate=args.error_rate, offline_rate=args.offline_rate,
+        recordings=load_recordings(args.replay) if args.replay else None, seed=args.seed)
+    print(f"✅ FBox simulado en {base_url} ({args.containers} contenedores)")
+    print(f"FBOX_BASE_URL={base_url}")
+    print(f"FBOX_CONTAINERS={containers_env(server.fbox.containers)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print("👋 Servidor detenido")
@@ -1,9 +1,21 @@
-import requests
 from datetime import datetime
-from zoneinfo import ZoneInfo
-import json
 import os
 from pathlib import Path
+from storage import default_storage, default_local_path
+from telegram_sender import get_sender, PRIORITY_CRITICAL, PRIORITY_ROUTINE
+from alert_state import AlertTracker
+from alert_rules import load_rules
+from incidents import IncidentCorrelator, INCIDENT_WINDOW_MIN
+from anomaly_detector import AnomalyDetector, ANOMALY_ALPHA, ANOMALY_K, ANOMALY_WARMUP
+from live_status import LiveStatus
+from recent_window import RecentWindow, window_size, POLL_INTERVAL_MIN, RECENT_WINDOW_HOURS
+from temp_forecast import TempForecaster, FORECAST_METRICS, FORECAST_HORIZON_MIN, CONTAINER_TEMP_THRESHOLD
+from fleet_analytics import FleetAnalytics, GAP_TOLERANCE
+from weekly_stats import WeeklyStats
+from metrics import start_run, active_run
+from miner_window import MinerWindow, MINER_CLEAR_CHECKS, MINER_WINDOW_SIZE, MINER_WINDOW_DROP, MINER_FLAP_MIN
+import fbox_client
+from fbox_client import fbox_login, check_status, latest_miner_ids, now_paraguay
 
 # ---------------- CARGAR .env SI EXISTE (PARA DESARROLLO LOCAL) ----------------
 env_file = Path(__file__).parent / ".env"
@@ -15,441 +27,138 @@ if env_file.exists():
                 key, value = line.split("=", 1)
                 os.environ[key.strip()] = value.strip()
 
+# Cliente FBox (URL, contenedores, cookies): se relee con el .env ya cargado
+fbox_client.configure()
+
 # ---------------- TELEGRAM ----------------
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 CHAT_ID = os.environ.get("CHAT_ID")
 
-# ---------------- TIMEZONE ----------------
-PARAGUAY_TZ = ZoneInfo("America/Asuncion")
+def send_telegram(msg, priority=PRIORITY_ROUTINE, wait=True):
+    """Envía un mensaje al chat configurado a través de la cola con control de tasa"""
+    return get_sender().send_message(CHAT_ID, msg, priority=priority, wait=wait)
 
-def now_paraguay():
-    """Retorna la hora actual en el huso horario de Paraguay"""
-    return datetime.now(PARAGUAY_TZ)
+# ============ UMBRALES DE ALERTAS ============
+# Definidos en alert_rules.json (umbral de temperatura, caída de mineros y de potencia,
+# con overrides por contenedor). Ver alert_rules.py.
 
-def send_telegram(msg):
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    requests.post(url, data={"chat_id": CHAT_ID, "text": msg})
+# ============ CONFIGURACIÓN DE TIEMPO ============
+ALERT_CHECK_INTERVAL = 60  # minutos - revisar alertas cada 60 minutos (1 hora)
+FULL_REPORT_INTERVAL = 60  # minutos - enviar reporte completo cada 60 minutos (1 hora)
 
-AREA = "10000013"
-BASE = "http://america.fboxdata.com/api/index/fbox.boxlist"
+# Modo estado fijado: en lugar de un reporte nuevo cada hora, se edita un mensaje fijado
+# por chat en cada ejecución (solo si cambió). Las alertas siguen llegando como mensajes nuevos.
+LIVE_STATUS_MODE = os.environ.get("LIVE_STATUS_MODE", "").lower() in ("1", "true", "yes")
+LIVE_STATUS_CHATS = [c.strip() for c in os.environ.get("LIVE_STATUS_CHATS", "").split(",") if c.strip()]
 
-cookies = {
-    "lang": "en-us",
-    "language": "en",
-    "ssid": os.environ.get("FBOX_SSID", ""),
-    "Admin-Token": os.environ.get("FBOX_ADMIN_TOKEN", "")
-}
+_alert_rules = None
 
-headers = {
-    "User-Agent": "Mozilla/5.0",
-    "Accept": "application/json, text/plain, */*",
-    "Referer": "http://america.fboxdata.com/"
-}
+def get_alert_rules():
+    """Reglas de alerta compiladas (se cargan una sola vez por proceso)"""
+    global _alert_rules
+    if _alert_rules is None:
+        _alert_rules = load_rules()
+    return _alert_rules
 
-def check_session_valid():
-    """Verifica si las cookies actuales siguen siendo válidas usando getuserinfo."""
-    url = f"http://america.fboxdata.com/api/index/getuserinfo?output=json&area_id={AREA}"
-    try:
-        r = requests.get(url, headers=headers, cookies=cookies, timeout=10)
-        if r.status_code == 200 and "application/json" in r.headers.get("Content-Type", ""):
-            data = r.json()
-            if data.get("code") == 1:
-                print("✅ Sesión FBox activa (cookies válidas)")
-                return True
-    except Exception as e:
-        print(f"⚠️ Error verificando sesión: {e}")
-    print("❌ Cookies inválidas o expiradas")
-    return False
-
-
-def fbox_login():
-    """Inicia sesión en FBox con usuario/contraseña y actualiza las cookies globales.
-    Retorna True si el login fue exitoso, False si falló o no hay credenciales."""
-    username = os.environ.get("FBOX_USERNAME")
-    password = os.environ.get("FBOX_PASSWORD")
-
-    if not username or not password:
-        print("ℹ️  Sin credenciales FBOX_USERNAME/FBOX_PASSWORD, usando cookies guardadas.")
-        valid = check_session_valid()
-        if not valid:
-            print("❌ Cookies inválidas o expiradas. Actualizar FBOX_SSID y FBOX_ADMIN_TOKEN.")
-        return valid
-
-    print(f"🔐 Intentando login en FBox como: {username}")
-
-    login_endpoints = [
-        "http://america.fboxdata.com/api/index/login/login",
-        "http://america.fboxdata.com/api/index/admin.login/login",
-        "http://america.fboxdata.com/api/index/user.login/login",
-        "http://america.fboxdata.com/api/index/login",
-    ]
-    login_payloads = [
-        {"account": username, "password": password},
-        {"username": username, "password": password},
-        {"email": username, "password": password},
-    ]
-
-    session = requests.Session()
-
-    for endpoint in login_endpoints:
-        for payload in login_payloads:
-            try:
-                r = session.post(endpoint, data=payload, headers=headers, timeout=15)
-                if r.status_code != 200:
-                    continue
-                ct = r.headers.get("Content-Type", "")
-                if "application/json" not in ct:
-                    continue
-                resp = r.json()
-                if resp.get("code") == 1:
-                    # Actualizar cookies desde la sesión
-                    for name in ("ssid", "Admin-Token"):
-                        val = session.cookies.get(name)
-                        if val:
-                            cookies[name] = val
-                    # Intentar obtener token desde el cuerpo de la respuesta
-                    data_body = resp.get("data") or {}
-                    if isinstance(data_body, dict):
-                        for key in ("ssid", "token", "admin_token", "adminToken"):
-                            val = data_body.get(key)
-                            if val:
-                                if key == "ssid":
-                                    cookies["ssid"] = val
-                                else:
-                                    cookies["Admin-Token"] = val
-                    print(f"✅ Login exitoso via {endpoint}")
-                    return True
-            except Exception as e:
-                print(f"  ⚠️ Error en {endpoint}: {e}")
-                continue
-
-    print("❌ Login fallido en todos los endpoints. Usando cookies guardadas.")
-    return False
+def detect_alert_events(old_state, new_state):
+    """Detecta situaciones críticas; retorna eventos {container, type, message, baseline}"""
+    return get_alert_rules().evaluate(old_state, new_state)
 
-# ============ UMBRALES DE ALERTAS ============
-TEMP_ALERT_THRESHOLD = 55  # °C
-MINERS_DROP_THRESHOLD = 1  # cantidad de mineros (alerta con 1 solo minero caído)
-POWER_DROP_THRESHOLD = 30  # porcentaje
 
-# ============ CONFIGURACIÓN DE TIEMPO ============
-ALERT_CHECK_INTERVAL = 60  # minutos - revisar alertas cada 60 minutos (1 hora)
-FULL_REPORT_INTERVAL = 60  # minutos - enviar reporte completo cada 60 minutos (1 hora)
+def detect_alerts(old_state, new_state):
+    """Detecta situaciones críticas que requieren alerta inmediata"""
+    return [e["message"] for e in detect_alert_events(old_state, new_state)]
 
-def fetch_json(url):
-    r = requests.get(url, headers=headers, cookies=cookies, timeout=30)
-    ct = r.headers.get("Content-Type", "")
-    if r.status_code != 200 or "application/json" not in ct:
-        return {
-            "__error__": True,
-            "status": r.status_code,
-            "content_type": ct,
-            "body_head": r.text[:200]
-        }
-    try:
-        return r.json()
-    except Exception:
-        return {
-            "__error__": True,
-            "status": r.status_code,
-            "content_type": ct,
-            "body_head": r.text[:200]
-        }
 
-def get_detail(container_id):
-    candidates = [
-        "http://america.fboxdata.com/api/index/fbox.boxlist/detail",
-        "http://america.fboxdata.com/api/index/fbox.boxdetail/detail",
-        "http://america.fboxdata.com/api/index/fbox.boxinfo/detail",
-        "http://america.fboxdata.com/api/index/fbox.box/detail",
-        "http://america.fboxdata.com/api/index/fbox.boxlist/index",
-    ]
-
-    params = f"?output=json&area_id={AREA}&id={container_id}"
-
-    last_err = None
-    for base_url in candidates:
-        url = base_url + params
-        out = fetch_json(url)
-        if isinstance(out, dict) and not out.get("__error__"):
-            out["__endpoint__"] = base_url
-            return out
-        last_err = out
-
-    if isinstance(last_err, dict):
-        last_err["__tried__"] = candidates
-    return last_err
-
-def to_float(x):
-    try:
-        v = float(x)
-        return None if v <= -900 else v
-    except:
-        return None
-
-def calc_oil_temp(detail_json):
-    data = detail_json.get("data") or {}
-    sub_boxes = data.get("sub_box_list") or []
-
-    temps = []
-    for sb in sub_boxes:
-        for t in (sb.get("main_temperatures") or []):
-            v = to_float(t.get("num"))
-            if v is not None:
-                temps.append(v)
-
-    if not temps:
-        return None
-
-    return round(sum(temps) / len(temps), 1)
-
-def extract_container_data(detail_json):
-    """Extrae datos del contenedor: tipo, inmersión, temperatura, etc."""
-    # Los datos pueden estar en 'data' o en 'info' (como string JSON)
-    data = detail_json.get("data")
-    if not data:
-        info_str = detail_json.get("info")
-        if info_str and isinstance(info_str, str):
-            try:
-                data = json.loads(info_str)
-            except:
-                data = {}
-        else:
-            data = info_str if isinstance(info_str, dict) else {}
-    
-    if not isinstance(data, dict):
-        data = {}
-    
-    # Tipo de contenedor (ej: "Exhaust Fan")
-    container_type = data.get("fbox_type_name") or data.get("type_name") or "N/A"
-    
-    # Estado de inmersión
-    immersion_status = data.get("immersion_status") or data.get("immersion")
-    immersion_str = str(immersion_status) if immersion_status else "N/A"
-    
-    # Porcentaje de inmersión
-    immersion_percent = to_float(data.get("immersion_percent"))
-    
-    # Temperatura del contenedor
-    container_temp = to_float(data.get("fbox_temp"))
-    
-    # Hashrate en tiempo real (GH/s a PH/s)
-    try:
-        hashrate_gh = float(data.get("realtime_power", 0))
-        hashrate_ph = round(hashrate_gh / 1000.0, 2) if hashrate_gh > 0 else None
-    except:
-        hashrate_ph = None
-    
-    # Potencia real en kW
-    power_kw = to_float(data.get("total_realtime_power"))
-    
-    return {
-        "container_type": container_type,
-        "immersion_status": immersion_str,
-        "immersion_percent": immersion_percent,
-        "container_temp": container_temp,
-        "hashrate_ph": hashrate_ph,
-        "power_kw": power_kw
-    }
-
-
-def check_status():
-    containers_data = {"C01": 290, "C02": 291}
-    msg = "📦 FBOX STATUS\n"
-    msg += f"{now_paraguay().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-    state = {}
-    total_power_kw = 0.0
-    power_sources = 0
-
-    for name, cid in containers_data.items():
-        detail = get_detail(cid)
-
-        if isinstance(detail, dict) and detail.get("__error__"):
-            msg += f"🔹 {name}\n"
-            msg += "⚠️ Error leyendo detalle\n\n"
-            continue
-
-        is_online = (detail.get("code") == 1)
-        status_icon = "🟢 ONLINE" if is_online else "🔴 OFFLINE"
-        
-        d = (detail.get("data") or {})
-        
-        # Si el contenedor está OFFLINE, usar N/A para todo
-        if not is_online:
-            msg += f"🔹 {name}\n"
-            msg += f"{status_icon}\n"
-            msg += f"🔥 Aceite: N/A °C\n"
-            msg += f"⛏ Mineros: N/A\n"
-            msg += "⚡ Potencia: N/A\n\n"
-            
-            state[name] = {
-                "code": detail.get("code", -1),
-                "miner_online": "N/A",
-                "miner_offline": "N/A",
-                "oil_temp": None,
-                "container_temp": None,
-                "hashrate_ph": None,
-                "power_kw": None
-            }
-            continue
-        
-        # Si está ONLINE, procesar los datos normalmente
-        oil_temp = calc_oil_temp(detail)
-        temp_txt = f"{oil_temp}" if oil_temp is not None else "N/A"
-        
-        # Convertir mineros a int, si no se puede usar 0
-        try:
-            m_on = int(d.get("miner_online", 0))
-        except (ValueError, TypeError):
-            m_on = 0
-        
-        try:
-            m_off = int(d.get("miner_offline", 0))
-        except (ValueError, TypeError):
-            m_off = 0
+# ============ ESTADO DE ALERTAS (HISTÉRESIS) ============
+# Una alerta activa no se repite en cada ejecución: se recuerda cada
+# ALERT_RENOTIFY_MINUTES y se avisa cuando se resuelve.
+ALERT_RENOTIFY_MINUTES = int(os.environ.get("ALERT_RENOTIFY_MINUTES", 360))
+# Los chequeos de despeje (histéresis) salen de las reglas: clear_margin / clear_percent
 
-        # Extraer datos adicionales del contenedor
-        container_data = extract_container_data(detail)
+# Detección de anomalías EWMA (además de los umbrales fijos)
+ANOMALY_DETECTION = os.environ.get("ANOMALY_DETECTION", "true").lower() in ("1", "true", "yes")
+ANOMALY_PARAMS = {
+    "alpha": float(os.environ.get("ANOMALY_ALPHA", ANOMALY_ALPHA)),
+    "k": float(os.environ.get("ANOMALY_K", ANOMALY_K)),
+    "warmup": int(os.environ.get("ANOMALY_WARMUP", ANOMALY_WARMUP)),
+}
 
-        msg += f"🔹 {name}\n"
-        msg += f"{status_icon}\n"
-        msg += f"🔥 Aceite: {temp_txt} °C\n"
-        
-        # Temperatura del contenedor
-        if container_data["container_temp"] is not None:
-            msg += f"🌡️ Contenedor: {container_data['container_temp']} °C\n"
-        
-        msg += f"⛏ Mineros: {m_on} online / {m_off} offline\n"
-        
-        # Hashrate
-        if container_data["hashrate_ph"] is not None:
-            msg += f"⚙️ Hashrate: {container_data['hashrate_ph']} PH/s\n"
-        
-        # Potencia real desde API
-        if container_data["power_kw"] is not None:
-            msg += f"⚡ Potencia: {container_data['power_kw']} kW\n"
-            total_power_kw += container_data["power_kw"]
-            power_sources += 1
-        else:
-            msg += "⚡ Potencia: N/A\n"
-        
-        msg += "\n"
-
-        state[name] = {
-            "code": detail.get("code"),
-            "miner_online": m_on,
-            "miner_offline": m_off,
-            "oil_temp": oil_temp,
-            "container_temp": container_data["container_temp"],
-            "hashrate_ph": container_data["hashrate_ph"],
-            "power_kw": container_data["power_kw"]
-        }
+# Alerta temprana: pronóstico de cruce del umbral de temperatura (ventana reciente en memoria)
+FORECAST_HORIZON_MIN = int(os.environ.get("FORECAST_HORIZON_MIN", FORECAST_HORIZON_MIN))
+CONTAINER_TEMP_THRESHOLD = float(os.environ.get("CONTAINER_TEMP_THRESHOLD", CONTAINER_TEMP_THRESHOLD))
 
-    if power_sources > 0:
-        msg += f"⚡ Potencia total: {round(total_power_kw, 2)} kW\n"
-    else:
-        msg += "⚡ Potencia total: N/A\n"
+# Ventana (minutos) para sumar alertas nuevas del mismo tipo a un incidente abierto
+INCIDENT_WINDOW_MIN = int(os.environ.get("INCIDENT_WINDOW_MIN", INCIDENT_WINDOW_MIN))
 
-    return msg, state
+# Ventana deslizante de mineros: desgaste lento e intermitencia (por id si FBox trae la lista)
+MINER_WINDOW_PARAMS = {
+    "size": int(os.environ.get("MINER_WINDOW_SIZE", MINER_WINDOW_SIZE)),
+    "drop": int(os.environ.get("MINER_WINDOW_DROP", MINER_WINDOW_DROP)),
+    "flap_min": int(os.environ.get("MINER_FLAP_MIN", MINER_FLAP_MIN)),
+}
 
+# Ventana reciente (pronóstico y desgaste de mineros): horas cubiertas según el intervalo real
+# de ejecución; nunca menos lecturas que la ventana de mineros, que lee su serie de aquí
+POLL_INTERVAL_MIN = int(os.environ.get("POLL_INTERVAL_MIN", POLL_INTERVAL_MIN))
+RECENT_WINDOW_SIZE = max(
+    window_size(float(os.environ.get("RECENT_WINDOW_HOURS", RECENT_WINDOW_HOURS)), POLL_INTERVAL_MIN),
+    MINER_WINDOW_PARAMS["size"])
 
-def detect_alerts(old_state, new_state):
-    """Detecta situaciones críticas que requieren alerta inmediata"""
-    alerts = []
-    
-    for name, new_data in new_state.items():
-        old_data = old_state.get(name, {})
-        
-        # 🔴 ALERTA: Contenedor OFFLINE
-        if new_data.get("code") != 1:
-            alerts.append(f"🚨 CRÍTICO: {name} está OFFLINE")
-        
-        # 🌡️ ALERTA: Temperatura alta (≥55°C)
-        temp = new_data.get("oil_temp")
-        if temp is not None and temp >= TEMP_ALERT_THRESHOLD:
-            alerts.append(f"⚠️ TEMPERATURA ALTA: {name} - {temp}°C (umbral: {TEMP_ALERT_THRESHOLD}°C)")
-        
-        # ⛏️ ALERTA: Mineros caídos - DETECTAR CUALQUIER CAMBIO
-        old_online = old_data.get("miner_online", 0)
-        new_online = new_data.get("miner_online", 0)
-        old_offline = old_data.get("miner_offline", 0)
-        new_offline = new_data.get("miner_offline", 0)
-        
-        # Detectar si cayeron mineros
-        if isinstance(old_online, int) and isinstance(new_online, int) and isinstance(old_offline, int) and isinstance(new_offline, int):
-            # Solo alertar si el estado anterior era válido (contenedor estaba online)
-            if old_online > 0 or old_offline > 0:
-                drop_online = old_online - new_online
-                increase_offline = new_offline - old_offline
-                
-                # Alertar si cayeron online O aumentaron offline
-                if drop_online >= MINERS_DROP_THRESHOLD or increase_offline >= MINERS_DROP_THRESHOLD:
-                    change = max(drop_online, increase_offline)
-                    alerts.append(
-                        f"⚠️ 🔻 ALERTA: MINEROS CAÍDOS\n"
-                        f"📍 Contenedor: {name}\n"
-                        f"📉 Cantidad caída: {change} minero(s)\n"
-                        f"📊 Estado actual: {new_online} online / {new_offline} offline"
-                    )
-        
-        # ⚡ ALERTA: Potencia anormalmente baja
-        old_kw = old_data.get("power_kw")
-        new_kw = new_data.get("power_kw")
-        
-        if old_kw and new_kw and old_kw > 0:
-            drop_percent = ((old_kw - new_kw) / old_kw) * 100
-            if drop_percent >= POWER_DROP_THRESHOLD:
-                alerts.append(f"⚡ POTENCIA ANORMAL: {name} - Cayó {drop_percent:.1f}% ({old_kw} → {new_kw} kW)")
-    
-    return alerts
+# Analítica: hueco máximo (h) entre muestras para integrar energía; por defecto el doble del intervalo
+FLEET_MAX_GAP_HOURS = float(os.environ.get("FLEET_MAX_GAP_HOURS") or POLL_INTERVAL_MIN * GAP_TOLERANCE / 60)
+
+def load_alert_tracker():
+    """Carga el estado de alertas activas con la configuración de histéresis"""
+    rules = get_alert_rules()
+    return AlertTracker.load(storage, renotify_minutes=ALERT_RENOTIFY_MINUTES,
+                             clear_checks={**rules.clear_checks, **MINER_CLEAR_CHECKS},
+                             edge_types=rules.edge_types,
+                             labels=rules.labels)
 
 
 # ============ CONFIGURACIÓN DE ALMACENAMIENTO ============
-# Configura la ruta de Dropbox aquí (deja vacío para usar carpeta actual)
+# El backend se elige con STORAGE_BACKEND (ver storage.py). Con backend local,
+# los archivos van a DROPBOX_PATH si está configurada o a la carpeta actual.
 DROPBOX_PATH = os.environ.get("DROPBOX_PATH", "")  # Ejemplo: "C:/Users/TU_USUARIO/Dropbox/FBOX"
+STORAGE_PATH = default_local_path()
 
-# Si hay ruta de Dropbox configurada, úsala; si no, usa la carpeta actual
-STORAGE_PATH = Path(DROPBOX_PATH) if DROPBOX_PATH else Path(__file__).parent
+storage = default_storage()
 
-# Crear carpeta de almacenamiento si no existe
-if DROPBOX_PATH:
-    STORAGE_PATH.mkdir(parents=True, exist_ok=True)
+# Adjuntar los tiempos por fase de la ejecución a cada registro del historial
+METRICS_IN_HISTORY = os.environ.get("METRICS_IN_HISTORY", "").lower() in ("1", "true", "yes")
 
-# Estado persistente en archivo
-STATE_FILE = str(STORAGE_PATH / "fbox_state.json")
-TIME_FILE = str(STORAGE_PATH / "last_report_time.json")
-HISTORY_FILE = str(STORAGE_PATH / "fbox_history.json")
-ALERTS_HISTORY_FILE = str(STORAGE_PATH / "fbox_alerts_history.json")
+# Estado persistente (nombres de archivo dentro del storage)
+STATE_FILE = "fbox_state.json"
+TIME_FILE = "last_report_time.json"
+HISTORY_FILE = "fbox_history.json"
+ALERTS_HISTORY_FILE = "fbox_alerts_history.json"
 
 def load_state():
-    try:
-        if os.path.exists(STATE_FILE):
-            with open(STATE_FILE, 'r') as f:
-                return json.load(f)
-    except:
-        pass
-    return {}
+    return storage.read_json(STATE_FILE, {})
 
 def save_state(state):
-    try:
-        with open(STATE_FILE, 'w') as f:
-            json.dump(state, f)
-    except:
-        pass
+    storage.write_json(STATE_FILE, state)
+
+def save_snapshot(msg, state):
+    """Guarda el último reporte y estado con su hora, para consultas instantáneas"""
+    fbox_client.save_snapshot(msg, state, storage)
 
 def save_to_history(state):
     """Guarda el estado actual en el historial semanal"""
     try:
         # Cargar historial existente
-        history = []
-        if os.path.exists(HISTORY_FILE):
-            with open(HISTORY_FILE, 'r') as f:
-                history = json.load(f)
+        history = storage.read_json(HISTORY_FILE, [])
         
         # Agregar timestamp al estado actual
         record = {
             "timestamp": now_paraguay().isoformat(),
             "data": state
         }
+        run = active_run()
+        if METRICS_IN_HISTORY and run is not None:
+            # Fases hasta este punto (la escritura del historial todavía está en curso)
+            record["metrics"] = {"total_ms": run.elapsed_ms(), "spans": dict(run.spans)}
         history.append(record)
         
         # Mantener solo los últimos 7 días (cada 5 min = 288 registros/día * 7 = 2016)
@@ -458,13 +167,39 @@ def save_to_history(state):
             history = history[-max_records:]
         
         # Guardar historial actualizado
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(history, f, indent=2)
+        storage.write_json(HISTORY_FILE, history, indent=2)
         
         print(f"📝 Historial guardado: {len(history)} registros")
+        update_fleet_analytics(history, record)
+        update_weekly_stats(history, record)
     except Exception as e:
         print(f"⚠️ Error guardando historial: {e}")
 
+def update_fleet_analytics(history, record):
+    """Analítica de eficiencia incremental: solo se procesa la muestra nueva
+    (la primera vez, todo el historial)"""
+    try:
+        analytics = FleetAnalytics.load(storage, max_gap_hours=FLEET_MAX_GAP_HOURS)
+        analytics.update(history if analytics.empty else [record])
+        analytics.save(storage)
+    except Exception as e:
+        print(f"⚠️ Error actualizando analítica de eficiencia: {e}")
+
+def update_weekly_stats(history, record):
+    """Suma la muestra nueva a los agregados semanales (la primera vez, todo el historial)"""
+    try:
+        stats = WeeklyStats.load(storage)
+        if stats.empty:
+            for old_record in history:
+                stats.add_sample(old_record.get("timestamp", ""), old_record.get("data") or {})
+            for alerts_record in storage.read_json(ALERTS_HISTORY_FILE, []) or []:
+                stats.add_alerts(alerts_record.get("timestamp", ""), alerts_record.get("alerts", []))
+        else:
+            stats.add_sample(record["timestamp"], record["data"])
+        stats.save(storage)
+    except Exception as e:
+        print(f"⚠️ Error actualizando estadísticas semanales: {e}")
+
 def save_alerts_to_history(alerts):
     """Guarda las alertas en el historial para reportes Excel"""
     if not alerts:
@@ -472,10 +207,7 @@ def save_alerts_to_history(alerts):
     
     try:
         # Cargar historial existente
-        history = []
-        if os.path.exists(ALERTS_HISTORY_FILE):
-            with open(ALERTS_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
+        history = storage.read_json(ALERTS_HISTORY_FILE, [])
         
         # Agregar nuevo registro de alertas
         record = {
@@ -491,29 +223,25 @@ def save_alerts_to_history(alerts):
             history = history[-max_records:]
         
         # Guardar historial actualizado
-        with open(ALERTS_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(history, f, ensure_ascii=False, indent=2)
+        storage.write_json(ALERTS_HISTORY_FILE, history, indent=2)
+        
+        # Conteo semanal de alertas (si todavía no hay agregados, se
+        # toman del historial completo al guardar la primera muestra)
+        stats = WeeklyStats.load(storage)
+        if not stats.empty:
+            stats.add_alerts(record["timestamp"], alerts)
+            stats.save(storage)
     except Exception as e:
         print(f"Error guardando alertas: {e}")
 
 def load_last_report_time():
     """Carga el timestamp del último reporte completo"""
-    try:
-        if os.path.exists(TIME_FILE):
-            with open(TIME_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get("last_report_time")
-    except:
-        pass
-    return None
+    data = storage.read_json(TIME_FILE, {})
+    return data.get("last_report_time") if isinstance(data, dict) else None
 
 def save_last_report_time():
     """Guarda el timestamp actual como último reporte completo"""
-    try:
-        with open(TIME_FILE, 'w') as f:
-            json.dump({"last_report_time": now_paraguay().isoformat()}, f)
-    except:
-        pass
+    storage.write_json(TIME_FILE, {"last_report_time": now_paraguay().isoformat()})
 
 def should_send_full_report():
     """Determina si debe enviarse el reporte completo (cada hora)"""
@@ -530,25 +258,39 @@ def should_send_full_report():
         return True  # Si hay error, enviar reporte
 
 
+WEEKLY_FILE = "last_weekly_report.json"
+WEEKLY_REPORT_WEEKDAY = 0  # lunes (hora de Paraguay)
+
 def load_last_weekly_report():
-    """Carga el timestamp del último reporte semanal - DESHABILITADO"""
-    return None
+    """Carga el timestamp del último reporte semanal"""
+    data = storage.read_json(WEEKLY_FILE, {})
+    return data.get("last_weekly_report") if isinstance(data, dict) else None
 
 def save_last_weekly_report():
-    """Guarda el timestamp actual como último reporte semanal - DESHABILITADO"""
-    pass
+    """Guarda el timestamp actual como último reporte semanal"""
+    storage.write_json(WEEKLY_FILE, {"last_weekly_report": now_paraguay().isoformat()})
 
 def should_send_weekly_report():
-    """Determina si debe enviarse el reporte semanal - DESHABILITADO"""
-    return False
+    """El reporte semanal se envía una vez por semana, el lunes"""
+    now = now_paraguay()
+    if now.weekday() != WEEKLY_REPORT_WEEKDAY:
+        return False
+    last_time = load_last_weekly_report()
+    if not last_time:
+        return True
+    try:
+        elapsed_days = (now - datetime.fromisoformat(last_time)).total_seconds() / 86400
+        return elapsed_days >= 6
+    except:
+        return True
 
 def calculate_weekly_stats():
-    """Calcula estadísticas semanales - DESHABILITADO"""
-    return None
+    """Estadísticas de los últimos 7 días por contenedor (desde los agregados móviles)"""
+    return WeeklyStats.load(storage).totals()
 
 def generate_weekly_report():
-    """Genera el reporte semanal - DESHABILITADO"""
-    return ""
+    """Genera el reporte semanal"""
+    return WeeklyStats.load(storage).format_report(now=now_paraguay())
 
 
 # ============ EJECUCIÓN ÚNICA ============
@@ -564,36 +306,88 @@ if __name__ == "__main__":
             "🚨 CRÍTICO: C02 está OFFLINE\n"
             "\n✅ Si ves este mensaje, las alertas funcionan correctamente."
         )
-        send_telegram(test_msg)
+        send_telegram(test_msg, priority=PRIORITY_CRITICAL)
         print("✅ Alerta de prueba enviada")
         sys.exit(0)
 
     print(f"⏰ Ejecutando check: {now_paraguay()}")
     print(f"📋 Configuración: Reporte cada {FULL_REPORT_INTERVAL} min")
 
+    # Métricas de la ejecución: tiempo por fase y por endpoint (ver metrics.py)
+    run = start_run("poll", containers=len(fbox_client.FBOX_CONTAINERS))
+
     # Intentar login automático para obtener cookies frescas
+    run.phase("login")
     fbox_login()
 
+    run.phase("poll")
     msg, current_state = check_status()
+    run.phase("detect")
     old_state = load_state()
     
     # Detectar alertas y enviarlas INMEDIATAMENTE por Telegram
-    alerts = detect_alerts(old_state, current_state)
+    # (solo las nuevas, los recordatorios y las resueltas: una falla estable no se repite)
+    tracker = load_alert_tracker()
+    events = detect_alert_events(old_state, current_state)
+    detector = AnomalyDetector.load(storage, **ANOMALY_PARAMS) if ANOMALY_DETECTION else None
+    if detector:
+        events += detector.process(current_state)
+    window = RecentWindow.load(storage, size=RECENT_WINDOW_SIZE)
+    window.add(int(now_paraguay().timestamp()), current_state)
+    if FORECAST_HORIZON_MIN > 0:
+        forecaster = TempForecaster(get_alert_rules(), horizon_min=FORECAST_HORIZON_MIN, metrics={
+            **FORECAST_METRICS,
+            "container_temp": {**FORECAST_METRICS["container_temp"], "threshold": CONTAINER_TEMP_THRESHOLD},
+        })
+        events += forecaster.process(window, current_state)
+        tracker.clear_checks.update(forecaster.clear_checks(window))
+    miner_window = MinerWindow.load(storage, **MINER_WINDOW_PARAMS)
+    for name, miner_ids in latest_miner_ids.items():
+        miner_window.add(name, miner_ids)
+    # El desgaste solo cubre la pérdida lenta: donde la regla "miners" ya avisó la caída, se omite
+    miners_rule_active = tracker.active_containers("miners") | {
+        e["container"] for e in events if e["type"] == "miners"}
+    events += miner_window.process(window, current_state, miners_rule_active)
+    notifications = tracker.process(events, current_state, now_paraguay())
+    
+    # Correlación: las alertas del mismo tipo en varios contenedores se agrupan en un incidente
+    correlator = IncidentCorrelator.load(storage, labels=tracker.labels, window_minutes=INCIDENT_WINDOW_MIN)
+    grouped = correlator.process(notifications, now_paraguay())
+    alerts = [g["message"] for g in grouped]
     
+    run.phase("alerts")
     if alerts:
-        save_alerts_to_history(alerts)  # Guardar alertas en historial para Excel
-        alert_section = "🚨 ALERTAS DETECTADAS:\n"
-        for alert in alerts:
-            alert_section += f"{alert}\n"
-        send_telegram(alert_section)
+        # Guardar en historial para Excel solo las alertas nuevas (un registro por incidente)
+        save_alerts_to_history([g["message"] for g in grouped if g["kind"] == "fire"])
+        # Un mensaje por incidente; las alertas individuales van juntas en un solo mensaje
+        # Sin esperar: las alertas salen primero y el reporte se encola detrás
+        single = []
+        for g in grouped:
+            if len(g["containers"]) >= correlator.min_members:
+                send_telegram(g["message"], priority=PRIORITY_CRITICAL, wait=False)
+            else:
+                single.append(g["message"])
+        if single:
+            alert_section = "🚨 ALERTAS DETECTADAS:\n"
+            for alert in single:
+                alert_section += f"{alert}\n"
+            send_telegram(alert_section, priority=PRIORITY_CRITICAL, wait=False)
         print("🚨 ALERTAS ENVIADAS POR TELEGRAM:")
         for alert in alerts:
             print(f"  - {alert}")
     else:
         print("✅ Sin alertas detectadas")
     
+    # Modo estado fijado: editar el mensaje fijado de cada chat (sin mensajes nuevos)
+    run.phase("report")
+    if LIVE_STATUS_MODE:
+        live = LiveStatus(storage, get_sender())
+        for chat in (LIVE_STATUS_CHATS or [CHAT_ID]):
+            result = live.update(chat, msg)
+            print(f"📌 Estado fijado en {chat}: {result}")
+    
     # Enviar reporte completo solo cada hora (CON O SIN ALERTAS)
-    if should_send_full_report():
+    elif should_send_full_report():
         send_telegram(msg)
         save_last_report_time()
         print("📊 REPORTE ENVIADO (cada hora)")
@@ -611,6 +405,29 @@ if __name__ == "__main__":
             print("⏭️ Esperando próxima ventana de reporte")
     
     # Guardar estado actual y agregar al historial
+    run.phase("persist")
+    tracker.save(storage)
+    correlator.save(storage)
+    if detector:
+        detector.save(storage)
+    window.save(storage)
+    miner_window.save(storage)
     save_state(current_state)
+    save_snapshot(msg, current_state)
     save_to_history(current_state)
     print("💾 Estado guardado")
+    
+    # Reporte semanal (lunes): se arma con los agregados móviles ya actualizados
+    run.phase("weekly")
+    if should_send_weekly_report():
+        send_telegram(generate_weekly_report())
+        save_last_weekly_report()
+        print("📅 REPORTE SEMANAL ENVIADO")
+    
+    # Esperar a que salgan los mensajes encolados antes de terminar
+    run.phase("flush")
+    get_sender().flush(timeout=120)
+    
+    run.save(storage)
+    print(f"⏱️ Ejecución: {run.elapsed_ms() / 1000:.1f} s "
+          f"({', '.join(f'{k} {v / 1000:.1f}s' for k, v in run.spans.items())})")
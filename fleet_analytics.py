@@ -0,0 +1,288 @@
+"""
+Analítica de eficiencia de la flota: J/TH, uptime, disponibilidad de mineros y energía
+
+Se calcula de forma incremental sobre el historial de estados: cada muestra se
+procesa una sola vez y se acumula en buckets por hora y por día y contenedor
+(fleet_analytics.json). Los reportes leen los buckets, no el historial.
+
+- Eficiencia (J/TH) = potencia (kW) / hashrate (PH/s), ponderada por muestra
+- Uptime % = muestras ONLINE / muestras
+- Disponibilidad % = mineros online / mineros totales
+- Energía (kWh) = integración trapezoidal de la potencia entre muestras consecutivas
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from recent_window import POLL_INTERVAL_MIN
+from timestamps import PARAGUAY_TZ, parse_timestamps
+
+FLEET_ANALYTICS_FILE = "fleet_analytics.json"
+
+HOURLY_RETENTION_DAYS = 30
+DAILY_RETENTION_DAYS = 400
+# No se integra energía sobre huecos mayores (ejecuciones perdidas). El cron de GitHub
+# suele correr con retraso, así que el límite es el doble del intervalo nominal
+GAP_TOLERANCE = 2.0
+MAX_GAP_HOURS = POLL_INTERVAL_MIN * GAP_TOLERANCE / 60
+
+# Campos numéricos de cada muestra del historial
+SAMPLE_FIELDS = ["code", "miner_online", "miner_offline", "oil_temp", "container_temp",
+                 "hashrate_ph", "power_kw"]
+
+# Campos de cada bucket, en el orden en que se guardan
+BUCKET_FIELDS = ["samples", "online", "miners_on", "miners_total",
+                 "eff_samples", "hash_sum", "power_sum", "energy_kwh"]
+
+METRIC_COLUMNS = ["Contenedor", "Período", "Muestras", "Uptime %", "Disponibilidad %",
+                  "Hashrate prom (PH/s)", "Eficiencia (J/TH)", "Energía (kWh)"]
+
+
+def history_to_frame(history):
+    """Convierte el historial [{timestamp, data: {contenedor: {...}}}] en una fila por contenedor y muestra"""
+    columns = ["timestamp", "container"] + SAMPLE_FIELDS
+    rows = [
+        (record.get("timestamp", ""), container, *(data.get(f) for f in SAMPLE_FIELDS))
+        for record in history
+        for container, data in (record.get("data") or {}).items()
+        if isinstance(data, dict)
+    ]
+    df = pd.DataFrame.from_records(rows, columns=columns)
+    if df.empty:
+        return df
+
+    # "N/A" y None pasan a NaN
+    for col in columns[2:]:
+        df[col] = pd.to_numeric(df[col], errors="coerce")
+    df["timestamp"] = parse_timestamps(df["timestamp"])
+    df = df[df["timestamp"].notna()]
+    # Hora local sin zona -> epoch (s) y clave de hora "YYYY-MM-DDTHH"
+    local = df["timestamp"].dt.tz_localize(None).to_numpy().astype("datetime64[s]")
+    df = df.assign(epoch=local.astype(np.int64), hour=local.astype("datetime64[h]").astype("U13"))
+    return df.sort_values(["container", "epoch"], kind="stable").reset_index(drop=True)
+
+
+def record_epoch(timestamp):
+    """Timestamp ISO -> epoch (s) en hora local de Paraguay, igual que history_to_frame (None si es inválido)"""
+    try:
+        ts = datetime.fromisoformat(str(timestamp))
+    except ValueError:
+        return None
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(PARAGUAY_TZ).replace(tzinfo=None)
+    return int((ts - datetime(1970, 1, 1)).total_seconds())
+
+
+def _bucket_metrics(values):
+    """Métricas de un bucket (lista en el orden de BUCKET_FIELDS)"""
+    samples, online, miners_on, miners_total, eff_samples, hash_sum, power_sum, energy = values
+    return {
+        "Muestras": int(samples),
+        "Uptime %": round(online / samples * 100, 1) if samples else None,
+        "Disponibilidad %": round(miners_on / miners_total * 100, 1) if miners_total else None,
+        "Hashrate prom (PH/s)": round(hash_sum / eff_samples, 2) if eff_samples else None,
+        "Eficiencia (J/TH)": round(power_sum / hash_sum, 2) if hash_sum else None,
+        "Energía (kWh)": round(energy, 1),
+    }
+
+
+class FleetAnalytics:
+    """
+    Args:
+        data: estado persistido {"last": {contenedor: [epoch, potencia]},
+            "hourly": {contenedor: {hora: bucket}}, "daily": {contenedor: {día: bucket}}}
+        max_gap_hours: hueco máximo entre muestras sobre el que se integra energía
+    """
+
+    def __init__(self, data=None, max_gap_hours=MAX_GAP_HOURS):
+        data = data if isinstance(data, dict) else {}
+        self.max_gap_hours = max_gap_hours
+        self.last = data.get("last", {})
+        self.hourly = data.get("hourly", {})
+        self.daily = data.get("daily", {})
+        self.changed = False
+
+    @classmethod
+    def load(cls, storage, **kwargs):
+        return cls(storage.read_json(FLEET_ANALYTICS_FILE, {}), **kwargs)
+
+    def save(self, storage):
+        """Guarda solo si hubo cambios"""
+        if self.changed:
+            storage.write_json(FLEET_ANALYTICS_FILE, {
+                "last": self.last, "hourly": self.hourly, "daily": self.daily})
+            self.changed = False
+
+    @property
+    def empty(self):
+        return not self.last
+
+    def _pending(self, history):
+        """
+        Registros del historial (cronológico) posteriores a la última muestra acumulada
+        de algún contenedor: se recorre desde el final y se corta en la primera ya procesada
+        """
+        if not self.last or not self.last.keys() >= _containers(history[-1:]):
+            return history
+        cutoff = min(v[0] for v in self.last.values())
+        start = len(history)
+        while start > 0:
+            epoch = record_epoch(history[start - 1].get("timestamp", ""))
+            if epoch is not None and epoch <= cutoff:
+                break
+            start -= 1
+        return history[start:]
+
+    def update(self, history):
+        """
+        Procesa las muestras del historial posteriores a la última ya acumulada
+
+        Returns:
+            cantidad de muestras nuevas (contenedor x registro)
+        """
+        # Los registros ya acumulados se descartan antes de armar el DataFrame
+        df = history_to_frame(self._pending(history))
+        if df.empty:
+            return 0
+
+        # Solo muestras nuevas de cada contenedor
+        last_epoch = df["container"].map({c: v[0] for c, v in self.last.items()}).fillna(-1)
+        df = df[df["epoch"] > last_epoch].reset_index(drop=True)
+        if df.empty:
+            return 0
+
+        online = df["code"].to_numpy() == 1
+        miners_on = df["miner_online"].fillna(0).to_numpy()
+        miners_total = miners_on + df["miner_offline"].fillna(0).to_numpy()
+        hashrate = df["hashrate_ph"].to_numpy()
+        power = df["power_kw"].to_numpy()
+        eff = online & (hashrate > 0) & ~np.isnan(power)
+
+        # Energía: trapecio entre cada muestra y la anterior del mismo contenedor
+        # (para la primera muestra nueva, la anterior es la última ya procesada)
+        epoch = df["epoch"].to_numpy()
+        containers = df["container"].to_numpy()
+        first = np.r_[True, containers[1:] != containers[:-1]]
+        prev_epoch = np.r_[0, epoch[:-1]].astype(float)
+        prev_power = np.r_[np.nan, power[:-1]]
+        if first.any():
+            carried = [self.last.get(c, [np.nan, np.nan]) for c in containers[first]]
+            prev_epoch[first] = [float(v[0]) if v[0] is not None else np.nan for v in carried]
+            prev_power[first] = [v[1] if v[1] is not None else np.nan for v in carried]
+        dt_hours = (epoch - prev_epoch) / 3600.0
+        valid = (dt_hours > 0) & (dt_hours <= self.max_gap_hours) & ~np.isnan(power) & ~np.isnan(prev_power)
+        energy = np.where(valid, (power + np.nan_to_num(prev_power)) / 2.0 * np.nan_to_num(dt_hours), 0.0)
+
+        buckets = pd.DataFrame({
+            "container": containers,
+            "hour": df["hour"].to_numpy(),
+            "samples": 1,
+            "online": online.astype(int),
+            "miners_on": miners_on,
+            "miners_total": miners_total,
+            "eff_samples": eff.astype(int),
+            "hash_sum": np.where(eff, hashrate, 0.0),
+            "power_sum": np.where(eff, power, 0.0),
+            "energy_kwh": energy,
+        })
+        hourly = buckets.groupby(["container", "hour"], sort=False)[BUCKET_FIELDS].sum().reset_index()
+        hourly["day"] = hourly["hour"].str[:10]
+        daily = hourly.groupby(["container", "day"], sort=False)[BUCKET_FIELDS].sum().reset_index()
+
+        self._merge(self.hourly, hourly, "hour")
+        self._merge(self.daily, daily, "day")
+
+        # Última muestra de cada contenedor (para el trapecio de la próxima actualización)
+        last_idx = np.flatnonzero(np.r_[containers[1:] != containers[:-1], True])
+        for i in last_idx:
+            self.last[containers[i]] = [int(epoch[i]), None if np.isnan(power[i]) else float(power[i])]
+
+        self._prune()
+        self.changed = True
+        return len(df)
+
+    @staticmethod
+    def _merge(target, frame, key_col):
+        for container, key, *values in frame[["container", key_col] + BUCKET_FIELDS].itertuples(index=False):
+            per_container = target.setdefault(container, {})
+            current = per_container.get(key)
+            values = [round(float(v), 4) for v in values]
+            per_container[key] = [a + b for a, b in zip(current, values)] if current else values
+
+    def _prune(self):
+        now = datetime.now(PARAGUAY_TZ)
+        hour_cutoff = (now - timedelta(days=HOURLY_RETENTION_DAYS)).strftime("%Y-%m-%dT%H")
+        day_cutoff = (now - timedelta(days=DAILY_RETENTION_DAYS)).strftime("%Y-%m-%d")
+        for table, cutoff in ((self.hourly, hour_cutoff), (self.daily, day_cutoff)):
+            for per_container in table.values():
+                for key in [k for k in per_container if k < cutoff]:
+                    del per_container[key]
+
+    def frame(self, resolution="daily", start=None, end=None):
+        """
+        Métricas por contenedor y período como DataFrame (columnas METRIC_COLUMNS)
+
+        Args:
+            resolution: "daily" o "hourly"
+            start, end: límites inclusive 'YYYY-MM-DD' (None = sin límite)
+        """
+        table = self.daily if resolution == "daily" else self.hourly
+        rows = []
+        for container in sorted(table):
+            for key in sorted(table[container]):
+                day = key[:10]
+                if (start and day < start) or (end and day > end):
+                    continue
+                period = key if resolution == "daily" else f"{day} {key[11:13]}:00"
+                rows.append({"Contenedor": container, "Período": period,
+                             **_bucket_metrics(table[container][key])})
+        return pd.DataFrame(rows, columns=METRIC_COLUMNS)
+
+    def totals(self, days=7):
+        """Agregado por contenedor de los últimos `days` días: {contenedor: métricas}"""
+        start = (datetime.now(PARAGUAY_TZ) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        result = {}
+        for container in sorted(self.daily):
+            selected = [v for k, v in self.daily[container].items() if k >= start]
+            if selected:
+                result[container] = _bucket_metrics(np.sum(selected, axis=0).tolist())
+        return result
+
+    def format_summary(self, days=7):
+        """Resumen de eficiencia para Telegram"""
+        totals = self.totals(days)
+        msg = f"⚡ EFICIENCIA DE LA FLOTA - Últimos {days} días\n"
+        msg += "━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        if not totals:
+            return msg + "\n📊 Todavía no hay datos suficientes."
+
+        def fmt(value, suffix=""):
+            return "N/A" if value is None else f"{value}{suffix}"
+
+        total_energy = 0.0
+        for container, m in totals.items():
+            total_energy += m["Energía (kWh)"]
+            msg += f"\n📦 {container}\n"
+            msg += f"  🔋 Eficiencia: {fmt(m['Eficiencia (J/TH)'], ' J/TH')}\n"
+            msg += f"  🟢 Uptime: {fmt(m['Uptime %'], '%')}\n"
+            msg += f"  ⛏️ Disponibilidad mineros: {fmt(m['Disponibilidad %'], '%')}\n"
+            msg += f"  💎 Hashrate prom: {fmt(m['Hashrate prom (PH/s)'], ' PH/s')}\n"
+            msg += f"  ⚡ Energía: {m['Energía (kWh)']:,.0f} kWh\n"
+        msg += f"\n🏭 Energía total: {total_energy:,.0f} kWh ({total_energy / 1000:,.1f} MWh)"
+        return msg
+
+
+def _containers(history):
+    return {c for record in history for c in (record.get("data") or {})}
+
+
+def load_analytics(storage, history):
+    """
+    Carga la analítica y la pone al día con un historial ya cargado (sin guardar).
+    Útil para lectores (reportes) que no deben escribir el estado del poller.
+    Quien no tiene el historial en memoria usa FleetAnalytics.load (solo los buckets).
+    """
+    analytics = FleetAnalytics.load(storage)
+    analytics.update(history)
+    return analytics
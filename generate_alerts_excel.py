@@ -1,23 +1,24 @@
 """
 Módulo para generar reportes de alertas en Excel
-Uso: python generate_alerts_excel.py [--days 7]
+Uso: python generate_alerts_excel.py [--days 7] [--export csv|parquet]
 """
 
-import json
 import os
-from datetime import datetime, timedelta
+import re
+from datetime import datetime
 from zoneinfo import ZoneInfo
 import argparse
+import numpy as np
 import pandas as pd
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
 from pathlib import Path
 
-# Importar módulo de Dropbox storage
-try:
-    from dropbox_storage import storage as dropbox_storage
-    DROPBOX_AVAILABLE = True
-except ImportError:
-    DROPBOX_AVAILABLE = False
-    dropbox_storage = None
+from storage import default_storage, default_local_path
+from incidents import INCIDENTS_FILE, incidents_frame
+from timestamps import parse_timestamps, within_days
 
 PARAGUAY_TZ = ZoneInfo("America/Asuncion")
 
@@ -31,10 +32,12 @@ if env_file.exists():
                 key, value = line.split("=", 1)
                 os.environ[key.strip()] = value.strip()
 
-DROPBOX_PATH = os.environ.get("DROPBOX_PATH", "")
-STORAGE_PATH = Path(DROPBOX_PATH) if DROPBOX_PATH else Path(__file__).parent
+# Los Excel se generan en disco local (DROPBOX_PATH o carpeta actual)
+STORAGE_PATH = default_local_path()
 
-ALERTS_HISTORY_FILE = str(STORAGE_PATH / "fbox_alerts_history.json")
+ALERTS_HISTORY_FILE = "fbox_alerts_history.json"
+
+HEADER_FONT = Font(bold=True)
 
 def now_paraguay():
     """Retorna la hora actual en el huso horario de Paraguay"""
@@ -42,67 +45,139 @@ def now_paraguay():
 
 def load_alerts_history():
     """Carga el historial de alertas desde el archivo JSON"""
-    try:
-        # Intentar leer desde Dropbox primero
-        history = None
-        if DROPBOX_AVAILABLE and dropbox_storage and dropbox_storage.is_available():
-            history = dropbox_storage.read_json("fbox_alerts_history.json")
-            if history:
-                return history
-        
-        # Fallback a archivo local
-        if os.path.exists(ALERTS_HISTORY_FILE):
-            with open(ALERTS_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-    except Exception as e:
-        print(f"Error cargando historial de alertas: {e}")
-    return []
+    return default_storage().read_json(ALERTS_HISTORY_FILE, []) or []
+
+# ============ PIPELINE VECTORIZADO ============
+WEEKDAYS_ES = np.array(['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'], dtype=object)
+
+# Una sola regex para categorizar: cada lookahead opcional captura su palabra clave
+# en cualquier parte del texto, y la prioridad la da el orden de las columnas
+CATEGORY_PATTERN = re.compile(
+    r"^(?:(?=.*?(?P<offline>offline|crítico)))?"
+    r"(?:(?=.*?(?P<anomalia>anomalía)))?"
+    r"(?:(?=.*?(?P<pronostico>pronóstico)))?"
+    r"(?:(?=.*?(?P<tanque>punto caliente|desbalance)))?"
+    r"(?:(?=.*?(?P<temperatura>temperatura)))?"
+    r"(?:(?=.*?(?P<mineros>mineros caídos|desgaste de mineros|mineros intermitentes)))?"
+    r"(?:(?=.*?(?P<potencia>potencia)))?"
+    r"(?:(?=.*?(?P<inmersion>inmersión)))?"
+    r"(?:(?=.*?(?P<ventilador>ventilador)))?",
+    re.IGNORECASE | re.DOTALL
+)
+CATEGORY_LABELS = {
+    "offline": "CRÍTICO - Offline",
+    "anomalia": "Anomalía",
+    "pronostico": "Pronóstico Temperatura",
+    "tanque": "Tanque Caliente",
+    "temperatura": "Temperatura Alta",
+    "mineros": "Mineros Caídos",
+    "potencia": "Potencia Anormal",
+    "inmersion": "Sistema Inmersión",
+    "ventilador": "Ventilador",
+}
+CONTAINER_PATTERN = re.compile(r"\b(C\d{2,})\b")
+
+def categorize_series(messages):
+    """Categoriza todas las alertas con una sola regex (str.extract)"""
+    # Las alertas se repiten mucho: la regex corre solo sobre los textos únicos
+    codes, uniques = pd.factorize(messages)
+    matches = pd.Series(uniques, dtype=object).str.extract(CATEGORY_PATTERN)
+    # Primera categoría encontrada según la prioridad (orden de columnas)
+    first = matches.notna().to_numpy()
+    labels = np.array([CATEGORY_LABELS[c] for c in matches.columns], dtype=object)
+    categories = np.where(first.any(axis=1), labels[first.argmax(axis=1)], "Otro")
+    return pd.Series(categories[codes], index=messages.index, dtype=object)
+
+def extract_container_series(messages):
+    """Extrae el nombre del contenedor (C01, C02, ...) de todas las alertas"""
+    codes, uniques = pd.factorize(messages)
+    containers = pd.Series(uniques, dtype=object).str.extract(CONTAINER_PATTERN, expand=False)
+    return pd.Series(containers.fillna("N/A").to_numpy()[codes], index=messages.index, dtype=object)
+
+def alerts_to_frame(history):
+    """Convierte el historial [{timestamp, alerts: [...]}] en una fila por alerta"""
+    if not history:
+        return pd.DataFrame(columns=["timestamp", "Alerta"])
+    raw = pd.DataFrame.from_records(history, columns=["timestamp", "alerts"])
+    raw = raw.explode("alerts", ignore_index=True)
+    raw = raw[raw["alerts"].notna()].rename(columns={"alerts": "Alerta"})
+    raw["timestamp"] = raw["timestamp"].fillna("").astype(str)
+    raw["Alerta"] = raw["Alerta"].astype(str)
+    return raw.reset_index(drop=True)
+
+def build_alerts_frame(history, days=0):
+    """
+    Prepara el DataFrame del reporte: explota las alertas una sola vez y hace
+    parseo, filtro por días, categoría y contenedor con operaciones vectorizadas.
+    """
+    df = alerts_to_frame(history)
+    dt = parse_timestamps(df["timestamp"])
+    
+    if days > 0:
+        keep = within_days(dt, days, now_paraguay())
+        df, dt = df[keep], dt[keep]
+    
+    valid = dt.notna()
+    weekday = pd.Series("", index=df.index, dtype=object)
+    weekday[valid] = WEEKDAYS_ES[dt[valid].dt.weekday.to_numpy()]
+    
+    # Fecha y hora local como texto: conversión numpy a ISO (mucho más rápida que strftime)
+    iso = pd.Series(dt.dt.tz_localize(None).to_numpy().astype("datetime64[s]").astype("U19"),
+                    index=df.index)
+    
+    return pd.DataFrame({
+        'Fecha': iso.str.slice(0, 10).where(valid, df["timestamp"]),
+        'Hora': iso.str.slice(11, 19).where(valid, ""),
+        'Día': weekday,
+        'Contenedor': extract_container_series(df["Alerta"]),
+        'Categoría': categorize_series(df["Alerta"]),
+        'Alerta': df["Alerta"],
+    }).reset_index(drop=True)
 
 def filter_alerts_by_days(alerts, days):
     """Filtra alertas por número de días hacia atrás"""
-    if days <= 0:
+    if days <= 0 or not alerts:
         return alerts
     
-    cutoff_date = now_paraguay() - timedelta(days=days)
-    filtered = []
-    
-    for alert in alerts:
-        try:
-            alert_time = datetime.fromisoformat(alert['timestamp'])
-            if alert_time >= cutoff_date:
-                filtered.append(alert)
-        except:
-            continue
-    
-    return filtered
+    keep = within_days(pd.Series([a.get('timestamp', '') for a in alerts]), days, now_paraguay())
+    return [alert for alert, k in zip(alerts, keep) if k]
 
 def categorize_alert(alert_text):
     """Categoriza el tipo de alerta basado en el texto"""
-    alert_lower = alert_text.lower()
-    
-    if "offline" in alert_lower or "crítico" in alert_lower:
-        return "CRÍTICO - Offline"
-    elif "temperatura" in alert_lower:
-        return "Temperatura Alta"
-    elif "mineros caídos" in alert_lower:
-        return "Mineros Caídos"
-    elif "potencia" in alert_lower:
-        return "Potencia Anormal"
-    elif "inmersión" in alert_lower:
-        return "Sistema Inmersión"
-    elif "ventilador" in alert_lower:
-        return "Ventilador"
-    else:
-        return "Otro"
+    return categorize_series(pd.Series([alert_text])).iloc[0]
 
 def extract_container_from_alert(alert_text):
     """Extrae el nombre del contenedor de la alerta"""
-    if "C01" in alert_text:
-        return "C01"
-    elif "C02" in alert_text:
-        return "C02"
-    else:
-        return "N/A"
+    match = CONTAINER_PATTERN.search(alert_text)
+    return match.group(1) if match else "N/A"
+
+def column_widths(df, max_width=80):
+    """Ancho de cada columna según el texto más largo (vectorizado sobre el DataFrame)"""
+    widths = []
+    for col in df.columns:
+        longest = df[col].astype(str).str.len().max() if len(df) else 0
+        longest = 0 if pd.isna(longest) else int(longest)  # columna sin valores (todo None)
+        widths.append(min(max(len(str(col)), longest) + 2, max_width))
+    return widths
+
+def write_sheet(wb, title, df):
+    """Escribe un DataFrame en una hoja nueva de un workbook write-only"""
+    ws = wb.create_sheet(title)
+    
+    # En modo write-only los anchos se definen antes de escribir filas
+    for idx, width in enumerate(column_widths(df), 1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
+    
+    header = []
+    for col in df.columns:
+        cell = WriteOnlyCell(ws, value=str(col))
+        cell.font = HEADER_FONT
+        header.append(cell)
+    ws.append(header)
+    
+    for row in df.itertuples(index=False, name=None):
+        ws.append(row)
+    return ws
 
 def generate_excel_report(days=7, output_file=None):
     """
@@ -121,85 +196,51 @@ def generate_excel_report(days=7, output_file=None):
         print("❌ No hay alertas registradas en el historial")
         return None
     
-    # Filtrar por días si es necesario
+    # Preparar datos para DataFrame (parseo, filtro y categorías vectorizados)
+    df = build_alerts_frame(alerts, days)
     if days > 0:
-        alerts = filter_alerts_by_days(alerts, days)
         print(f"📅 Filtrando alertas de los últimos {days} días")
     
-    if not alerts:
+    if df.empty:
         print(f"❌ No hay alertas en los últimos {days} días")
         return None
     
-    # Preparar datos para DataFrame
-    data = []
-    for alert in alerts:
-        timestamp = alert.get('timestamp', '')
-        alert_messages = alert.get('alerts', [])
-        
-        try:
-            dt = datetime.fromisoformat(timestamp)
-            date_str = dt.strftime('%Y-%m-%d')
-            time_str = dt.strftime('%H:%M:%S')
-            weekday = ['Lunes', 'Martes', 'Miércoles', 'Jueves', 'Viernes', 'Sábado', 'Domingo'][dt.weekday()]
-        except:
-            date_str = timestamp
-            time_str = ""
-            weekday = ""
-        
-        for alert_msg in alert_messages:
-            data.append({
-                'Fecha': date_str,
-                'Hora': time_str,
-                'Día': weekday,
-                'Contenedor': extract_container_from_alert(alert_msg),
-                'Categoría': categorize_alert(alert_msg),
-                'Alerta': alert_msg
-            })
-    
-    # Crear DataFrame
-    df = pd.DataFrame(data)
-    
     # Generar nombre de archivo si no se especifica
     if output_file is None:
         timestamp_str = now_paraguay().strftime('%Y%m%d_%H%M%S')
         output_file = str(STORAGE_PATH / f"fbox_alertas_{timestamp_str}.xlsx")
     
-    # Crear archivo Excel con formato
-    with pd.ExcelWriter(output_file, engine='openpyxl') as writer:
-        # Hoja principal con todas las alertas
-        df.to_excel(writer, sheet_name='Todas las Alertas', index=False)
-        
-        # Hoja de resumen por categoría
-        summary_by_category = df.groupby('Categoría').size().reset_index(name='Cantidad')
-        summary_by_category = summary_by_category.sort_values('Cantidad', ascending=False)
-        summary_by_category.to_excel(writer, sheet_name='Resumen por Categoría', index=False)
-        
-        # Hoja de resumen por contenedor
-        summary_by_container = df.groupby('Contenedor').size().reset_index(name='Cantidad')
-        summary_by_container = summary_by_container.sort_values('Cantidad', ascending=False)
-        summary_by_container.to_excel(writer, sheet_name='Resumen por Contenedor', index=False)
-        
-        # Hoja de resumen por día
-        summary_by_date = df.groupby(['Fecha', 'Día']).size().reset_index(name='Cantidad')
-        summary_by_date.to_excel(writer, sheet_name='Resumen por Día', index=False)
-        
-        # Ajustar ancho de columnas
-        for sheet_name in writer.sheets:
-            worksheet = writer.sheets[sheet_name]
-            for column in worksheet.columns:
-                max_length = 0
-                column_letter = column[0].column_letter
-                for cell in column:
-                    try:
-                        if len(str(cell.value)) > max_length:
-                            max_length = len(str(cell.value))
-                    except:
-                        pass
-                adjusted_width = min(max_length + 2, 80)
-                worksheet.column_dimensions[column_letter].width = adjusted_width
+    # Crear archivo Excel en modo write-only: las filas se escriben en streaming
+    # y no se mantiene en memoria un objeto por celda
+    wb = Workbook(write_only=True)
+    
+    # Hoja principal con todas las alertas
+    write_sheet(wb, 'Todas las Alertas', df)
+    
+    # Hoja de resumen por categoría
+    summary_by_category = df.groupby('Categoría').size().reset_index(name='Cantidad')
+    summary_by_category = summary_by_category.sort_values('Cantidad', ascending=False)
+    write_sheet(wb, 'Resumen por Categoría', summary_by_category)
+    
+    # Hoja de resumen por contenedor
+    summary_by_container = df.groupby('Contenedor').size().reset_index(name='Cantidad')
+    summary_by_container = summary_by_container.sort_values('Cantidad', ascending=False)
+    write_sheet(wb, 'Resumen por Contenedor', summary_by_container)
+    
+    # Hoja de resumen por día
+    summary_by_date = df.groupby(['Fecha', 'Día']).size().reset_index(name='Cantidad')
+    write_sheet(wb, 'Resumen por Día', summary_by_date)
+    
+    # Hoja de incidentes (alertas correlacionadas entre contenedores)
+    incidents = default_storage().read_json(INCIDENTS_FILE, {}) or {}
+    incident_df = incidents_frame(incidents.get("log", []) + incidents.get("open", []), days, PARAGUAY_TZ)
+    if not incident_df.empty:
+        write_sheet(wb, 'Incidentes', incident_df)
+    
+    wb.save(output_file)
     
     print(f"✅ Reporte generado: {output_file}")
-    print(f"📊 Total de alertas: {len(data)}")
+    print(f"📊 Total de alertas: {len(df)}")
     print(f"📅 Período: {df['Fecha'].min()} - {df['Fecha'].max()}")
     
     return output_file
@@ -235,10 +276,18 @@ if __name__ == "__main__":
                        help='Nombre del archivo de salida')
     parser.add_argument('--summary', action='store_true',
                        help='Solo mostrar resumen sin generar Excel')
+    parser.add_argument('--export', choices=['csv', 'parquet'], default=None,
+                       help='Exportar historial y alertas a CSV gzip o Parquet en vez de Excel')
     
     args = parser.parse_args()
     
     if args.summary:
         print_summary()
+    elif args.export:
+        from export_data import export_data, ExportError
+        try:
+            export_data(days=args.days, fmt=args.export)
+        except ExportError as e:
+            print(f"❌ {e}")
     else:
         generate_excel_report(days=args.days, output_file=args.output)
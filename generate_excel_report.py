@@ -1,86 +1,97 @@
-import json
-import os
+"""
+Reporte Excel con historial de estados y alertas
+Uso: python generate_excel_report.py [--desde 2026-01-01] [--hasta 2026-01-07]
+"""
+import argparse
 from pathlib import Path
-from datetime import datetime
+from datetime import datetime, date
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.formatting.rule import ColorScaleRule
+from openpyxl.utils import get_column_letter
 from zoneinfo import ZoneInfo
 
+from storage import default_storage
+from fleet_analytics import load_analytics, METRIC_COLUMNS
+from subbox_stats import subbox_frame
+
 PARAGUAY_TZ = ZoneInfo("America/Asuncion")
 STORAGE_PATH = Path(__file__).parent
-HISTORY_FILE = str(STORAGE_PATH / "fbox_history.json")
-ALERTS_HISTORY_FILE = str(STORAGE_PATH / "fbox_alerts_history.json")
+HISTORY_FILE = "fbox_history.json"
+ALERTS_HISTORY_FILE = "fbox_alerts_history.json"
 
-def generate_excel():
-    """Genera reporte Excel con historial de estados y alertas"""
-    
-    # Cargar datos
-    try:
-        with open(HISTORY_FILE, 'r') as f:
-            history = json.load(f)
-    except:
-        print("❌ No se encontró historial de estados")
-        return
-    
-    try:
-        with open(ALERTS_HISTORY_FILE, 'r', encoding='utf-8') as f:
-            alerts_history = json.load(f)
-    except:
-        alerts_history = []
-    
-    if not history:
-        print("❌ No hay datos en el historial")
-        return
-    
-    # Crear workbook
-    wb = Workbook()
-    wb.remove(wb.active)
-    
-    # ============ HOJA 1: RESUMEN ============
-    ws_summary = wb.create_sheet("Resumen", 0)
-    ws_summary['A1'] = "📊 REPORTE SEMANAL FBOX"
-    ws_summary['A1'].font = Font(bold=True, size=14, color="FFFFFF")
-    ws_summary['A1'].fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-    ws_summary.merge_cells('A1:B1')
-    
-    ws_summary['A3'] = f"Período: {history[0].get('timestamp', '').split('T')[0]} a {history[-1].get('timestamp', '').split('T')[0]}"
-    ws_summary['A4'] = f"Generado: {datetime.now(PARAGUAY_TZ).strftime('%Y-%m-%d %H:%M:%S')}"
-    ws_summary['A5'] = f"Total de registros: {len(history)}"
-    ws_summary['A6'] = f"Total de alertas: {len(alerts_history)}"
-    
-    ws_summary.column_dimensions['A'].width = 50
-    
-    # ============ HOJA 2: HISTORIAL DE ESTADOS ============
-    ws_history = wb.create_sheet("Historial")
-    
-    # Headers
-    headers = ["Timestamp", "Contenedor", "Status", "Temp Aceite (°C)", "Temp Contenedor (°C)", 
-               "Mineros Online", "Mineros Offline", "Hashrate (PH/s)", "Potencia (kW)"]
-    ws_history.append(headers)
-    
-    # Estilos
-    header_fill = PatternFill(start_color="366092", end_color="366092", fill_type="solid")
-    header_font = Font(bold=True, color="FFFFFF")
-    thin_border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
-    )
-    
-    for cell in ws_history[1]:
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.border = thin_border
-    
-    # Datos
+HISTORY_HEADERS = ["Timestamp", "Contenedor", "Status", "Temp Aceite (°C)", "Temp Contenedor (°C)",
+                   "Mineros Online", "Mineros Offline", "Hashrate (PH/s)", "Potencia (kW)"]
+
+def build_styles():
+    """Estilos con nombre: se registran una vez en el workbook y todas las celdas los comparten"""
+    thin = Side(style='thin')
+    thin_border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    return [
+        NamedStyle(name="fbox_title",
+                   font=Font(bold=True, size=14, color="FFFFFF"),
+                   fill=PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")),
+        NamedStyle(name="fbox_header",
+                   font=Font(bold=True, color="FFFFFF"),
+                   fill=PatternFill(start_color="366092", end_color="366092", fill_type="solid"),
+                   border=thin_border),
+        NamedStyle(name="fbox_cell",
+                   border=thin_border,
+                   alignment=Alignment(horizontal="center")),
+        NamedStyle(name="fbox_alert_header",
+                   font=Font(bold=True, color="FFFFFF"),
+                   fill=PatternFill(start_color="C00000", end_color="C00000", fill_type="solid"),
+                   border=thin_border),
+        NamedStyle(name="fbox_alert_cell",
+                   border=thin_border,
+                   alignment=Alignment(wrap_text=True, vertical="top")),
+    ]
+
+def styled_row(ws, values, style):
+    """Fila de celdas write-only con un estilo con nombre"""
+    cells = []
+    for value in values:
+        cell = WriteOnlyCell(ws, value=value)
+        cell.style = style
+        cells.append(cell)
+    return cells
+
+def _as_date_str(value):
+    """Normaliza date/datetime/str a 'YYYY-MM-DD' (None = sin límite)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, (datetime, date)):
+        return value.strftime("%Y-%m-%d")
+    return str(value)[:10]
+
+def filter_by_date(records, start=None, end=None):
+    """
+    Filtra registros por fecha (inclusive) comparando el prefijo ISO del timestamp,
+    sin parsear fechas: una exportación parcial solo recorre la lista una vez.
+    """
+    start, end = _as_date_str(start), _as_date_str(end)
+    if not start and not end:
+        return records
+    selected = []
+    for record in records:
+        day = record.get("timestamp", "")[:10]
+        if start and day < start:
+            continue
+        if end and day > end:
+            continue
+        selected.append(record)
+    return selected
+
+def iter_history_rows(history):
+    """Genera las filas de la hoja Historial (una por contenedor y registro)"""
     for record in history:
         timestamp = record.get("timestamp", "")
         data = record.get("data", {})
-        
+
         for container_name, container_data in data.items():
             status = "🟢 ONLINE" if container_data.get("code") == 1 else "🔴 OFFLINE"
-            row = [
+            yield (
                 timestamp,
                 container_name,
                 status,
@@ -90,56 +101,129 @@ def generate_excel():
                 container_data.get("miner_offline"),
                 container_data.get("hashrate_ph"),
                 container_data.get("power_kw")
-            ]
-            ws_history.append(row)
-            
-            # Aplicar estilos a la fila
-            for cell in ws_history[ws_history.max_row]:
-                cell.border = thin_border
-                cell.alignment = Alignment(horizontal="center")
-    
-    # Ajustar ancho de columnas
+            )
+
+def generate_excel(start=None, end=None, output_file=None):
+    """
+    Genera reporte Excel con historial de estados y alertas
+
+    Args:
+        start: fecha inicial inclusive (date, datetime o 'YYYY-MM-DD'; None = desde el inicio)
+        end: fecha final inclusive (None = hasta el final)
+        output_file: ruta del archivo de salida (opcional)
+    """
+
+    # Cargar datos
+    storage = default_storage()
+    history = storage.read_json(HISTORY_FILE)
+    if history is None:
+        print("❌ No se encontró historial de estados")
+        return
+
+    alerts_history = storage.read_json(ALERTS_HISTORY_FILE, []) or []
+
+    # Analítica de eficiencia: buckets acumulados, al día con el historial cargado
+    analytics = load_analytics(storage, history)
+
+    history = filter_by_date(history, start, end)
+    alerts_history = filter_by_date(alerts_history, start, end)
+
+    if not history:
+        print("❌ No hay datos en el historial")
+        return
+
+    # Workbook write-only: las filas se escriben en streaming con estilos compartidos
+    wb = Workbook(write_only=True)
+    for style in build_styles():
+        wb.add_named_style(style)
+
+    # ============ HOJA 1: RESUMEN ============
+    ws_summary = wb.create_sheet("Resumen")
+    ws_summary.column_dimensions['A'].width = 50
+    ws_summary.append(styled_row(ws_summary, ["📊 REPORTE SEMANAL FBOX", None], "fbox_title"))
+    ws_summary.append([])
+    ws_summary.append([f"Período: {history[0].get('timestamp', '').split('T')[0]} a {history[-1].get('timestamp', '').split('T')[0]}"])
+    ws_summary.append([f"Generado: {datetime.now(PARAGUAY_TZ).strftime('%Y-%m-%d %H:%M:%S')}"])
+    ws_summary.append([f"Total de registros: {len(history)}"])
+    ws_summary.append([f"Total de alertas: {len(alerts_history)}"])
+
+    # ============ HOJA 2: HISTORIAL DE ESTADOS ============
+    ws_history = wb.create_sheet("Historial")
+
+    # Ajustar ancho de columnas (en write-only, antes de escribir filas)
     ws_history.column_dimensions['A'].width = 20
     for col in ['B', 'C', 'D', 'E', 'F', 'G', 'H', 'I']:
         ws_history.column_dimensions[col].width = 15
-    
-    # ============ HOJA 3: ALERTAS ============
+
+    ws_history.append(styled_row(ws_history, HISTORY_HEADERS, "fbox_header"))
+    for row in iter_history_rows(history):
+        ws_history.append(styled_row(ws_history, row, "fbox_cell"))
+
+    # ============ HOJA 3: EFICIENCIA (diaria y por hora) ============
+    start_day, end_day = _as_date_str(start), _as_date_str(end)
+    for title, resolution in (("Eficiencia", "daily"), ("Eficiencia por hora", "hourly")):
+        efficiency = analytics.frame(resolution, start_day, end_day)
+        if efficiency.empty:
+            continue
+        ws_eff = wb.create_sheet(title)
+        ws_eff.column_dimensions['A'].width = 12
+        ws_eff.column_dimensions['B'].width = 18
+        for col in ['C', 'D', 'E', 'F', 'G', 'H']:
+            ws_eff.column_dimensions[col].width = 20
+        ws_eff.append(styled_row(ws_eff, METRIC_COLUMNS, "fbox_header"))
+        for row in efficiency.astype(object).where(efficiency.notna(), None).itertuples(index=False):
+            ws_eff.append(styled_row(ws_eff, row, "fbox_cell"))
+
+    # ============ HOJA 4: MAPA DE CALOR POR TANQUE ============
+    # Máximo de cada tanque por hora; escala de color verde -> amarillo -> rojo
+    heatmap = subbox_frame(history)
+    if not heatmap.empty:
+        ws_heat = wb.create_sheet("Mapa de calor")
+        ws_heat.column_dimensions['A'].width = 18
+        for col in range(2, len(heatmap.columns) + 2):
+            ws_heat.column_dimensions[get_column_letter(col)].width = 12
+        ws_heat.freeze_panes = "B2"
+        ws_heat.append(styled_row(ws_heat, ["Hora"] + list(heatmap.columns), "fbox_header"))
+        for hour, values in zip(heatmap.index, heatmap.to_numpy()):
+            ws_heat.append(styled_row(ws_heat, [hour] + [None if v != v else float(v) for v in values], "fbox_cell"))
+        data_range = f"B2:{get_column_letter(len(heatmap.columns) + 1)}{len(heatmap) + 1}"
+        ws_heat.conditional_formatting.add(data_range, ColorScaleRule(
+            start_type="min", start_color="63BE7B",
+            mid_type="percentile", mid_value=50, mid_color="FFEB84",
+            end_type="max", end_color="F8696B"))
+
+    # ============ HOJA 5: ALERTAS ============
     if alerts_history:
         ws_alerts = wb.create_sheet("Alertas")
-        
-        # Headers
-        alert_headers = ["Timestamp", "Alerta"]
-        ws_alerts.append(alert_headers)
-        
-        for cell in ws_alerts[1]:
-            cell.fill = PatternFill(start_color="C00000", end_color="C00000", fill_type="solid")
-            cell.font = Font(bold=True, color="FFFFFF")
-            cell.border = thin_border
-        
+        ws_alerts.column_dimensions['A'].width = 20
+        ws_alerts.column_dimensions['B'].width = 80
+
+        ws_alerts.append(styled_row(ws_alerts, ["Timestamp", "Alerta"], "fbox_alert_header"))
+
         # Datos de alertas
         for record in alerts_history:
             timestamp = record.get("timestamp", "")
-            alerts = record.get("alerts", [])
-            
-            for alert in alerts:
-                row = [timestamp, alert]
-                ws_alerts.append(row)
-                
-                for cell in ws_alerts[ws_alerts.max_row]:
-                    cell.border = thin_border
-                    cell.alignment = Alignment(wrap_text=True, vertical="top")
-        
-        ws_alerts.column_dimensions['A'].width = 20
-        ws_alerts.column_dimensions['B'].width = 80
-    
+            for alert in record.get("alerts", []):
+                ws_alerts.append(styled_row(ws_alerts, [timestamp, alert], "fbox_alert_cell"))
+
     # Guardar archivo
-    timestamp = datetime.now(PARAGUAY_TZ).strftime("%Y%m%d_%H%M%S")
-    filename = f"FBOX_Report_{timestamp}.xlsx"
-    filepath = STORAGE_PATH / filename
-    
-    wb.save(filepath)
-    print(f"✅ Reporte Excel generado: {filepath}")
-    return filepath
+    if output_file is None:
+        timestamp = datetime.now(PARAGUAY_TZ).strftime("%Y%m%d_%H%M%S")
+        filename = f"FBOX_Report_{timestamp}.xlsx"
+        output_file = STORAGE_PATH / filename
+
+    wb.save(output_file)
+    print(f"✅ Reporte Excel generado: {output_file}")
+    return output_file
 
 if __name__ == "__main__":
-    generate_excel()
+    parser = argparse.ArgumentParser(description='Generar reporte Excel de historial FBOX')
+    parser.add_argument('--desde', type=str, default=None,
+                        help='Fecha inicial YYYY-MM-DD (inclusive)')
+    parser.add_argument('--hasta', type=str, default=None,
+                        help='Fecha final YYYY-MM-DD (inclusive)')
+    parser.add_argument('--output', type=str, default=None,
+                        help='Nombre del archivo de salida')
+
+    args = parser.parse_args()
+    generate_excel(start=args.desde, end=args.hasta, output_file=args.output)
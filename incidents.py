@@ -0,0 +1,221 @@
+"""
+Correlación de alertas de toda la flota en incidentes
+
+Cuando falla la energía o la red, todos los contenedores disparan la misma
+alerta a la vez. En lugar de un mensaje por contenedor, las notificaciones del
+mismo tipo se agrupan en un incidente con su lista de contenedores:
+
+- Las alertas nuevas del mismo tipo en la misma ejecución, o dentro de
+  `window_minutes` de la última alerta de un incidente abierto, se suman a él
+- Se envía a lo sumo un mensaje por tipo y tipo de notificación en cada ejecución
+  (nueva / persiste / resuelta), sin importar cuántos contenedores haya
+- El incidente se cierra cuando se resuelven todos sus contenedores y queda
+  registrado en fbox_incidents.json para los reportes
+"""
+from datetime import datetime
+
+INCIDENTS_FILE = "fbox_incidents.json"
+INCIDENT_WINDOW_MIN = 15   # minutos para sumar alertas nuevas a un incidente abierto
+INCIDENT_MIN_MEMBERS = 2   # contenedores a partir de los cuales se agrupa en un solo mensaje
+MAX_LISTED = 10            # contenedores listados en el mensaje (el resto como "y N más")
+MAX_LOG = 1000             # incidentes cerrados que se conservan
+
+
+def _members_text(containers):
+    listed = ", ".join(containers[:MAX_LISTED])
+    extra = len(containers) - MAX_LISTED
+    return f"{listed} y {extra} más" if extra > 0 else listed
+
+
+class IncidentCorrelator:
+    """
+    Args:
+        data: estado persistido {"next_id", "open": [incidente], "log": [incidente cerrado]}
+        labels: {tipo: nombre} para los mensajes
+        window_minutes: ventana para sumar alertas nuevas a un incidente abierto
+        min_members: tamaño de grupo a partir del cual se envía un solo mensaje
+    """
+
+    def __init__(self, data=None, labels=None, window_minutes=INCIDENT_WINDOW_MIN,
+                 min_members=INCIDENT_MIN_MEMBERS):
+        data = data if isinstance(data, dict) else {}
+        self.next_id = data.get("next_id", 1)
+        self.open = data.get("open", [])
+        self.log = data.get("log", [])
+        self.labels = labels or {}
+        self.window_seconds = window_minutes * 60
+        self.min_members = max(2, min_members)
+        self.changed = False
+
+    @classmethod
+    def load(cls, storage, **kwargs):
+        return cls(storage.read_json(INCIDENTS_FILE, {}), **kwargs)
+
+    def save(self, storage):
+        """Guarda solo si hubo cambios"""
+        if self.changed:
+            storage.write_json(INCIDENTS_FILE, {
+                "next_id": self.next_id, "open": self.open, "log": self.log[-MAX_LOG:]})
+            self.changed = False
+
+    def label(self, alert_type):
+        return self.labels.get(alert_type, alert_type)
+
+    def _find_open(self, alert_type, container=None, joinable_at=None):
+        for incident in reversed(self.open):
+            if incident["type"] != alert_type:
+                continue
+            if container is not None and container in incident["active"]:
+                return incident
+            if joinable_at is not None and joinable_at - incident["last"] <= self.window_seconds:
+                return incident
+        return None
+
+    def process(self, notifications, now=None):
+        """
+        Agrupa las notificaciones del AlertTracker de esta ejecución
+
+        Args:
+            notifications: [{"kind": "fire"|"renotify"|"resolve", "container", "type", "message"}]
+            now: datetime actual
+
+        Returns:
+            mensajes a enviar [{"kind", "type", "containers", "message"}], uno por grupo
+        """
+        now_ts = int((now or datetime.now()).timestamp())
+
+        # Agrupar por (tipo de notificación, tipo de alerta) manteniendo el orden de llegada
+        groups = {}
+        for n in notifications:
+            groups.setdefault((n["kind"], n["type"]), []).append(n)
+
+        messages = []
+        for (kind, alert_type), group in groups.items():
+            if kind == "fire":
+                messages.append(self._fire(alert_type, group, now_ts))
+            elif kind == "renotify":
+                messages.append(self._renotify(alert_type, group))
+            else:
+                messages.append(self._resolve(alert_type, group, now_ts))
+        return messages
+
+    def _fire(self, alert_type, group, now_ts):
+        containers = list(dict.fromkeys(n["container"] for n in group))
+        # Una alerta de flanco (caída) vuelve a disparar mientras sigue activa: si algún
+        # contenedor ya está en un incidente abierto se reutiliza, aunque esté fuera de la ventana
+        incident = next((i for c in containers
+                         if (i := self._find_open(alert_type, container=c)) is not None), None)
+        if incident is None:
+            incident = self._find_open(alert_type, joinable_at=now_ts)
+        joined = incident is not None
+        if incident is None:
+            incident = {"id": self.next_id, "type": alert_type, "label": self.label(alert_type),
+                        "start": now_ts, "last": now_ts, "end": None, "members": [], "active": [],
+                        "alerts": 0}
+            self.next_id += 1
+            self.open.append(incident)
+
+        new_members = [c for c in containers if c not in incident["members"]]
+        incident["members"].extend(new_members)
+        incident["active"].extend(c for c in containers if c not in incident["active"])
+        incident["alerts"] += len(group)
+        incident["last"] = now_ts
+        self.changed = True
+
+        label = self.label(alert_type)
+        if len(group) >= self.min_members:
+            message = (f"🚨 INCIDENTE #{incident['id']} - {label} en {len(containers)} contenedores: "
+                       f"{_members_text(containers)}")
+            if joined and len(incident["members"]) > len(containers):
+                message += f" (total del incidente: {len(incident['members'])})"
+            message += f"\n↳ {group[0]['message']}"
+        elif joined and new_members and len(incident["members"]) >= self.min_members:
+            message = (f"➕ INCIDENTE #{incident['id']} - {label}: se suma {_members_text(new_members)} "
+                       f"(total: {len(incident['members'])} contenedores)\n↳ {group[0]['message']}")
+        else:
+            message = group[0]["message"]
+        return {"kind": "fire", "type": alert_type, "containers": containers, "message": message}
+
+    def _renotify(self, alert_type, group):
+        containers = [n["container"] for n in group]
+        if len(group) < self.min_members:
+            message = group[0]["message"]
+        else:
+            incident = self._find_open(alert_type, container=containers[0])
+            ref = f" #{incident['id']}" if incident else ""
+            message = (f"🔁 PERSISTE INCIDENTE{ref} - {self.label(alert_type)} en {len(containers)} "
+                       f"contenedores: {_members_text(containers)}")
+        return {"kind": "renotify", "type": alert_type, "containers": containers, "message": message}
+
+    def _resolve(self, alert_type, group, now_ts):
+        containers = [n["container"] for n in group]
+        closed = []
+        for container in containers:
+            # De todos los incidentes abiertos del tipo (estados viejos pueden tenerlo en más de uno)
+            for incident in self.open:
+                if incident["type"] != alert_type or container not in incident["active"]:
+                    continue
+                incident["active"].remove(container)
+                self.changed = True
+                if not incident["active"] and incident not in closed:
+                    closed.append(incident)
+
+        for incident in closed:
+            incident["end"] = now_ts
+            self.open.remove(incident)
+            self.log.append(incident)
+
+        if len(group) < self.min_members:
+            message = group[0]["message"]
+        else:
+            message = (f"✅ RESUELTO - {self.label(alert_type)} en {len(containers)} contenedores: "
+                       f"{_members_text(containers)}")
+            multi = [i for i in closed if len(i["members"]) >= self.min_members]
+            if multi:
+                message += "\n🏁 Incidente cerrado: " + ", ".join(f"#{i['id']}" for i in multi)
+        return {"kind": "resolve", "type": alert_type, "containers": containers, "message": message}
+
+    def records(self):
+        """Incidentes cerrados y abiertos (los abiertos con end=None)"""
+        return self.log + self.open
+
+
+def incidents_frame(records, days=0, tz=None):
+    """
+    Incidentes como DataFrame para el reporte Excel
+
+    Args:
+        records: lista de incidentes (IncidentCorrelator.records())
+        days: últimos N días según el inicio (0 = todos)
+        tz: zona horaria para mostrar las fechas
+    """
+    import pandas as pd
+
+    columns = ["ID", "Inicio", "Fin", "Duración (min)", "Tipo", "Cantidad", "Contenedores", "Alertas"]
+    if not records:
+        return pd.DataFrame(columns=columns)
+
+    df = pd.DataFrame.from_records(records)
+    if days > 0:
+        cutoff = datetime.now(tz).timestamp() - days * 86400
+        df = df[df["start"] >= cutoff]
+    if df.empty:
+        return pd.DataFrame(columns=columns)
+
+    start = pd.to_datetime(df["start"], unit="s", utc=True)
+    end = pd.to_datetime(df["end"], unit="s", utc=True)
+    if tz is not None:
+        start, end = start.dt.tz_convert(tz), end.dt.tz_convert(tz)
+    duration = ((end - start).dt.total_seconds() / 60).round(0)
+
+    out = pd.DataFrame({
+        "ID": df["id"].to_numpy(),
+        "Inicio": start.dt.strftime("%Y-%m-%d %H:%M").to_numpy(),
+        "Fin": end.dt.strftime("%Y-%m-%d %H:%M").fillna("En curso").to_numpy(),
+        "Duración (min)": duration.astype(object).where(duration.notna(), None).to_numpy(),
+        "Tipo": df["label"].to_numpy(),
+        "Cantidad": df["members"].str.len().to_numpy(),
+        "Contenedores": df["members"].str.join(", ").to_numpy(),
+        "Alertas": df["alerts"].to_numpy(),
+    })
+    return out.sort_values("ID", ascending=False).reset_index(drop=True)
@@ -0,0 +1,81 @@
+"""
+Mensaje de estado fijado (pinned) que se actualiza en el lugar con editMessageText
+
+En vez de enviar el reporte completo como mensaje nuevo, se mantiene un único
+mensaje fijado por chat. Solo se edita si el contenido cambió (se compara un
+hash del texto sin la línea de fecha/hora), así una ejecución sin cambios no
+hace ninguna llamada a la API.
+"""
+import hashlib
+
+from telegram_sender import PRIORITY_ROUTINE
+
+LIVE_STATUS_FILE = "live_status.json"
+
+
+def status_fingerprint(text):
+    """Hash del reporte ignorando la línea de fecha/hora (segunda línea de check_status)"""
+    lines = text.splitlines()
+    body = "\n".join(lines[:1] + lines[2:])
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()[:16]
+
+
+class LiveStatus:
+    """
+    Args:
+        storage: backend donde se guarda {chat_id: {message_id, hash}}
+        sender: TelegramSender para las llamadas a la API
+    """
+
+    def __init__(self, storage, sender):
+        self.storage = storage
+        self.sender = sender
+        data = storage.read_json(LIVE_STATUS_FILE, {})
+        self.messages = data if isinstance(data, dict) else {}
+
+    def update(self, chat_id, text):
+        """
+        Actualiza el mensaje fijado del chat
+
+        Returns:
+            "unchanged", "edited", "sent" o "error"
+        """
+        key = str(chat_id)
+        fingerprint = status_fingerprint(text)
+        entry = self.messages.get(key)
+
+        if entry and entry.get("hash") == fingerprint:
+            return "unchanged"
+
+        if entry and entry.get("message_id"):
+            result = self.sender.call("editMessageText", {
+                "chat_id": chat_id,
+                "message_id": entry["message_id"],
+                "text": text,
+            }, priority=PRIORITY_ROUTINE)
+            if result and result.get("ok"):
+                self._remember(key, entry["message_id"], fingerprint)
+                return "edited"
+            if result and "not modified" in str(result.get("description", "")):
+                self._remember(key, entry["message_id"], fingerprint)
+                return "unchanged"
+            # El mensaje se borró o ya no se puede editar: crear uno nuevo
+            print(f"⚠️ No se pudo editar el estado fijado en {chat_id}: {result}")
+
+        result = self.sender.send_message(chat_id, text, priority=PRIORITY_ROUTINE)
+        if not (result and result.get("ok")):
+            print(f"❌ Error enviando estado a {chat_id}: {result}")
+            return "error"
+
+        message_id = result["result"]["message_id"]
+        self.sender.call("pinChatMessage", {
+            "chat_id": chat_id,
+            "message_id": message_id,
+            "disable_notification": "true",
+        }, priority=PRIORITY_ROUTINE)
+        self._remember(key, message_id, fingerprint)
+        return "sent"
+
+    def _remember(self, key, message_id, fingerprint):
+        self.messages[key] = {"message_id": message_id, "hash": fingerprint}
+        self.storage.write_json(LIVE_STATUS_FILE, self.messages)
@@ -0,0 +1,281 @@
+"""
+Métricas de tiempo por fase de cada ejecución (reloj monotónico)
+
+Una ejecución del monitor (o un comando del bot) abre un RunMetrics; cada fase
+se mide con `span()` y las llamadas HTTP (endpoints de FBox, métodos de
+Telegram) se acumulan por endpoint: llamadas, errores, reintentos, total y
+máximo en ms. Al terminar se agrega una línea compacta al log del día
+fbox_metrics_YYYY-MM-DD.jsonl (un archivo por día: en Dropbox un append
+descarga y vuelve a subir el archivo, así se mantiene chico).
+
+Los comandos del bot no escriben un registro cada uno: se acumulan en un
+MetricsBuffer y se escriben por lotes (cada METRICS_FLUSH_EVERY registros o
+METRICS_FLUSH_SECONDS segundos, y al apagar el bot).
+
+Para ver tendencias: python metrics.py [--days 7] [--kind poll]
+"""
+import argparse
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+from zoneinfo import ZoneInfo
+
+PARAGUAY_TZ = ZoneInfo("America/Asuncion")
+METRICS_PREFIX = "fbox_metrics_"
+API_PREFIX = "/api/index/"  # prefijo común de los endpoints de FBox
+
+METRICS_FLUSH_EVERY = 50       # registros en memoria antes de escribir
+METRICS_FLUSH_SECONDS = 300    # o cada tantos segundos
+
+# Posiciones dentro de las estadísticas de cada endpoint
+CALLS, ERRORS, RETRIES, TOTAL_MS, MAX_MS = range(5)
+
+
+def metrics_file(when=None):
+    """Log del día (fbox_metrics_2026-10-19.jsonl)"""
+    return f"{METRICS_PREFIX}{(when or datetime.now(PARAGUAY_TZ)).strftime('%Y-%m-%d')}.jsonl"
+
+
+def endpoint_name(url):
+    """Nombre corto de un endpoint: ruta sin query ni prefijo común (ej: "fbox.boxlist/detail")"""
+    path = urlparse(url).path
+    return path[len(API_PREFIX):] if path.startswith(API_PREFIX) else path.lstrip("/")
+
+
+class RunMetrics:
+    """
+    Args:
+        kind: tipo de ejecución ("poll", "command", ...)
+        **attrs: datos adicionales del registro (ej: command="/estado")
+    """
+
+    def __init__(self, kind, **attrs):
+        self.kind = kind
+        self.attrs = attrs
+        self.timestamp = datetime.now(PARAGUAY_TZ)
+        self.start = time.monotonic()
+        self.spans = {}
+        self.endpoints = {}
+        self.lock = threading.Lock()
+        self._phase = None
+
+    def elapsed_ms(self):
+        return round((time.monotonic() - self.start) * 1000, 1)
+
+    @contextmanager
+    def span(self, name):
+        """Mide una fase; si se repite, los tiempos se suman"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            ms = (time.monotonic() - start) * 1000
+            with self.lock:
+                self.spans[name] = round(self.spans.get(name, 0.0) + ms, 1)
+
+    def phase(self, name):
+        """Cierra la fase en curso (si hay) y abre `name`: para fases consecutivas sin anidar bloques"""
+        self.end_phase()
+        self._phase = (name, time.monotonic())
+
+    def end_phase(self):
+        if self._phase is not None:
+            name, start = self._phase
+            self._phase = None
+            with self.lock:
+                self.spans[name] = round(self.spans.get(name, 0.0) + (time.monotonic() - start) * 1000, 1)
+
+    def record_call(self, endpoint, ms, ok=True, retry=False):
+        """Suma una llamada HTTP a las estadísticas del endpoint"""
+        with self.lock:
+            stats = self.endpoints.setdefault(endpoint, [0, 0, 0, 0.0, 0.0])
+            stats[CALLS] += 1
+            stats[ERRORS] += 0 if ok else 1
+            stats[RETRIES] += 1 if retry else 0
+            stats[TOTAL_MS] = round(stats[TOTAL_MS] + ms, 1)
+            stats[MAX_MS] = round(max(stats[MAX_MS], ms), 1)
+
+    def summary(self):
+        """Registro compacto: {"ts", "kind", "total_ms", "spans", "endpoints": {nombre: [calls, errors, retries, total_ms, max_ms]}}"""
+        with self.lock:
+            record = {"ts": self.timestamp.isoformat(timespec="seconds"), "kind": self.kind,
+                      "total_ms": self.elapsed_ms(), "spans": dict(self.spans)}
+            if self.endpoints:
+                record["endpoints"] = {k: list(v) for k, v in self.endpoints.items()}
+        record.update(self.attrs)
+        return record
+
+    def save(self, storage):
+        """Cierra la fase en curso y agrega el registro al log del día"""
+        self.end_phase()
+        return storage.append_jsonl(metrics_file(self.timestamp), self.summary())
+
+
+class MetricsBuffer:
+    """
+    Registros en memoria que se escriben por lotes (un append por log diario)
+
+    Args:
+        storage: backend donde se escriben los logs
+        flush_every: cantidad de registros que dispara la escritura
+        flush_seconds: antigüedad máxima del lote antes de escribirlo
+    """
+
+    def __init__(self, storage, flush_every=METRICS_FLUSH_EVERY, flush_seconds=METRICS_FLUSH_SECONDS):
+        self.storage = storage
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self.records = []
+        self.last_flush = time.monotonic()
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+
+    def add(self, run):
+        """Cierra la fase en curso de `run`, guarda su registro y escribe el lote si corresponde"""
+        run.end_phase()
+        with self.lock:
+            self.records.append((metrics_file(run.timestamp), run.summary()))
+        self.flush_if_due()
+
+    def flush_if_due(self):
+        """Escribe el lote si llegó a flush_every registros o a flush_seconds de antigüedad"""
+        with self.lock:
+            due = self.records and (len(self.records) >= self.flush_every
+                                    or time.monotonic() - self.last_flush >= self.flush_seconds)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Escribe los registros pendientes; si falla la escritura se conservan para el próximo lote"""
+        with self.flush_lock:
+            with self.lock:
+                pending, self.records = self.records, []
+                self.last_flush = time.monotonic()
+            by_file = {}
+            for filename, record in pending:
+                by_file.setdefault(filename, []).append(record)
+            failed = []
+            for filename, records in by_file.items():
+                if not self.storage.extend_jsonl(filename, records):
+                    failed.extend((filename, r) for r in records)
+            if failed:
+                with self.lock:
+                    self.records[:0] = failed
+            return not failed
+
+
+# Ejecución activa del contexto (thread): los clientes HTTP (get_detail,
+# TelegramSender) registran sus llamadas aquí sin tener que recibir el objeto.
+# Es un ContextVar para que cada comando del bot, en su propio thread, tenga la suya.
+_active = contextvars.ContextVar("fbox_active_run", default=None)
+
+
+def start_run(kind, **attrs):
+    """Abre una ejecución, la deja activa en el contexto actual y la retorna"""
+    run = RunMetrics(kind, **attrs)
+    _active.set(run)
+    return run
+
+
+@contextmanager
+def activate(run):
+    """Deja `run` como ejecución activa dentro del bloque (restaura la anterior al salir)"""
+    token = _active.set(run)
+    try:
+        yield run
+    finally:
+        _active.reset(token)
+
+
+def active_run():
+    return _active.get()
+
+
+@contextmanager
+def span(name):
+    """Mide una fase en la ejecución activa (no hace nada si no hay)"""
+    run = _active.get()
+    if run is None:
+        yield
+    else:
+        with run.span(name):
+            yield
+
+
+def record_call(endpoint, ms, ok=True, retry=False, run=None):
+    """Registra una llamada HTTP en `run` o en la ejecución activa (no hace nada si no hay)"""
+    run = run or _active.get()
+    if run is not None:
+        run.record_call(endpoint, ms, ok, retry)
+
+
+def load_records(storage, days=7, kind=None, now=None):
+    """Registros de los últimos `days` días (lee solo los logs diarios del período)"""
+    now = now or datetime.now(PARAGUAY_TZ)
+    start = now - timedelta(days=days)
+    cutoff = start.isoformat(timespec="seconds")
+    records = []
+    for d in range(days + 1):
+        for record in storage.read_jsonl(metrics_file(start + timedelta(days=d))):
+            if record.get("ts", "") >= cutoff and (kind is None or record.get("kind") == kind):
+                records.append(record)
+    return records
+
+
+def trends_frame(records):
+    """
+    Tendencia diaria: p50 y p95 del total y de cada fase
+
+    Returns:
+        DataFrame indexado por día con columnas "<fase> p50" / "<fase> p95" (ms) y "runs"
+    """
+    import pandas as pd
+
+    if not records:
+        return pd.DataFrame()
+    df = pd.DataFrame([{"day": r["ts"][:10], "total": r.get("total_ms"), **r.get("spans", {})}
+                       for r in records])
+    grouped = df.groupby("day")
+    out = grouped.quantile([0.5, 0.95]).unstack()
+    out.columns = [f"{phase} p{int(q * 100)}" for phase, q in out.columns]
+    out.insert(0, "runs", grouped.size())
+    return out.round(1)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+    from storage import default_storage
+
+    parser = argparse.ArgumentParser(description='Tendencia de tiempos por fase de las ejecuciones FBOX')
+    parser.add_argument('--days', type=int, default=7,
+                        help='Días hacia atrás')
+    parser.add_argument('--kind', type=str, default='poll',
+                        help='Tipo de ejecución (poll, command)')
+
+    args = parser.parse_args()
+
+    records = load_records(default_storage(), args.days, args.kind)
+    if not records:
+        print(f"📊 No hay métricas '{args.kind}' en los últimos {args.days} días")
+        raise SystemExit(0)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None):
+        print(trends_frame(records))
+
+    # Endpoints: latencia media y errores en el período
+    totals = {}
+    for record in records:
+        for endpoint, stats in record.get("endpoints", {}).items():
+            t = totals.setdefault(endpoint, [0, 0, 0, 0.0, 0.0])
+            for i in (CALLS, ERRORS, RETRIES, TOTAL_MS):
+                t[i] += stats[i]
+            t[MAX_MS] = max(t[MAX_MS], stats[MAX_MS])
+    if totals:
+        print(f"\n{'Endpoint':<32} {'llamadas':>9} {'errores':>8} {'reintentos':>11} {'media ms':>9} {'máx ms':>9}")
+        print("━" * 82)
+        for endpoint, t in sorted(totals.items()):
+            print(f"{endpoint:<32} {t[CALLS]:>9} {t[ERRORS]:>8} {t[RETRIES]:>11} "
+                  f"{t[TOTAL_MS] / t[CALLS]:>9.1f} {t[MAX_MS]:>9.1f}")
@@ -0,0 +1,189 @@
+"""
+Seguimiento de mineros en ventana deslizante (últimas N lecturas)
+
+La alerta de mineros caídos compara solo con la lectura anterior: un minero
+que se cae y vuelve (intermitente) o una pérdida lenta de a uno por lectura no
+la disparan. Aquí se mira la ventana completa:
+
+- Desgaste: el contenedor perdió `drop` o más mineros respecto al máximo de la
+  ventana (con los conteos agregados, disponibles siempre). No se informa
+  mientras la regla "miners" (caída entre lecturas) tiene su alerta activa en
+  ese contenedor: la misma caída ya está avisada
+- Si el detalle de FBox trae la lista de mineros, cada contenedor guarda un
+  bitset por lectura (bit i = minero i online) y se informa exactamente qué
+  mineros se cayeron y cuáles son intermitentes (>= `flap_min` cambios de estado)
+
+Estado compacto en miner_window.json: {contenedor: {"ids": [...], "bits": ["hex", ...]}}
+"""
+from collections import deque
+
+import numpy as np
+
+MINER_WINDOW_FILE = "miner_window.json"
+MINER_WINDOW_SIZE = 12       # lecturas en la ventana
+MINER_WINDOW_DROP = 3        # mineros perdidos respecto al máximo de la ventana
+MINER_FLAP_MIN = 3           # cambios de estado en la ventana para considerar intermitente
+MAX_LISTED = 10              # ids listados en el mensaje
+
+MINER_LIST_KEYS = ("miner_list", "miners", "miner_info", "machine_list")
+MINER_ID_KEYS = ("sn", "mac", "miner_sn", "miner_id", "id", "ip", "name")
+MINER_STATUS_KEYS = ("status", "online", "is_online", "state")
+ONLINE_VALUES = {1, "1", True, "online", "on", "running", "normal"}
+
+
+def extract_miner_ids(detail_json):
+    """
+    Lista de mineros del detalle de FBox, si el endpoint la trae
+
+    Returns:
+        (ids de todos los mineros, set de ids online) o None
+    """
+    data = (detail_json or {}).get("data") or {}
+    miners = next((data[k] for k in MINER_LIST_KEYS if isinstance(data.get(k), list)), None)
+    if not miners:
+        return None
+
+    ids, online = [], set()
+    for miner in miners:
+        if not isinstance(miner, dict):
+            continue
+        miner_id = next((str(miner[k]) for k in MINER_ID_KEYS if miner.get(k) not in (None, "")), None)
+        if miner_id is None:
+            continue
+        status = next((miner[k] for k in MINER_STATUS_KEYS if k in miner), None)
+        ids.append(miner_id)
+        if (status.lower() if isinstance(status, str) else status) in ONLINE_VALUES:
+            online.add(miner_id)
+    return (ids, online) if ids else None
+
+
+def _list(ids):
+    listed = ", ".join(ids[:MAX_LISTED])
+    extra = len(ids) - MAX_LISTED
+    return f"{listed} y {extra} más" if extra > 0 else listed
+
+
+def bits_matrix(bitsets, width):
+    """Bitsets (int) -> matriz booleana lecturas x mineros"""
+    if not bitsets or not width:
+        return np.zeros((len(bitsets), width), dtype=bool)
+    nbytes = (width + 7) // 8
+    raw = np.frombuffer(b"".join(b.to_bytes(nbytes, "little") for b in bitsets), dtype=np.uint8)
+    bits = np.unpackbits(raw.reshape(len(bitsets), nbytes), axis=1, bitorder="little")
+    return bits[:, :width].astype(bool)
+
+
+class MinerWindow:
+    """
+    Args:
+        data: estado persistido {contenedor: {"ids": [...], "bits": ["hex", ...]}}
+        size: lecturas en la ventana
+        drop: mineros perdidos (vs. máximo de la ventana) para alertar desgaste
+        flap_min: cambios de estado para considerar un minero intermitente
+    """
+
+    def __init__(self, data=None, size=MINER_WINDOW_SIZE, drop=MINER_WINDOW_DROP, flap_min=MINER_FLAP_MIN):
+        self.size = size
+        self.drop = drop
+        self.flap_min = flap_min
+        self.ids = {}
+        self.bits = {}
+        for container, entry in (data if isinstance(data, dict) else {}).items():
+            self.ids[container] = list(entry.get("ids", []))
+            self.bits[container] = deque((int(h, 16) for h in entry.get("bits", [])), maxlen=size)
+        self.changed = False
+
+    @classmethod
+    def load(cls, storage, **kwargs):
+        return cls(storage.read_json(MINER_WINDOW_FILE, {}), **kwargs)
+
+    def save(self, storage):
+        """Guarda solo si hubo cambios"""
+        if self.changed:
+            storage.write_json(MINER_WINDOW_FILE, {
+                container: {"ids": self.ids[container], "bits": [format(b, "x") for b in self.bits[container]]}
+                for container in self.ids
+            })
+            self.changed = False
+
+    def add(self, container, miner_ids):
+        """Agrega la lectura de mineros (ids, online) de un contenedor como bitset"""
+        ids, online = miner_ids
+        registry = self.ids.setdefault(container, [])
+        positions = {miner_id: i for i, miner_id in enumerate(registry)}
+        for miner_id in ids:
+            if miner_id not in positions:
+                positions[miner_id] = len(registry)
+                registry.append(miner_id)
+        bitset = 0
+        for miner_id in online:
+            bitset |= 1 << positions[miner_id]
+        self.bits.setdefault(container, deque(maxlen=self.size)).append(bitset)
+        self.changed = True
+
+    def miner_changes(self, container):
+        """
+        Returns:
+            (ids caídos desde el inicio de la ventana, ids intermitentes) o None sin datos por minero
+        """
+        bitsets = list(self.bits.get(container, ()))
+        registry = self.ids.get(container, [])
+        if len(bitsets) < 2:
+            return None
+        matrix = bits_matrix(bitsets, len(registry))
+        transitions = (matrix[1:] != matrix[:-1]).sum(axis=0)
+        flapping = transitions >= self.flap_min
+        # Caídos: online en algún momento de la ventana y offline ahora (sin contar intermitentes)
+        dropped = matrix[:-1].any(axis=0) & ~matrix[-1] & ~flapping
+        return ([registry[i] for i in np.flatnonzero(dropped)],
+                [registry[i] for i in np.flatnonzero(flapping)])
+
+    def process(self, window, snapshot, rule_active=()):
+        """
+        Eventos de desgaste e intermitencia ({container, type, message, baseline}) para el AlertTracker
+
+        Args:
+            window: RecentWindow con la serie "miner_online" (ya incluye la lectura actual)
+            snapshot: estado actual {contenedor: datos}
+            rule_active: contenedores con la alerta de la regla "miners" activa o disparada
+                en esta lectura (ahí no se emite desgaste)
+        """
+        events = []
+        for container, data in snapshot.items():
+            if not isinstance(data, dict) or data.get("code") != 1:
+                continue
+            current = data.get("miner_online")
+            if not isinstance(current, int):
+                continue
+
+            changes = self.miner_changes(container)
+            dropped, flapping = changes if changes else ([], [])
+
+            _, counts = window.series(container, "miner_online")
+            counts = counts[-self.size:]
+            peak = int(counts.max()) if len(counts) else current
+            if peak - current >= self.drop and container not in rule_active:
+                message = (f"📉 DESGASTE DE MINEROS: {container} - {peak - current} minero(s) menos en las "
+                           f"últimas {len(counts)} lecturas ({peak} → {current} online)")
+                if dropped:
+                    message += f"\n🆔 Caídos: {_list(dropped)}"
+                events.append({"container": container, "type": "miners_window",
+                               "message": message, "baseline": peak})
+
+            if flapping:
+                events.append({
+                    "container": container, "type": "miners_flap",
+                    "message": (f"🔄 MINEROS INTERMITENTES: {container} - {len(flapping)} minero(s) con "
+                                f"{self.flap_min}+ caídas/recuperaciones en la ventana\n🆔 {_list(flapping)}"),
+                    "baseline": len(flapping),
+                })
+        return events
+
+
+def miners_window_cleared(data, entry):
+    """El desgaste se resuelve cuando vuelve al máximo que tenía la ventana"""
+    online = data.get("miner_online")
+    return isinstance(online, int) and online >= (entry["baseline"] or 0)
+
+
+MINER_CLEAR_CHECKS = {"miners_window": miners_window_cleared}
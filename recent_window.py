@@ -0,0 +1,90 @@
+"""
+Ventana reciente por contenedor: últimas N muestras de cada métrica en un buffer circular
+
+Se carga una vez por ejecución (recent_window.json, unos pocos KB) y los
+detectores trabajan sobre arreglos NumPy en memoria, sin leer el historial.
+"""
+import math
+from collections import deque
+
+import numpy as np
+
+RECENT_WINDOW_FILE = "recent_window.json"
+POLL_INTERVAL_MIN = 60     # minutos entre ejecuciones del monitor (workflow: cron "0 * * * *")
+RECENT_WINDOW_HOURS = 24   # horas que cubre la ventana
+
+
+def window_size(hours=RECENT_WINDOW_HOURS, interval_min=POLL_INTERVAL_MIN):
+    """Muestras por contenedor para cubrir `hours` con una ejecución cada `interval_min` minutos"""
+    return max(2, math.ceil(hours * 60 / max(1, interval_min)))
+
+
+RECENT_WINDOW_SIZE = window_size()  # 24 muestras por contenedor: un día con ejecuciones cada hora
+WINDOW_METRICS = ("oil_temp", "container_temp", "miner_online")
+
+
+def _number(value):
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+class RecentWindow:
+    """
+    Args:
+        data: estado persistido {contenedor: {"t": [epoch...], métrica: [valor...]}}
+        size: muestras que se conservan por contenedor
+        metrics: métricas que se guardan
+    """
+
+    def __init__(self, data=None, size=RECENT_WINDOW_SIZE, metrics=WINDOW_METRICS):
+        self.size = size
+        self.metrics = tuple(metrics)
+        self.buffers = {}
+        for container, series in (data if isinstance(data, dict) else {}).items():
+            t = series.get("t", [])
+            # Métricas nuevas (o faltantes) se completan con None para quedar alineadas con "t"
+            self.buffers[container] = {"t": deque(t, maxlen=size)}
+            for metric in self.metrics:
+                values = list(series.get(metric, []))[-len(t):] if t else []
+                self.buffers[container][metric] = deque([None] * (len(t) - len(values)) + values, maxlen=size)
+        self.changed = False
+
+    @classmethod
+    def load(cls, storage, **kwargs):
+        return cls(storage.read_json(RECENT_WINDOW_FILE, {}), **kwargs)
+
+    def save(self, storage):
+        """Guarda solo si hubo cambios"""
+        if self.changed:
+            storage.write_json(RECENT_WINDOW_FILE, {
+                container: {key: list(values) for key, values in series.items()}
+                for container, series in self.buffers.items()
+            })
+            self.changed = False
+
+    def add(self, epoch, snapshot):
+        """Agrega una muestra {contenedor: datos}; valores faltantes o "N/A" se guardan como None"""
+        for container, data in snapshot.items():
+            if not isinstance(data, dict):
+                continue
+            series = self.buffers.get(container)
+            if series is None:
+                series = {key: deque(maxlen=self.size) for key in ("t",) + self.metrics}
+                self.buffers[container] = series
+            if series["t"] and epoch <= series["t"][-1]:
+                continue  # muestra repetida o fuera de orden
+            series["t"].append(int(epoch))
+            for metric in self.metrics:
+                series[metric].append(_number(data.get(metric)))
+            self.changed = True
+
+    def series(self, container, metric):
+        """(tiempos en epoch, valores) como arreglos NumPy, sin las muestras faltantes"""
+        series = self.buffers.get(container)
+        if not series:
+            return np.empty(0), np.empty(0)
+        t = np.array(series["t"], dtype=float)
+        values = np.array([np.nan if v is None else v for v in series[metric]], dtype=float)
+        valid = ~np.isnan(values)
+        return t[valid], values[valid]
@@ -0,0 +1,108 @@
+"""
+Caché de reportes generados (Excel) con reutilización del file_id de Telegram
+
+La clave combina tipo de reporte, ventana de días y versión del historial de
+alertas: si no llegó ninguna alerta desde el último pedido se reutiliza el
+mismo archivo, y si ya se subió una vez se reenvía por file_id sin volver a subirlo.
+"""
+import os
+import threading
+import time
+from pathlib import Path
+
+REPORT_CACHE_FILE = "report_cache.json"
+REPORT_CACHE_MAX_FILES = 10
+REPORT_CACHE_MAX_MB = 50
+
+
+def make_key(report_type, days, version, day=None):
+    """
+    Clave de caché del reporte
+
+    Args:
+        report_type: tipo de reporte (ej: "alertas")
+        days: ventana en días (0 = todo el historial)
+        version: versión del archivo fuente (storage.version)
+        day: fecha de generación; las ventanas móviles cambian de contenido cada día
+    """
+    parts = [report_type, str(days), str(version)]
+    if days and day is not None:
+        parts.append(str(day))
+    return "|".join(parts)
+
+
+class ReportCache:
+    """
+    Índice persistente {clave: {path, file_id, size, created}} con desalojo por cantidad/tamaño
+
+    Los límites por defecto se leen del entorno al crear la caché (REPORT_CACHE_MAX_FILES,
+    REPORT_CACHE_MAX_MB), después de que el bot cargó su .env
+    """
+
+    def __init__(self, storage, max_files=None, max_mb=None):
+        if max_files is None:
+            max_files = int(os.environ.get("REPORT_CACHE_MAX_FILES", REPORT_CACHE_MAX_FILES))
+        if max_mb is None:
+            max_mb = float(os.environ.get("REPORT_CACHE_MAX_MB", REPORT_CACHE_MAX_MB))
+        self.storage = storage
+        self.max_files = max_files
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._index = None
+
+    def _load(self):
+        if self._index is None:
+            data = self.storage.read_json(REPORT_CACHE_FILE, {})
+            self._index = data if isinstance(data, dict) else {}
+        return self._index
+
+    def _save(self):
+        self.storage.write_json(REPORT_CACHE_FILE, self._index)
+
+    def get(self, key):
+        """Retorna la entrada si el archivo sigue existiendo o hay file_id (None si no)"""
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return None
+            if not os.path.exists(entry.get("path", "")) and not entry.get("file_id"):
+                del self._index[key]
+                self._save()
+                return None
+            return dict(entry)
+
+    def put(self, key, path, file_id=None):
+        """Registra un archivo generado y desaloja los más viejos si se pasan los límites"""
+        if not path:
+            return
+        with self._lock:
+            index = self._load()
+            index[key] = {
+                "path": str(path),
+                "file_id": file_id,
+                "size": os.path.getsize(path) if os.path.exists(path) else 0,
+                "created": time.time(),
+            }
+            self._evict_locked()
+            self._save()
+
+    def set_file_id(self, key, file_id):
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is not None and file_id and entry.get("file_id") != file_id:
+                entry["file_id"] = file_id
+                self._save()
+
+    def _evict_locked(self):
+        entries = sorted(self._index.items(), key=lambda kv: kv[1].get("created", 0))
+        total = sum(e.get("size", 0) for _, e in entries)
+        while entries and (len(entries) > self.max_files or total > self.max_bytes):
+            key, entry = entries.pop(0)
+            total -= entry.get("size", 0)
+            del self._index[key]
+            # Puede haber otra clave apuntando al mismo archivo (misma salida)
+            if not any(e.get("path") == entry.get("path") for _, e in entries):
+                try:
+                    Path(entry["path"]).unlink()
+                except (FileNotFoundError, KeyError):
+                    pass
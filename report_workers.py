@@ -0,0 +1,181 @@
+"""
+Pool de procesos para generar reportes Excel fuera del proceso del bot
+
+pandas/openpyxl corren en procesos hijos: el bot no se bloquea por el GIL y
+su memoria no crece con cada reporte. Cada worker se recicla después de
+REPORT_MAX_TASKS_PER_CHILD trabajos para liberar memoria, y la cola está
+limitada a REPORT_QUEUE_MAX trabajos (en espera + en curso).
+
+Los hijos no hablan con Telegram: todo aviso (inicio de un trabajo que estaba
+en cola, resultado) lo envía el bot con su cola compartida (TelegramSender),
+así se respetan sus límites de tasa y el orden por chat.
+"""
+import os
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor
+
+REPORT_WORKERS = 1
+REPORT_MAX_TASKS_PER_CHILD = 10
+REPORT_QUEUE_MAX = 4
+
+class ReportQueueFull(Exception):
+    """La cola de reportes llegó a su límite"""
+
+
+def run_report_job(report_type, days, fmt=None, output_dir=None):
+    """
+    Genera un reporte (se ejecuta en el proceso hijo). Retorna la ruta del archivo o None;
+    para "exportar" retorna la lista de (ruta, filas).
+
+    Args:
+        report_type: "alertas" (Excel de alertas) o "exportar" (CSV gzip / Parquet)
+        days: ventana en días (0 = todo)
+        fmt: formato para "exportar" ("csv" o "parquet")
+        output_dir: carpeta de los archivos de "exportar" (el bot usa una temporal y la borra)
+    """
+    if report_type == "alertas":
+        from generate_alerts_excel import generate_excel_report
+        return generate_excel_report(days=days)
+
+    if report_type == "exportar":
+        from export_data import export_data
+        return export_data(days=days, fmt=fmt or "csv", output_dir=output_dir)
+
+    raise ValueError(f"Tipo de reporte desconocido: {report_type}")
+
+
+class ReportWorkerPool:
+    """
+    Args:
+        max_workers: procesos hijos simultáneos
+        max_tasks_per_child: trabajos por proceso antes de reciclarlo
+        max_queue: trabajos aceptados a la vez (en espera + en curso)
+
+    Los valores por defecto se leen del entorno al crear el pool (REPORT_WORKERS,
+    REPORT_MAX_TASKS_PER_CHILD, REPORT_QUEUE_MAX), después de que el bot cargó su .env
+    """
+
+    def __init__(self, max_workers=None, max_tasks_per_child=None, max_queue=None):
+        if max_workers is None:
+            max_workers = int(os.environ.get("REPORT_WORKERS", REPORT_WORKERS))
+        if max_tasks_per_child is None:
+            max_tasks_per_child = int(os.environ.get("REPORT_MAX_TASKS_PER_CHILD", REPORT_MAX_TASKS_PER_CHILD))
+        if max_queue is None:
+            max_queue = int(os.environ.get("REPORT_QUEUE_MAX", REPORT_QUEUE_MAX))
+        self.max_workers = max(1, max_workers)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.max_queue = max(1, max_queue)
+        self._executor = None
+        self._executor_jobs = 0   # trabajos enviados al pool actual
+        self._running = 0         # trabajos del pool actual que todavía no terminaron
+        self._held = deque()      # (args, future) retenidos hasta que se vacíe el pool a reciclar
+        self._jobs = 0
+        self._waiting = deque()   # avisos on_start de los trabajos que quedaron en cola
+        # Reentrante: add_done_callback llama en el acto si el trabajo ya terminó
+        self._lock = threading.RLock()
+
+    def _recycle_due(self):
+        limit = self.max_tasks_per_child * self.max_workers
+        return self._executor is not None and self.max_tasks_per_child and self._executor_jobs >= limit
+
+    def _submit_to_executor(self, args):
+        if self._executor is None:
+            # spawn: los hijos no heredan los threads ni los sockets del bot
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._executor_jobs = 0
+        future = self._executor.submit(run_report_job, *args)
+        self._executor_jobs += 1
+        self._running += 1
+        future.add_done_callback(self._executor_job_done)
+        return future
+
+    def _executor_job_done(self, future):
+        with self._lock:
+            self._running -= 1
+            if self._running or not self._held:
+                return
+            # El pool a reciclar quedó vacío: se cierra y los trabajos retenidos pasan a uno nuevo
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            held, self._held = self._held, deque()
+            for args, outer in held:
+                if not outer.set_running_or_notify_cancel():
+                    continue
+                try:
+                    inner = self._submit_to_executor(args)
+                except Exception as e:
+                    outer.set_exception(e)
+                    continue
+                inner.add_done_callback(lambda f, outer=outer: _relay(f, outer))
+
+    def submit(self, report_type, days, fmt=None, on_start=None, output_dir=None):
+        """
+        Encola un trabajo. Retorna (future, posición) donde posición es la cantidad
+        de trabajos por delante que todavía no empezaron (0 = empieza ya).
+        Lanza ReportQueueFull si la cola está llena.
+
+        Args:
+            on_start: función sin argumentos que se llama en el proceso del bot cuando un
+                trabajo que quedó en cola pasa a ejecutarse (al terminar el que tenía delante)
+        """
+        args = (report_type, days, fmt, output_dir)
+        with self._lock:
+            if self._jobs >= self.max_queue:
+                raise ReportQueueFull()
+            position = max(0, self._jobs - self.max_workers + 1)
+            # Reciclado: tras max_tasks_per_child trabajos por worker se pasa a un pool nuevo.
+            # Mientras el anterior tenga trabajos en curso los nuevos quedan retenidos, así
+            # nunca corren más de max_workers procesos a la vez. (No se usa el parámetro
+            # max_tasks_per_child de ProcessPoolExecutor: en Python 3.11/3.12 puede colgarse.)
+            if self._recycle_due() and self._running:
+                future = Future()
+                self._held.append((args, future))
+            else:
+                if self._recycle_due():
+                    self._executor.shutdown(wait=False)
+                    self._executor = None
+                future = self._submit_to_executor(args)
+            self._jobs += 1
+            if position:
+                self._waiting.append(on_start)
+        future.add_done_callback(self._job_done)
+        return future, position
+
+    def _job_done(self, future):
+        with self._lock:
+            self._jobs -= 1
+            # Se liberó un worker: empieza el primer trabajo en cola
+            on_start = self._waiting.popleft() if self._waiting else None
+        if on_start is not None:
+            try:
+                on_start()
+            except Exception as e:
+                print(f"⚠️ Error avisando inicio de reporte: {e}")
+
+    def pending(self):
+        with self._lock:
+            return self._jobs
+
+    def shutdown(self, wait=False):
+        with self._lock:
+            held, self._held = self._held, deque()
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait, cancel_futures=not wait)
+                self._executor = None
+        for _, future in held:
+            future.cancel()
+
+
+def _relay(inner, outer):
+    """Copia el resultado del trabajo enviado al pool nuevo al future entregado por submit"""
+    if inner.cancelled():
+        outer.set_exception(CancelledError())
+    elif inner.exception() is not None:
+        outer.set_exception(inner.exception())
+    else:
+        outer.set_result(inner.result())
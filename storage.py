@@ -0,0 +1,412 @@
+"""
+Capa de almacenamiento unificada para los archivos del bot FBOX
+Backends disponibles: disco local, Dropbox API y memoria (con latencia simulada)
+
+Selección por variable de entorno STORAGE_BACKEND:
+    auto     -> Dropbox API si hay DROPBOX_ACCESS_TOKEN, si no disco local (default)
+    local    -> carpeta DROPBOX_PATH o carpeta del proyecto
+    dropbox  -> Dropbox API (lectura con fallback a disco local)
+    memory   -> en memoria, solo para pruebas y benchmarks
+"""
+import os
+import json
+import time
+import random
+import threading
+from pathlib import Path
+
+PROJECT_PATH = Path(__file__).parent
+
+
+def default_local_path():
+    """Carpeta local de almacenamiento (DROPBOX_PATH si está configurada)"""
+    dropbox_path = os.environ.get("DROPBOX_PATH", "")
+    return Path(dropbox_path) if dropbox_path else PROJECT_PATH
+
+
+class StorageBackend:
+    """Interfaz común: todos los backends trabajan con nombres de archivo relativos"""
+
+    name = "base"
+
+    def read_bytes(self, filename):
+        """Retorna el contenido del archivo o None si no existe"""
+        raise NotImplementedError
+
+    def write_bytes(self, filename, data):
+        """Escribe (sobrescribe) el archivo completo"""
+        raise NotImplementedError
+
+    def append_bytes(self, filename, data):
+        """Agrega datos al final del archivo (lo crea si no existe)"""
+        current = self.read_bytes(filename) or b""
+        self.write_bytes(filename, current + data)
+
+    def exists(self, filename):
+        return self.read_bytes(filename) is not None
+
+    def delete(self, filename):
+        raise NotImplementedError
+
+    def list_files(self, prefix=""):
+        raise NotImplementedError
+
+    def version(self, filename):
+        """Identificador que cambia cada vez que cambia el archivo (None si no existe)"""
+        raise NotImplementedError
+
+    def local_path(self, filename):
+        """Ruta local del archivo si el backend la tiene (None si no)"""
+        return None
+
+    def iter_bytes(self, filename, chunk_size=1 << 20):
+        """Contenido del archivo por bloques (nada si no existe). Por defecto lo lee completo"""
+        data = self.read_bytes(filename)
+        if data:
+            yield data
+
+    # ---------------- Helpers JSON ----------------
+    def read_json(self, filename, default=None):
+        """Lee un archivo JSON; retorna default si no existe o está corrupto"""
+        try:
+            raw = self.read_bytes(filename)
+            if raw is None:
+                return default
+            return json.loads(raw.decode("utf-8"))
+        except Exception as e:
+            print(f"⚠️ Error leyendo {filename} ({self.name}): {e}")
+            return default
+
+    def write_json(self, filename, data, indent=None):
+        """Escribe un archivo JSON; retorna True si se guardó"""
+        try:
+            content = json.dumps(data, indent=indent, ensure_ascii=False).encode("utf-8")
+            self.write_bytes(filename, content)
+            return True
+        except Exception as e:
+            print(f"⚠️ Error escribiendo {filename} ({self.name}): {e}")
+            return False
+
+    def append_jsonl(self, filename, record):
+        """Agrega un registro como una línea JSON (formato JSONL)"""
+        return self.extend_jsonl(filename, [record])
+
+    def extend_jsonl(self, filename, records):
+        """Agrega varios registros JSONL en una sola escritura (en Dropbox: una descarga + una subida)"""
+        if not records:
+            return True
+        try:
+            lines = "".join(json.dumps(r, ensure_ascii=False, separators=(",", ":")) + "\n" for r in records)
+            self.append_bytes(filename, lines.encode("utf-8"))
+            return True
+        except Exception as e:
+            print(f"⚠️ Error agregando a {filename} ({self.name}): {e}")
+            return False
+
+    def read_jsonl(self, filename):
+        """Itera los registros de un archivo JSONL (ignora líneas corruptas)"""
+        raw = self.read_bytes(filename)
+        if not raw:
+            return
+        for line in raw.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+class LocalStorage(StorageBackend):
+    """Archivos en una carpeta del disco local"""
+
+    name = "local"
+
+    def __init__(self, base_path=None):
+        self.base_path = Path(base_path) if base_path else default_local_path()
+        self.base_path.mkdir(parents=True, exist_ok=True)
+
+    def local_path(self, filename):
+        return self.base_path / filename
+
+    def read_bytes(self, filename):
+        path = self.local_path(filename)
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def iter_bytes(self, filename, chunk_size=1 << 20):
+        try:
+            f = open(self.local_path(filename), "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            while chunk := f.read(chunk_size):
+                yield chunk
+
+    def write_bytes(self, filename, data):
+        # Escritura atómica: un corte a mitad de escritura no deja el JSON truncado
+        path = self.local_path(filename)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def append_bytes(self, filename, data):
+        with open(self.local_path(filename), "ab") as f:
+            f.write(data)
+
+    def exists(self, filename):
+        return self.local_path(filename).exists()
+
+    def delete(self, filename):
+        try:
+            self.local_path(filename).unlink()
+        except FileNotFoundError:
+            pass
+
+    def list_files(self, prefix=""):
+        return sorted(p.name for p in self.base_path.glob(f"{prefix}*") if p.is_file())
+
+    def version(self, filename):
+        try:
+            st = self.local_path(filename).stat()
+        except FileNotFoundError:
+            return None
+        return f"{st.st_mtime_ns}-{st.st_size}"
+
+
+class DropboxBackend(StorageBackend):
+    """Archivos en la carpeta de Dropbox usando la API (dropbox_storage)"""
+
+    name = "dropbox"
+
+    def __init__(self, client=None):
+        if client is None:
+            from dropbox_storage import storage as client
+        self.client = client
+        self.folder_path = client.folder_path
+
+    def is_available(self):
+        return self.client.is_available()
+
+    def _path(self, filename):
+        return f"{self.folder_path}/{filename}"
+
+    def read_bytes(self, filename):
+        import dropbox
+        try:
+            _, response = self.client.dbx.files_download(self._path(filename))
+            return response.content
+        except dropbox.exceptions.ApiError as e:
+            if hasattr(e.error, "is_path") and e.error.is_path():
+                return None
+            raise
+
+    def iter_bytes(self, filename, chunk_size=1 << 20):
+        import dropbox
+        try:
+            _, response = self.client.dbx.files_download(self._path(filename))
+        except dropbox.exceptions.ApiError as e:
+            if hasattr(e.error, "is_path") and e.error.is_path():
+                return
+            raise
+        with response:
+            yield from response.iter_content(chunk_size)
+
+    def write_bytes(self, filename, data):
+        import dropbox
+        self.client.dbx.files_upload(
+            data,
+            self._path(filename),
+            mode=dropbox.files.WriteMode.overwrite
+        )
+
+    def delete(self, filename):
+        import dropbox
+        try:
+            self.client.dbx.files_delete_v2(self._path(filename))
+        except dropbox.exceptions.ApiError:
+            pass
+
+    def list_files(self, prefix=""):
+        result = self.client.dbx.files_list_folder(self.folder_path)
+        names = [e.name for e in result.entries]
+        while result.has_more:
+            result = self.client.dbx.files_list_folder_continue(result.cursor)
+            names.extend(e.name for e in result.entries)
+        return sorted(n for n in names if n.startswith(prefix))
+
+    def version(self, filename):
+        import dropbox
+        try:
+            metadata = self.client.dbx.files_get_metadata(self._path(filename))
+            return getattr(metadata, "rev", None)
+        except dropbox.exceptions.ApiError:
+            return None
+
+
+class MemoryStorage(StorageBackend):
+    """
+    Almacenamiento en memoria. Con latency/jitter/bandwidth simula un backend
+    remoto (ej: Dropbox) sin red, para pruebas y benchmarks.
+
+    Args:
+        latency: segundos de espera fijos por operación
+        jitter: segundos aleatorios adicionales (0..jitter) por operación
+        bandwidth: bytes/segundo para simular el tiempo de transferencia (None = infinito)
+    """
+
+    name = "memory"
+
+    def __init__(self, latency=0.0, jitter=0.0, bandwidth=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self._files = {}
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def _delay(self, size=0):
+        wait = self.latency
+        if self.jitter:
+            wait += random.uniform(0, self.jitter)
+        if self.bandwidth and size:
+            wait += size / self.bandwidth
+        if wait > 0:
+            time.sleep(wait)
+
+    def read_bytes(self, filename):
+        with self._lock:
+            data = self._files.get(filename)
+        self._delay(len(data) if data else 0)
+        return data
+
+    def write_bytes(self, filename, data):
+        self._delay(len(data))
+        with self._lock:
+            self._files[filename] = bytes(data)
+            self._versions[filename] = self._versions.get(filename, 0) + 1
+
+    def append_bytes(self, filename, data):
+        # Un remoto real (Dropbox) no soporta append: se simula descarga + subida
+        current = self.read_bytes(filename) or b""
+        self.write_bytes(filename, current + data)
+
+    def exists(self, filename):
+        self._delay()
+        return filename in self._files
+
+    def delete(self, filename):
+        self._delay()
+        with self._lock:
+            self._files.pop(filename, None)
+            self._versions.pop(filename, None)
+
+    def list_files(self, prefix=""):
+        self._delay()
+        return sorted(n for n in self._files if n.startswith(prefix))
+
+    def version(self, filename):
+        self._delay()
+        v = self._versions.get(filename)
+        return str(v) if v is not None else None
+
+
+class ChainedStorage(StorageBackend):
+    """Lee del backend principal y, si el archivo no está, del secundario. Escribe en el principal."""
+
+    def __init__(self, primary, fallback):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = f"{primary.name}+{fallback.name}"
+
+    def read_bytes(self, filename):
+        try:
+            data = self.primary.read_bytes(filename)
+            if data is not None:
+                return data
+        except Exception as e:
+            print(f"⚠️ Error leyendo {filename} desde {self.primary.name}: {e}")
+        return self.fallback.read_bytes(filename)
+
+    def iter_bytes(self, filename, chunk_size=1 << 20):
+        try:
+            found = self.primary.version(filename) is not None
+        except Exception as e:
+            print(f"⚠️ Error leyendo {filename} desde {self.primary.name}: {e}")
+            found = False
+        source = self.primary if found else self.fallback
+        yield from source.iter_bytes(filename, chunk_size)
+
+    def write_bytes(self, filename, data):
+        self.primary.write_bytes(filename, data)
+
+    def append_bytes(self, filename, data):
+        self.primary.append_bytes(filename, data)
+
+    def exists(self, filename):
+        return self.primary.exists(filename) or self.fallback.exists(filename)
+
+    def delete(self, filename):
+        self.primary.delete(filename)
+
+    def list_files(self, prefix=""):
+        return sorted(set(self.primary.list_files(prefix)) | set(self.fallback.list_files(prefix)))
+
+    def version(self, filename):
+        return self.primary.version(filename) or self.fallback.version(filename)
+
+    def local_path(self, filename):
+        return self.primary.local_path(filename) or self.fallback.local_path(filename)
+
+
+def _dropbox_backend():
+    """Retorna el backend de Dropbox si la API está configurada y conectada, si no None"""
+    if not os.environ.get("DROPBOX_ACCESS_TOKEN"):
+        return None
+    try:
+        backend = DropboxBackend()
+    except ImportError:
+        return None
+    return backend if backend.is_available() else None
+
+
+def get_storage(name=None, base_path=None):
+    """
+    Crea el backend de almacenamiento indicado (o el de STORAGE_BACKEND)
+
+    Args:
+        name: "auto", "local", "dropbox" o "memory"
+        base_path: carpeta para el backend local (default: DROPBOX_PATH o carpeta del proyecto)
+    """
+    name = (name or os.environ.get("STORAGE_BACKEND", "auto")).lower()
+
+    if name == "memory":
+        return MemoryStorage()
+
+    local = LocalStorage(base_path)
+    if name == "local":
+        return local
+
+    dropbox_backend = _dropbox_backend()
+    if dropbox_backend is None:
+        if name == "dropbox":
+            print("⚠️ Dropbox API no disponible, usando almacenamiento local")
+        return local
+    return ChainedStorage(dropbox_backend, local)
+
+
+_default_storage = None
+_default_lock = threading.Lock()
+
+
+def default_storage():
+    """Instancia compartida del backend configurado (se crea una sola vez por proceso)"""
+    global _default_storage
+    with _default_lock:
+        if _default_storage is None:
+            _default_storage = get_storage()
+        return _default_storage
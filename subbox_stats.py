@@ -0,0 +1,130 @@
+"""
+Estadísticas de temperatura de aceite por sub-caja (tanque) y por sensor
+
+calc_oil_temp() promedia todos los sensores del contenedor, lo que esconde un
+tanque sobrecalentado. Aquí las lecturas de `sub_box_list[].main_temperatures`
+se llevan a una matriz tanques x sensores (NaN donde no hay lectura) y se
+calculan con NumPy, sin bucles por tanque:
+
+- por sensor: la lectura de cada sensor de cada tanque
+- por tanque: máximo, p95 y dispersión (máx - mín) de sus sensores
+- por contenedor: sensor más caliente (tanque y número de sensor), p95 de todos
+  los sensores y diferencia entre el máximo del tanque más caliente y el del más frío
+
+Se guarda compacto junto al snapshot del contenedor (listas por columna).
+"""
+import numpy as np
+
+INVALID_READING = -900  # lecturas <= -900 son sensores desconectados
+
+
+def _reading(value):
+    try:
+        v = float(value)
+    except (TypeError, ValueError):
+        return np.nan
+    return np.nan if v <= INVALID_READING else v
+
+
+def _box_name(box, index):
+    for key in ("name", "sub_box_name", "box_name", "title"):
+        if box.get(key):
+            return str(box[key])
+    return f"T{index + 1}"
+
+
+def sensor_matrix(sub_boxes):
+    """
+    Lecturas como matriz tanques x sensores
+
+    Returns:
+        (nombres de tanques, matriz float con NaN donde no hay lectura)
+    """
+    names = [_box_name(box, i) for i, box in enumerate(sub_boxes)]
+    readings = [[_reading(t.get("num")) for t in (box.get("main_temperatures") or [])]
+                for box in sub_boxes]
+    width = max((len(r) for r in readings), default=0)
+    matrix = np.full((len(readings), width), np.nan)
+    if width:
+        lengths = np.array([len(r) for r in readings])
+        rows = np.repeat(np.arange(len(readings)), lengths)
+        cols = np.concatenate([np.arange(n) for n in lengths]) if lengths.sum() else np.empty(0, dtype=int)
+        matrix[rows, cols] = np.fromiter((v for r in readings for v in r), dtype=float, count=lengths.sum())
+    return names, matrix
+
+
+def subbox_stats(detail_json):
+    """
+    Estadísticas por tanque y del contenedor a partir del detalle de FBox
+
+    Returns:
+        dict con "sub_boxes" ({"names", "max", "p95", "spread", "sensors"} por columna;
+        "sensors" con las lecturas de cada sensor, None donde no hay), "oil_temp_max",
+        "oil_temp_p95", "oil_spread", "hotspot" (tanque) y "hotspot_sensor" (número de
+        sensor, desde 1); o None sin lecturas
+    """
+    data = (detail_json or {}).get("data") or {}
+    names, matrix = sensor_matrix(data.get("sub_box_list") or [])
+    has_data = ~np.isnan(matrix).all(axis=1) if matrix.size else np.zeros(len(names), dtype=bool)
+    if not has_data.any():
+        return None
+
+    names = [n for n, ok in zip(names, has_data) if ok]
+    matrix = matrix[has_data]
+
+    box_max = np.nanmax(matrix, axis=1)
+    box_min = np.nanmin(matrix, axis=1)
+    box_p95 = np.nanpercentile(matrix, 95, axis=1)
+
+    def compact(values):
+        return [round(float(v), 1) for v in values]
+
+    hottest = int(np.argmax(box_max))
+    # Lecturas por sensor, sin el relleno de NaN al final de los tanques con menos sensores
+    lengths = (~np.isnan(matrix)).cumsum(axis=1).argmax(axis=1) + 1
+    sensors = [[None if np.isnan(v) else round(float(v), 1) for v in row[:n]]
+               for row, n in zip(matrix, lengths)]
+    return {
+        "sub_boxes": {
+            "names": names,
+            "max": compact(box_max),
+            "p95": compact(box_p95),
+            "spread": compact(box_max - box_min),
+            "sensors": sensors,
+        },
+        "oil_temp_max": round(float(box_max[hottest]), 1),
+        "oil_temp_p95": round(float(np.nanpercentile(matrix, 95)), 1),
+        # Misma estadística que el tanque más caliente: máximo por tanque
+        "oil_spread": round(float(box_max.max() - box_max.min()), 1),
+        "hotspot": names[hottest],
+        "hotspot_sensor": int(np.nanargmax(matrix[hottest])) + 1,
+    }
+
+
+def subbox_frame(history):
+    """
+    Máximo por tanque de cada registro del historial, en formato ancho para el mapa de calor
+
+    Returns:
+        DataFrame indexado por hora ("YYYY-MM-DD HH:00") con una columna por
+        "contenedor tanque" (máximo de la hora)
+    """
+    import pandas as pd
+
+    rows = [
+        (record.get("timestamp", ""), container, data["sub_boxes"].get("names"), data["sub_boxes"].get("max"))
+        for record in history
+        for container, data in (record.get("data") or {}).items()
+        if isinstance(data, dict) and isinstance(data.get("sub_boxes"), dict)
+    ]
+    if not rows:
+        return pd.DataFrame()
+
+    df = pd.DataFrame(rows, columns=["timestamp", "container", "name", "max"])
+    df = df.explode(["name", "max"], ignore_index=True).dropna(subset=["name", "max"])
+    df["max"] = pd.to_numeric(df["max"], errors="coerce")
+    df["hour"] = df["timestamp"].astype(str).str[:13].str.replace("T", " ", regex=False) + ":00"
+    df["column"] = df["container"] + " " + df["name"].astype(str)
+    wide = df.pivot_table(index="hour", columns="column", values="max", aggfunc="max")
+    # Columnas en el orden en que aparecen (C01 T2 antes que C01 T10)
+    return wide[df["column"].unique()].sort_index()
@@ -11,15 +11,25 @@ from datetime import datetime
 from zoneinfo import ZoneInfo
 import time
 import threading
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import hmac
+import atexit
+import shutil
+import tempfile
+import secrets
 
-# Importar módulo de Dropbox storage
-try:
-    from dropbox_storage import storage as dropbox_storage
-    DROPBOX_AVAILABLE = True
-except ImportError:
-    DROPBOX_AVAILABLE = False
-    dropbox_storage = None
+from storage import default_storage, get_storage
+from command_dispatcher import CommandDispatcher
+from telegram_sender import get_sender, PRIORITY_REPLY
+from report_cache import ReportCache, make_key
+from report_workers import ReportWorkerPool, ReportQueueFull
+from export_data import ExportError, EXPORT_FORMATS
+from fleet_analytics import FleetAnalytics
+from weekly_stats import WeeklyStats
+from metrics import RunMetrics, MetricsBuffer, activate, span
+import fbox_client
 
 # Cargar variables de entorno
 env_file = Path(__file__).parent / ".env"
@@ -31,55 +41,64 @@ if env_file.exists():
                 key, value = line.split("=", 1)
                 os.environ[key.strip()] = value.strip()
 
+# Cliente FBox para refrescar /estado (sin los efectos de importar el monitor)
+fbox_client.configure()
+
 BOT_TOKEN = os.environ.get("BOT_TOKEN")
 CHAT_ID = os.environ.get("CHAT_ID")
 PARAGUAY_TZ = ZoneInfo("America/Asuncion")
 
-# Archivo para rastrear último update procesado
+# Archivo para rastrear último update procesado (estado propio del bot, siempre local)
 LAST_UPDATE_FILE = "last_telegram_update.json"
+bot_storage = get_storage("local", base_path=Path(__file__).parent)
+
+ALERTS_HISTORY_FILE = "fbox_alerts_history.json"
+
+# Caché de reportes Excel (índice local, archivos en la carpeta de reportes)
+report_cache = ReportCache(bot_storage)
+
+# Los Excel se generan en procesos hijos (no bloquean al bot y liberan memoria al reciclarse)
+report_pool = ReportWorkerPool()
+
+# Métricas de comandos: se escriben por lotes (en Dropbox cada append descarga y sube el log)
+metrics_buffer = MetricsBuffer(
+    default_storage(),
+    flush_every=int(os.environ.get("METRICS_FLUSH_EVERY", 50)),
+    flush_seconds=int(os.environ.get("METRICS_FLUSH_SECONDS", 300)),
+)
+atexit.register(metrics_buffer.flush)
+
+# Ejecución concurrente de comandos: límite global y de reportes pesados a la vez
+BOT_MAX_WORKERS = int(os.environ.get("BOT_MAX_WORKERS", 4))
+BOT_MAX_HEAVY = int(os.environ.get("BOT_MAX_HEAVY", 2))
+HEAVY_COMMANDS = {"/resumen7", "/resumen30", "/resumentodo", "/exportar"}
 
 def now_paraguay():
     """Retorna la hora actual en el huso horario de Paraguay"""
     return datetime.now(PARAGUAY_TZ)
 
-def send_telegram_message(text, chat_id=None):
-    """Envía un mensaje de texto a Telegram"""
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendMessage"
-    data = {"chat_id": chat_id or CHAT_ID, "text": text}
-    try:
-        response = requests.post(url, data=data, timeout=10)
-        return response.json()
-    except Exception as e:
-        print(f"Error enviando mensaje: {e}")
-        return None
+def send_telegram_message(text, chat_id=None, priority=PRIORITY_REPLY, wait=True):
+    """Envía un mensaje de texto a Telegram (cola con control de tasa y reintentos)"""
+    return get_sender().send_message(chat_id or CHAT_ID, text, priority=priority, wait=wait)
 
-def send_telegram_document(file_path, caption=None, chat_id=None):
-    """Envía un archivo (documento) a Telegram"""
-    url = f"https://api.telegram.org/bot{BOT_TOKEN}/sendDocument"
-    
-    try:
-        with open(file_path, 'rb') as file:
-            files = {'document': file}
-            data = {'chat_id': chat_id or CHAT_ID}
-            if caption:
-                data['caption'] = caption
-            
-            response = requests.post(url, data=data, files=files, timeout=30)
-            return response.json()
-    except Exception as e:
-        print(f"Error enviando documento: {e}")
-        return None
+def send_telegram_document(file_path, caption=None, chat_id=None, file_id=None):
+    """Envía un archivo (documento) a Telegram; con file_id reenvía uno ya subido"""
+    return get_sender().send_document(chat_id or CHAT_ID, str(file_path) if file_path else None,
+                                      caption=caption, file_id=file_id)
 
 def set_bot_commands():
     """Configura la lista de comandos del bot para que aparezcan en Telegram"""
     url = f"https://api.telegram.org/bot{BOT_TOKEN}/setMyCommands"
     
     commands = [
+        {"command": "estado", "description": "Estado actual de los contenedores"},
         {"command": "resumen", "description": "Ver resumen de alertas"},
         {"command": "resumen7", "description": "Excel de últimos 7 días"},
         {"command": "resumen30", "description": "Excel de últimos 30 días"},
         {"command": "resumentodo", "description": "Excel completo"},
         {"command": "semanal", "description": "Reporte semanal de estadísticas"},
+        {"command": "eficiencia", "description": "Eficiencia de la flota (J/TH, uptime, energía)"},
+        {"command": "exportar", "description": "Exportar datos: /exportar <días> [csv|parquet]"},
         {"command": "ayuda", "description": "Mostrar ayuda"}
     ]
     
@@ -95,34 +114,198 @@ def set_bot_commands():
         print(f"❌ Error configurando comandos: {e}")
         return None
 
-def generate_excel_report(days=7):
-    """Genera el reporte Excel y retorna la ruta del archivo"""
-    from generate_alerts_excel import generate_excel_report as gen_excel
+def generate_excel_report(days=7, chat_id=None):
+    """
+    Genera el reporte Excel en el pool de procesos y retorna la ruta del archivo.
+    Avisa al chat si el trabajo queda en cola y cuando empieza. Lanza ReportQueueFull si la cola está llena.
+    """
+    # on_start corre en el thread del pool: solo encola el aviso, no espera el envío
+    on_start = (lambda: send_telegram_message("⚙️ Generando reporte...", chat_id, wait=False)) if chat_id is not None else None
+    future, position = report_pool.submit("alertas", days, on_start=on_start)
+    if position and chat_id is not None:
+        send_telegram_message(f"🕐 Reporte en cola ({position} antes que el tuyo)...", chat_id)
     
     try:
-        output_file = gen_excel(days=days)
-        return output_file
+        with span("report"):
+            return future.result()
     except Exception as e:
         print(f"Error generando Excel: {e}")
         return None
 
-def get_alerts_summary():
-    """Obtiene un resumen de las alertas del día actual"""
-    ALERTS_HISTORY_FILE = "fbox_alerts_history.json"
+def send_alerts_report(days, caption, progress_msg, chat_id):
+    """
+    Envía el Excel de alertas de los últimos `days` días (0 = todo).
+    Si el historial no cambió desde el último pedido, reutiliza el archivo ya
+    generado y, si ya se subió, lo reenvía por file_id sin volver a subirlo.
+    """
+    version = default_storage().version(ALERTS_HISTORY_FILE)
+    key = make_key("alertas", days, version, now_paraguay().date()) if version else None
+    entry = report_cache.get(key) if key else None
+    
+    if entry and entry.get("file_id"):
+        result = send_telegram_document(None, caption=caption, chat_id=chat_id, file_id=entry["file_id"])
+        if result and result.get("ok"):
+            return
+    
+    if entry and os.path.exists(entry["path"]):
+        excel_file = entry["path"]
+    else:
+        send_telegram_message(progress_msg, chat_id)
+        try:
+            excel_file = generate_excel_report(days=days, chat_id=chat_id)
+        except ReportQueueFull:
+            send_telegram_message("🚦 Hay muchos reportes en preparación, intenta de nuevo en unos minutos.", chat_id)
+            return
+        if not excel_file or not os.path.exists(excel_file):
+            send_telegram_message("❌ Error generando el reporte. Verifica que haya alertas registradas.", chat_id)
+            return
+        if key:
+            report_cache.put(key, excel_file)
+    
+    result = send_telegram_document(excel_file, caption=caption, chat_id=chat_id)
+    if result and result.get("ok"):
+        file_id = ((result.get("result") or {}).get("document") or {}).get("file_id")
+        if key:
+            report_cache.set_file_id(key, file_id)
+        send_telegram_message(f"✅ Reporte guardado en: {excel_file}", chat_id)
+    else:
+        send_telegram_message("❌ Error enviando el reporte.", chat_id)
+
+# ============ /estado ============
+SNAPSHOT_FILE = "fbox_snapshot.json"
+# Si el snapshot tiene más de estos minutos, /estado dispara una actualización en segundo plano
+STATUS_REFRESH_AGE_MIN = int(os.environ.get("STATUS_REFRESH_AGE_MIN", 30))
+
+_refresh_lock = threading.Lock()
+_refresh_future = None
+_refresh_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="status-refresh")
+
+def load_status_snapshot():
+    """Último snapshot guardado por fbox_telegram.py ({timestamp, message, state}) o None"""
+    snapshot = default_storage().read_json(SNAPSHOT_FILE)
+    return snapshot if isinstance(snapshot, dict) and snapshot.get("message") else None
+
+def snapshot_age_minutes(snapshot):
+    try:
+        return (now_paraguay() - datetime.fromisoformat(snapshot["timestamp"])).total_seconds() / 60
+    except Exception:
+        return None
+
+def format_status(snapshot):
+    """Texto de /estado: el reporte guardado más su antigüedad"""
+    age = snapshot_age_minutes(snapshot)
+    if age is None:
+        age_txt = "antigüedad desconocida"
+    elif age < 1:
+        age_txt = "hace menos de 1 min"
+    elif age < 120:
+        age_txt = f"hace {int(age)} min"
+    else:
+        age_txt = f"hace {age / 60:.1f} h"
+    return f"{snapshot['message']}\n🕒 Datos de {age_txt}"
+
+def _refresh_snapshot():
+    # Corre en el thread de refresco (sin la ejecución del comando): tiene su propio registro
+    run = RunMetrics("refresh")
+    try:
+        with activate(run):
+            run.phase("login")
+            fbox_client.fbox_login()
+            run.phase("poll")
+            msg, state = fbox_client.check_status()
+            run.phase("persist")
+            fbox_client.save_snapshot(msg, state, default_storage())
+    finally:
+        metrics_buffer.add(run)
+    return load_status_snapshot()
+
+def refresh_status_snapshot():
+    """
+    Consulta FBox en segundo plano y guarda un snapshot nuevo.
+    Si ya hay una consulta en curso, retorna esa misma (pedidos simultáneos = una sola consulta).
+    """
+    global _refresh_future
+    with _refresh_lock:
+        if _refresh_future is None or _refresh_future.done():
+            _refresh_future = _refresh_executor.submit(_refresh_snapshot)
+        return _refresh_future
+
+def send_status(chat_id, force_refresh=False):
+    """Responde /estado al instante; si el snapshot es viejo, envía el actualizado al terminar"""
+    snapshot = load_status_snapshot()
+    if snapshot:
+        send_telegram_message(format_status(snapshot), chat_id)
+    else:
+        send_telegram_message("📦 Todavía no hay estado guardado, consultando FBox...", chat_id)
+    
+    age = snapshot_age_minutes(snapshot) if snapshot else None
+    if not (force_refresh or snapshot is None or age is None or age >= STATUS_REFRESH_AGE_MIN):
+        return
+    
+    if snapshot:
+        send_telegram_message("🔄 Actualizando desde FBox...", chat_id)
+    
+    def on_done(future):
+        try:
+            fresh = future.result()
+        except Exception as e:
+            send_telegram_message(f"❌ Error consultando FBox: {e}", chat_id)
+            return
+        if fresh:
+            send_telegram_message(format_status(fresh), chat_id)
+    
+    refresh_status_snapshot().add_done_callback(on_done)
+
+def send_export(args, chat_id):
+    """/exportar <días> [csv|parquet]: genera los archivos en el pool de procesos y los envía"""
+    try:
+        days = int(args[0]) if args else 7
+    except ValueError:
+        send_telegram_message("❓ Uso: /exportar <días> [csv|parquet]  (0 días = todo)", chat_id)
+        return
+    fmt = args[1] if len(args) > 1 else "csv"
+    if fmt not in EXPORT_FORMATS:
+        send_telegram_message("❓ Formato no soportado. Usa csv o parquet.", chat_id)
+        return
     
+    window = f"últimos {days} días" if days > 0 else "historial completo"
+    send_telegram_message(f"⏳ Exportando {window} a {fmt.upper()}...", chat_id)
+    # Los archivos son de un solo uso: se generan en una carpeta temporal que se borra al enviarlos
+    export_dir = tempfile.mkdtemp(prefix="fbox_export_")
     try:
-        # Intentar leer desde Dropbox primero
-        history = None
-        if DROPBOX_AVAILABLE and dropbox_storage and dropbox_storage.is_available():
-            history = dropbox_storage.read_json(ALERTS_HISTORY_FILE)
+        try:
+            future, position = report_pool.submit(
+                "exportar", days, fmt=fmt, output_dir=export_dir,
+                on_start=lambda: send_telegram_message("⚙️ Exportando...", chat_id, wait=False))
+        except ReportQueueFull:
+            send_telegram_message("🚦 Hay muchos reportes en preparación, intenta de nuevo en unos minutos.", chat_id)
+            return
+        if position:
+            send_telegram_message(f"🕐 Exportación en cola ({position} antes que la tuya)...", chat_id)
         
-        # Fallback a archivo local
-        if history is None:
-            if not os.path.exists(ALERTS_HISTORY_FILE):
-                return "📊 No hay alertas registradas aún."
-            
-            with open(ALERTS_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                history = json.load(f)
+        try:
+            with span("report"):
+                files = future.result()
+        except ExportError as e:
+            send_telegram_message(f"❌ {e}", chat_id)
+            return
+        except Exception as e:
+            print(f"Error exportando: {e}")
+            send_telegram_message("❌ Error exportando los datos.", chat_id)
+            return
+        
+        with span("upload"):
+            for path, rows in files:
+                name = os.path.basename(path)
+                send_telegram_document(path, caption=f"📦 {name} ({rows} filas)", chat_id=chat_id)
+    finally:
+        shutil.rmtree(export_dir, ignore_errors=True)
+
+def get_alerts_summary():
+    """Obtiene un resumen de las alertas del día actual"""
+    try:
+        # Dropbox API si está configurada, con fallback a archivo local
+        history = default_storage().read_json(ALERTS_HISTORY_FILE)
         
         if not history:
             return "📊 No hay alertas registradas aún."
@@ -172,22 +355,12 @@ def get_alerts_summary():
 
 def load_last_update_id():
     """Carga el último update_id procesado"""
-    try:
-        if os.path.exists(LAST_UPDATE_FILE):
-            with open(LAST_UPDATE_FILE, 'r') as f:
-                data = json.load(f)
-                return data.get("last_update_id", 0)
-    except:
-        pass
-    return 0
+    data = bot_storage.read_json(LAST_UPDATE_FILE, {})
+    return data.get("last_update_id", 0) if isinstance(data, dict) else 0
 
 def save_last_update_id(update_id):
     """Guarda el último update_id procesado"""
-    try:
-        with open(LAST_UPDATE_FILE, 'w') as f:
-            json.dump({"last_update_id": update_id}, f)
-    except:
-        pass
+    bot_storage.write_json(LAST_UPDATE_FILE, {"last_update_id": update_id})
 
 def get_telegram_updates(offset=None):
     """Obtiene actualizaciones (mensajes) del bot"""
@@ -208,72 +381,263 @@ def get_telegram_updates(offset=None):
 
 def process_command(command, chat_id):
     """Procesa un comando recibido"""
-    command = command.lower().strip()
+    command, args = parse_command(command)
+    
+    if command == "/estado":
+        # Estado desde el último snapshot guardado (respuesta inmediata)
+        send_status(chat_id, force_refresh=bool(args) and args[0] in ("actualizar", "refresh"))
     
-    if command == "/resumen":
+    elif command == "/resumen":
         # Enviar resumen de texto
         summary = get_alerts_summary()
         send_telegram_message(summary, chat_id)
     
     elif command == "/resumen7":
-        # Generar y enviar Excel de 7 días
-        send_telegram_message("⏳ Generando reporte de últimos 7 días...", chat_id)
-        excel_file = generate_excel_report(days=7)
-        if excel_file and os.path.exists(excel_file):
-            send_telegram_document(excel_file, caption="📊 Reporte de alertas - Últimos 7 días", chat_id=chat_id)
-            send_telegram_message(f"✅ Reporte guardado en: {excel_file}", chat_id)
-        else:
-            send_telegram_message("❌ Error generando el reporte. Verifica que haya alertas registradas.", chat_id)
+        # Generar (o reutilizar) y enviar Excel de 7 días
+        send_alerts_report(7, "📊 Reporte de alertas - Últimos 7 días",
+                           "⏳ Generando reporte de últimos 7 días...", chat_id)
     
     elif command == "/resumen30":
-        # Generar y enviar Excel de 30 días
-        send_telegram_message("⏳ Generando reporte de últimos 30 días...", chat_id)
-        excel_file = generate_excel_report(days=30)
-        if excel_file and os.path.exists(excel_file):
-            send_telegram_document(excel_file, caption="📊 Reporte de alertas - Últimos 30 días", chat_id=chat_id)
-            send_telegram_message(f"✅ Reporte guardado en: {excel_file}", chat_id)
-        else:
-            send_telegram_message("❌ Error generando el reporte. Verifica que haya alertas registradas.", chat_id)
+        # Generar (o reutilizar) y enviar Excel de 30 días
+        send_alerts_report(30, "📊 Reporte de alertas - Últimos 30 días",
+                           "⏳ Generando reporte de últimos 30 días...", chat_id)
     
     elif command == "/resumentodo":
-        # Generar y enviar Excel con todas las alertas
-        send_telegram_message("⏳ Generando reporte completo...", chat_id)
-        excel_file = generate_excel_report(days=0)
-        if excel_file and os.path.exists(excel_file):
-            send_telegram_document(excel_file, caption="📊 Reporte de alertas - Historial completo", chat_id=chat_id)
-            send_telegram_message(f"✅ Reporte guardado en: {excel_file}", chat_id)
-        else:
-            send_telegram_message("❌ Error generando el reporte. Verifica que haya alertas registradas.", chat_id)
+        # Generar (o reutilizar) y enviar Excel con todas las alertas
+        send_alerts_report(0, "📊 Reporte de alertas - Historial completo",
+                           "⏳ Generando reporte completo...", chat_id)
     
     elif command == "/semanal":
-        # Enviar reporte semanal de estadísticas
+        # Reporte semanal desde los agregados móviles (lectura directa, sin recorrer el historial)
         try:
-            # Importar las funciones necesarias
-            import sys
-            sys.path.insert(0, os.path.dirname(__file__))
-            from fbox_telegram import generate_weekly_report
-            
-            send_telegram_message("⏳ Generando reporte semanal...", chat_id)
-            weekly_msg = generate_weekly_report()
+            weekly_msg = WeeklyStats.load(default_storage()).format_report(now=now_paraguay())
             send_telegram_message(weekly_msg, chat_id)
-            send_telegram_message("✅ Reporte semanal enviado", chat_id)
         except Exception as e:
             send_telegram_message(f"❌ Error generando reporte semanal: {e}", chat_id)
     
+    elif command == "/eficiencia":
+        # Resumen de eficiencia desde los buckets que persiste el monitor (no lee el historial)
+        try:
+            days = int(args[0]) if args else 7
+        except ValueError:
+            days = 7
+        try:
+            analytics = FleetAnalytics.load(default_storage())
+            send_telegram_message(analytics.format_summary(max(1, days)), chat_id)
+        except Exception as e:
+            send_telegram_message(f"❌ Error calculando eficiencia: {e}", chat_id)
+    
+    elif command == "/exportar":
+        # Exportar historial y alertas a CSV gzip o Parquet
+        send_export(args, chat_id)
+    
     elif command == "/ayuda" or command == "/help":
         help_msg = "🤖 COMANDOS DISPONIBLES\n"
         help_msg += "━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        help_msg += "/estado - Estado actual de los contenedores\n"
+        help_msg += "/estado actualizar - Consultar FBox ahora\n"
         help_msg += "/resumen - Ver resumen de alertas\n"
         help_msg += "/resumen7 - Excel de últimos 7 días\n"
         help_msg += "/resumen30 - Excel de últimos 30 días\n"
         help_msg += "/resumentodo - Excel completo\n"
         help_msg += "/semanal - Reporte semanal de estadísticas\n"
+        help_msg += "/eficiencia [días] - Eficiencia, uptime y energía por contenedor\n"
+        help_msg += "/exportar <días> [csv|parquet] - Exportar historial y alertas\n"
         help_msg += "/ayuda - Mostrar esta ayuda"
         send_telegram_message(help_msg, chat_id)
     
     else:
         send_telegram_message(f"❓ Comando desconocido: {command}\nUsa /ayuda para ver comandos disponibles.", chat_id)
 
+def parse_command(text):
+    """Separa "/comando@bot arg1 arg2" en ("/comando", ["arg1", "arg2"])"""
+    parts = text.strip().split()
+    if not parts:
+        return "", []
+    command = parts[0].lower().split("@", 1)[0]
+    return command, [a.lower() for a in parts[1:]]
+
+def is_heavy_command(command):
+    """Los comandos que generan reportes ocupan un slot pesado del despachador"""
+    return parse_command(command)[0] in HEAVY_COMMANDS
+
+def timed_process_command(command, chat_id):
+    """
+    process_command con su duración y sus llamadas HTTP (Telegram, FBox) registradas
+    en el log de métricas (kind "command")
+    """
+    run = RunMetrics("command", command=parse_command(command)[0])
+    ok = False
+    try:
+        # Ejecución activa solo en este thread: los comandos concurrentes no se mezclan
+        with activate(run):
+            process_command(command, chat_id)
+        ok = True
+    finally:
+        run.attrs["ok"] = ok
+        metrics_buffer.add(run)
+
+_dispatcher = None
+_dispatcher_lock = threading.Lock()
+
+def get_dispatcher():
+    """Despachador de comandos compartido por polling y webhook"""
+    global _dispatcher
+    with _dispatcher_lock:
+        if _dispatcher is None:
+            _dispatcher = CommandDispatcher(timed_process_command, max_workers=BOT_MAX_WORKERS,
+                                            max_heavy=BOT_MAX_HEAVY, is_heavy=is_heavy_command)
+        return _dispatcher
+
+class RecentUpdateIds:
+    """Conjunto acotado de update_id ya procesados (para no ejecutar dos veces un comando)"""
+    
+    def __init__(self, maxlen=1000):
+        self._order = deque()
+        self._ids = set()
+        self._maxlen = maxlen
+        self._lock = threading.Lock()
+    
+    def add(self, update_id):
+        """Registra el id; retorna False si ya se había visto"""
+        with self._lock:
+            if update_id in self._ids:
+                return False
+            self._ids.add(update_id)
+            self._order.append(update_id)
+            if len(self._order) > self._maxlen:
+                self._ids.discard(self._order.popleft())
+            return True
+
+_seen_updates = RecentUpdateIds()
+
+def handle_update(update):
+    """Procesa un update de Telegram (llega por getUpdates o por webhook)"""
+    update_id = update.get("update_id")
+    if update_id is not None and not _seen_updates.add(update_id):
+        return  # Reentrega del mismo update (reintento de Telegram o de getUpdates)
+    
+    message = update.get("message", {})
+    text = message.get("text", "")
+    chat_id = message.get("chat", {}).get("id")
+    chat_type = message.get("chat", {}).get("type", "")
+    
+    # Procesar comandos de cualquier chat privado O del canal/grupo configurado
+    if text.startswith("/") and (chat_type == "private" or str(chat_id) == str(CHAT_ID)):
+        print(f"📩 Comando recibido de {chat_id}: {text}")
+        # Enviar respuesta al mismo chat que envió el comando
+        # (en un worker, para no frenar a los demás chats)
+        get_dispatcher().submit(text, chat_id)
+
+# ============ WEBHOOK ============
+# BOT_MODE=webhook: Telegram envía los updates por POST al mismo servidor HTTP del health check.
+# WEBHOOK_URL es la URL pública del servicio (ej: https://fbox-telegram-bot.onrender.com)
+BOT_MODE = os.environ.get("BOT_MODE", "polling").lower()
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "").rstrip("/")
+WEBHOOK_PATH = os.environ.get("WEBHOOK_PATH", "/telegram/webhook")
+# Si no se configura, se genera uno por arranque (setWebhook lo registra cada vez)
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET") or secrets.token_urlsafe(32)
+
+def set_webhook():
+    """Registra el webhook en Telegram. Retorna True si quedó configurado"""
+    if not WEBHOOK_URL:
+        print("❌ Falta configurar WEBHOOK_URL para el modo webhook")
+        return False
+    
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/setWebhook"
+    data = {
+        "url": WEBHOOK_URL + WEBHOOK_PATH,
+        "secret_token": WEBHOOK_SECRET,
+        "allowed_updates": ["message"],
+    }
+    try:
+        result = requests.post(url, json=data, timeout=10).json()
+        if result.get("ok"):
+            print(f"✅ Webhook configurado: {WEBHOOK_URL}{WEBHOOK_PATH}")
+            return True
+        print(f"⚠️ Error configurando webhook: {result}")
+    except Exception as e:
+        print(f"❌ Error configurando webhook: {e}")
+    return False
+
+def delete_webhook():
+    """Elimina el webhook (necesario para volver a usar getUpdates)"""
+    url = f"https://api.telegram.org/bot{BOT_TOKEN}/deleteWebhook"
+    try:
+        result = requests.post(url, json={"drop_pending_updates": False}, timeout=10).json()
+        return bool(result.get("ok"))
+    except Exception as e:
+        print(f"⚠️ Error eliminando webhook: {e}")
+        return False
+
+class BotHTTPHandler(BaseHTTPRequestHandler):
+    """Health check para Render (GET) y recepción de updates por webhook (POST)"""
+    
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-type', 'text/plain')
+        self.end_headers()
+        self.wfile.write(b'Bot is running')
+    
+    def do_POST(self):
+        if self.path != WEBHOOK_PATH:
+            self.send_response(404)
+            self.end_headers()
+            return
+        
+        token = self.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(token, WEBHOOK_SECRET):
+            self.send_response(403)
+            self.end_headers()
+            return
+        
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            update = json.loads(self.rfile.read(length).decode("utf-8"))
+        except (ValueError, UnicodeDecodeError):
+            self.send_response(400)
+            self.end_headers()
+            return
+        
+        # Responder enseguida: el comando corre en el despachador
+        self.send_response(200)
+        self.end_headers()
+        try:
+            handle_update(update)
+        except Exception as e:
+            print(f"❌ Error procesando update del webhook: {e}")
+    
+    def log_message(self, format, *args):
+        pass  # Silenciar logs de HTTP
+
+def start_http_server():
+    """Servidor HTTP (health check + webhook) en un thread de fondo"""
+    port = int(os.environ.get('PORT', 10000))
+    server = ThreadingHTTPServer(('0.0.0.0', port), BotHTTPHandler)
+    print(f"✅ Health check server running on port {port}")
+    http_thread = threading.Thread(target=server.serve_forever, daemon=True)
+    http_thread.start()
+    return server
+
+def run_webhook():
+    """Modo webhook: el servidor HTTP recibe los updates. Retorna False si no se pudo configurar"""
+    print(f"🤖 Bot iniciado (webhook) - {now_paraguay()}")
+    set_bot_commands()
+    
+    if not set_webhook():
+        return False
+    
+    print("Esperando comandos...")
+    try:
+        while True:
+            time.sleep(60)
+            metrics_buffer.flush_if_due()
+    except KeyboardInterrupt:
+        print("\n👋 Bot detenido por el usuario")
+        get_dispatcher().shutdown(wait=False)
+        report_pool.shutdown(wait=False)
+    return True
+
 def run_bot():
     """Ejecuta el bot en modo polling"""
     print(f"🤖 Bot iniciado - {now_paraguay()}")
@@ -281,6 +645,9 @@ def run_bot():
     # Configurar comandos del bot
     set_bot_commands()
     
+    # getUpdates no funciona mientras haya un webhook registrado
+    delete_webhook()
+    
     print("Esperando comandos...")
     
     offset = load_last_update_id() + 1
@@ -290,33 +657,44 @@ def run_bot():
             updates = get_telegram_updates(offset=offset)
             
             if updates and updates.get("ok"):
-                for update in updates.get("result", []):
-                    update_id = update.get("update_id")
-                    message = update.get("message", {})
-                    text = message.get("text", "")
-                    chat_id = message.get("chat", {}).get("id")
-                    chat_type = message.get("chat", {}).get("type", "")
-                    
-                    # Procesar comandos de cualquier chat privado O del canal/grupo configurado
-                    if text.startswith("/") and (chat_type == "private" or str(chat_id) == str(CHAT_ID)):
-                        print(f"📩 Comando recibido de {chat_id}: {text}")
-                        # Enviar respuesta al mismo chat que envió el comando
-                        process_command(text, chat_id)
-                    
-                    # Actualizar offset
-                    offset = update_id + 1
-                    save_last_update_id(update_id)
-            
-            time.sleep(1)  # Esperar 1 segundo antes de la próxima consulta
+                batch = updates.get("result", [])
+                if batch:
+                    # Checkpoint una sola vez por lote y ANTES de despachar: un corte
+                    # entre lotes nunca vuelve a ejecutar comandos ya recibidos
+                    last_id = max(u.get("update_id", 0) for u in batch)
+                    offset = last_id + 1
+                    save_last_update_id(last_id)
+                
+                for update in batch:
+                    handle_update(update)
+            else:
+                time.sleep(1)  # getUpdates falló: esperar antes de reintentar
+            # Con respuesta OK no se espera: getUpdates ya hace long polling (timeout=30)
+            metrics_buffer.flush_if_due()
         
         except KeyboardInterrupt:
             print("\n👋 Bot detenido por el usuario")
+            get_dispatcher().shutdown(wait=False)
+            report_pool.shutdown(wait=False)
             break
         except Exception as e:
             print(f"❌ Error en el bot: {e}")
             time.sleep(5)  # Esperar 5 segundos antes de reintentar
 
 if __name__ == "__main__":
+    import sys
+    
+    # Registro manual del webhook: python telegram_bot_handler.py --set-webhook / --delete-webhook
+    if "--set-webhook" in sys.argv:
+        if not os.environ.get("WEBHOOK_SECRET"):
+            print("❌ Configura WEBHOOK_SECRET para registrar el webhook manualmente")
+            exit(1)
+        exit(0 if set_webhook() else 1)
+    if "--delete-webhook" in sys.argv:
+        ok = delete_webhook()
+        print("✅ Webhook eliminado" if ok else "❌ No se pudo eliminar el webhook")
+        exit(0 if ok else 1)
+    
     # Verificar que las dependencias estén instaladas
     try:
         import pandas
@@ -331,27 +709,12 @@ if __name__ == "__main__":
         print("❌ Error: Falta configurar BOT_TOKEN y CHAT_ID en .env")
         exit(1)
     
-    # Health check handler para Render
-    class HealthCheckHandler(BaseHTTPRequestHandler):
-        def do_GET(self):
-            self.send_response(200)
-            self.send_header('Content-type', 'text/plain')
-            self.end_headers()
-            self.wfile.write(b'Bot is running')
-        
-        def log_message(self, format, *args):
-            pass  # Silenciar logs de HTTP
-    
-    # Iniciar servidor HTTP en thread separado para health checks
-    def start_http_server():
-        port = int(os.environ.get('PORT', 10000))
-        server = HTTPServer(('0.0.0.0', port), HealthCheckHandler)
-        print(f"✅ Health check server running on port {port}")
-        server.serve_forever()
-    
-    # Iniciar servidor HTTP en background
-    http_thread = threading.Thread(target=start_http_server, daemon=True)
-    http_thread.start()
+    # Iniciar servidor HTTP en background (health check para Render + webhook)
+    start_http_server()
     
-    # Iniciar bot (este es el proceso principal)
+    # Iniciar bot (este es el proceso principal); polling queda como respaldo del webhook
+    if BOT_MODE == "webhook":
+        if run_webhook():
+            exit(0)
+        print("⚠️ Webhook no disponible, usando polling")
     run_bot()
@@ -0,0 +1,282 @@
+"""
+Cola de envío a la API de Telegram con control de tasa
+
+- Token bucket global (~30 msg/s) y por chat (1 msg/s privado, 20 msg/min grupos)
+- Respeta el retry_after de las respuestas 429 y reintenta errores de red
+- Prioridad: alertas críticas > respuestas a comandos > reportes rutinarios
+- Conexiones HTTP reutilizadas (requests.Session con pool)
+- Un solo envío en curso por chat, así los mensajes de un chat llegan en orden
+"""
+import os
+import time
+import threading
+from concurrent.futures import Future
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import record_call, active_run
+
+PRIORITY_CRITICAL = 0
+PRIORITY_REPLY = 1
+PRIORITY_ROUTINE = 2
+
+DEFAULT_API_URL = "https://api.telegram.org"
+
+GLOBAL_RATE = 25            # msg/s (límite de Telegram: 30)
+PRIVATE_CHAT_RATE = 1.0     # msg/s por chat privado
+GROUP_CHAT_RATE = 20 / 60   # msg/s por grupo/canal
+CHAT_BURST = 3              # mensajes seguidos permitidos antes de aplicar la tasa
+MAX_ATTEMPTS = 5
+
+
+class TokenBucket:
+    """Token bucket clásico: rate tokens/segundo, hasta capacity acumulados"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        """Segundos hasta que haya un token disponible (0 = disponible ya)"""
+        self._refill(now)
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+    def block(self, seconds, now):
+        """Bloquea el bucket (ej: por un 429 con retry_after)"""
+        self.blocked_until = max(self.blocked_until, now + seconds)
+        self.tokens = 0
+
+
+class _Job:
+    __slots__ = ("priority", "seq", "method", "data", "files", "chat_id",
+                 "timeout", "attempts", "not_before", "future", "run")
+
+    def __init__(self, priority, seq, method, data, files, chat_id, timeout, run=None):
+        self.priority = priority
+        self.seq = seq
+        self.method = method
+        self.data = data
+        self.files = files
+        self.chat_id = chat_id
+        self.timeout = timeout
+        self.attempts = 0
+        self.not_before = 0.0
+        self.future = Future()
+        self.run = run   # métricas de quien encoló (los threads de envío no heredan el contexto)
+
+
+class TelegramSender:
+    """
+    Cola compartida de llamadas salientes a la API de Telegram
+
+    Args:
+        token: BOT_TOKEN del bot
+        workers: threads de envío (permite subir un Excel sin frenar los mensajes)
+    """
+
+    def __init__(self, token, workers=3, api_url=DEFAULT_API_URL):
+        self.base_url = f"{api_url}/bot{token}"
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=workers)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.global_bucket = TokenBucket(GLOBAL_RATE, GLOBAL_RATE)
+        self.chat_buckets = {}
+        self._jobs = []
+        self._inflight_chats = set()
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._threads = []
+        self._workers = workers
+
+    # ---------------- API pública ----------------
+    def call(self, method, data=None, files=None, chat_id=None,
+             priority=PRIORITY_REPLY, wait=True, timeout=30):
+        """
+        Encola una llamada a la API de Telegram
+
+        Args:
+            method: método de la API (ej: "sendMessage")
+            data: parámetros del método
+            files: {campo: ruta_de_archivo} para subir archivos
+            chat_id: chat destino (para el límite por chat); por defecto data["chat_id"]
+            wait: si es True espera y retorna la respuesta JSON (None si falló);
+                  si es False retorna un Future
+        """
+        data = dict(data or {})
+        if chat_id is None:
+            chat_id = data.get("chat_id")
+        self._ensure_workers()
+        with self._cond:
+            self._seq += 1
+            job = _Job(priority, self._seq, method, data, files, chat_id, timeout, active_run())
+            self._jobs.append(job)
+            self._cond.notify()
+        if wait:
+            return job.future.result()
+        return job.future
+
+    def send_message(self, chat_id, text, priority=PRIORITY_REPLY, wait=True, **extra):
+        data = {"chat_id": chat_id, "text": text}
+        data.update(extra)
+        return self.call("sendMessage", data, priority=priority, wait=wait)
+
+    def send_document(self, chat_id, file_path=None, caption=None, priority=PRIORITY_REPLY,
+                      wait=True, file_id=None):
+        """Sube un archivo, o reenvía uno ya subido si se pasa su file_id"""
+        data = {"chat_id": chat_id}
+        if caption:
+            data["caption"] = caption
+        if file_id:
+            data["document"] = file_id
+            return self.call("sendDocument", data, priority=priority, wait=wait)
+        return self.call("sendDocument", data, files={"document": file_path},
+                         priority=priority, wait=wait, timeout=60)
+
+    def flush(self, timeout=None):
+        """Espera a que la cola quede vacía. Retorna False si venció el timeout"""
+        deadline = time.monotonic() + timeout if timeout else None
+        with self._cond:
+            while self._jobs or self._inflight_chats:
+                remaining = deadline - time.monotonic() if deadline else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining if remaining is not None else 1.0)
+        return True
+
+    def pending(self):
+        with self._cond:
+            return len(self._jobs)
+
+    # ---------------- Interno ----------------
+    def _ensure_workers(self):
+        with self._cond:
+            if self._threads:
+                return
+            for i in range(self._workers):
+                t = threading.Thread(target=self._worker, name=f"tg-sender-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            # Los chat_id negativos son grupos/canales (límite más estricto)
+            is_group = str(chat_id).startswith("-")
+            bucket = TokenBucket(GROUP_CHAT_RATE if is_group else PRIVATE_CHAT_RATE, CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _next_job_locked(self):
+        """Elige el trabajo de mayor prioridad que se pueda enviar ya; si no hay, cuánto esperar"""
+        now = time.monotonic()
+        global_wait = self.global_bucket.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+
+        min_wait = None
+        for job in sorted(self._jobs, key=lambda j: (j.priority, j.seq)):
+            if job.chat_id in self._inflight_chats:
+                continue
+            wait = max(job.not_before - now, 0.0)
+            if job.chat_id is not None:
+                wait = max(wait, self._chat_bucket(job.chat_id).wait_time(now))
+            if wait <= 0:
+                self._jobs.remove(job)
+                self.global_bucket.consume(now)
+                if job.chat_id is not None:
+                    self._chat_bucket(job.chat_id).consume(now)
+                    self._inflight_chats.add(job.chat_id)
+                return job, 0.0
+            if min_wait is None or wait < min_wait:
+                min_wait = wait
+        return None, min_wait
+
+    def _worker(self):
+        while True:
+            with self._cond:
+                job, wait = self._next_job_locked()
+                while job is None:
+                    self._cond.wait(wait)
+                    job, wait = self._next_job_locked()
+
+            result, retry_after = self._send(job)
+
+            with self._cond:
+                self._inflight_chats.discard(job.chat_id)
+                now = time.monotonic()
+                if retry_after is not None and job.attempts < MAX_ATTEMPTS:
+                    # Reencolar con el mismo seq para mantener el orden del chat
+                    job.not_before = now + retry_after
+                    if job.chat_id is not None:
+                        self._chat_bucket(job.chat_id).block(retry_after, now)
+                    self._jobs.append(job)
+                else:
+                    job.future.set_result(result)
+                self._cond.notify_all()
+
+    def _send(self, job):
+        """Hace la llamada HTTP. Retorna (respuesta, segundos_para_reintentar o None)"""
+        job.attempts += 1
+        url = f"{self.base_url}/{job.method}"
+        opened = []
+        start = time.monotonic()
+        ok = False
+        try:
+            files = None
+            if job.files:
+                files = {}
+                for field, path in job.files.items():
+                    fh = open(path, "rb")
+                    opened.append(fh)
+                    files[field] = fh
+            response = self.session.post(url, data=job.data, files=files, timeout=job.timeout)
+            result = response.json()
+            ok = response.status_code == 200
+        except Exception as e:
+            print(f"Error enviando a Telegram ({job.method}, intento {job.attempts}): {e}")
+            return None, min(2 ** job.attempts, 30)
+        finally:
+            for fh in opened:
+                fh.close()
+            record_call(f"telegram/{job.method}", (time.monotonic() - start) * 1000, ok,
+                        retry=job.attempts > 1, run=job.run)
+
+        if response.status_code == 429 or result.get("error_code") == 429:
+            retry_after = (result.get("parameters") or {}).get("retry_after", 1)
+            print(f"⏳ Telegram 429 en chat {job.chat_id}: reintento en {retry_after}s")
+            return result, float(retry_after)
+        if response.status_code >= 500:
+            return result, min(2 ** job.attempts, 30)
+        return result, None
+
+
+_sender = None
+_sender_lock = threading.Lock()
+
+
+def get_sender():
+    """Instancia compartida por proceso (usa BOT_TOKEN y TELEGRAM_API_URL del entorno)"""
+    global _sender
+    with _sender_lock:
+        if _sender is None:
+            _sender = TelegramSender(os.environ.get("BOT_TOKEN"),
+                                     api_url=os.environ.get("TELEGRAM_API_URL", DEFAULT_API_URL))
+        return _sender
@@ -0,0 +1,147 @@
+"""
+Pronóstico de tiempo hasta el umbral para temperatura de aceite y de contenedor
+
+Ajusta una tendencia robusta (pendiente de Theil–Sen: mediana de las pendientes
+entre todos los pares de muestras) sobre la ventana reciente de cada contenedor
+y proyecta cuándo se cruzaría el umbral. Si es dentro del horizonte configurado
+se emite una alerta temprana, antes de que salte la alerta de temperatura alta.
+
+Cuando la lectura ya está en el umbral no se emite pronóstico (lo cubre la regla
+de temperatura), pero el pronóstico activo tampoco se resuelve: solo se despeja
+con una lectura claramente bajo el umbral y sin tendencia al alza.
+"""
+import numpy as np
+
+FORECAST_HORIZON_MIN = 60    # alertar si el umbral se cruzaría dentro de estos minutos
+FORECAST_MIN_SAMPLES = 6     # muestras mínimas en la ventana para ajustar tendencia
+FORECAST_MIN_SLOPE = 0.5     # °C/h - pendientes menores se consideran estables
+FORECAST_CLEAR_MARGIN = 2.0  # °C bajo el umbral para dar por resuelto el pronóstico
+CONTAINER_TEMP_THRESHOLD = 50  # °C - umbral de temperatura de contenedor (no tiene regla propia)
+
+# Métricas pronosticadas: umbral tomado de la regla de alerta (con overrides) o fijo
+FORECAST_METRICS = {
+    "oil_temp": {"label": "Temp. aceite", "rule": "temp"},
+    "container_temp": {"label": "Temp. contenedor", "threshold": CONTAINER_TEMP_THRESHOLD},
+}
+
+
+def forecast_type(metric):
+    """Tipo de alerta para el AlertTracker (ej: "forecast_oil_temp")"""
+    return f"forecast_{metric}"
+
+
+def theil_sen(t, y):
+    """
+    Pendiente e intercepto de Theil–Sen (vectorizado sobre todos los pares)
+
+    Returns:
+        (pendiente, intercepto) o (None, None) con menos de 2 puntos distintos
+    """
+    i, j = np.triu_indices(len(t), k=1)
+    dt = t[j] - t[i]
+    mask = dt != 0
+    if not mask.any():
+        return None, None
+    slope = float(np.median((y[j] - y[i])[mask] / dt[mask]))
+    intercept = float(np.median(y - slope * t))
+    return slope, intercept
+
+
+def time_to_threshold(t, y, threshold, min_samples=FORECAST_MIN_SAMPLES, min_slope=FORECAST_MIN_SLOPE):
+    """
+    Minutos estimados hasta que la serie cruce `threshold` (subiendo)
+
+    Args:
+        t: tiempos en segundos (epoch)
+        y: valores
+    Returns:
+        (minutos, pendiente °C/h, valor ajustado actual) o None si no hay tendencia al alza
+    """
+    if len(t) < min_samples:
+        return None
+    # Tiempos relativos a la última muestra (mejor condicionamiento numérico)
+    hours = (t - t[-1]) / 3600.0
+    slope, intercept = theil_sen(hours, y)
+    if slope is None or slope < min_slope:
+        return None
+    level = intercept  # valor ajustado en la última muestra (hours = 0)
+    minutes = max(0.0, (threshold - level) / slope * 60)
+    return minutes, slope, level
+
+
+class TempForecaster:
+    """
+    Args:
+        rules: RuleEngine (para tomar el umbral de temperatura de cada contenedor)
+        horizon_min: horizonte de alerta temprana en minutos
+        metrics: {métrica: {"label", "rule" o "threshold"}}
+    """
+
+    def __init__(self, rules=None, horizon_min=FORECAST_HORIZON_MIN, metrics=None,
+                 min_samples=FORECAST_MIN_SAMPLES, min_slope=FORECAST_MIN_SLOPE,
+                 clear_margin=FORECAST_CLEAR_MARGIN):
+        self.rules = rules
+        self.horizon_min = horizon_min
+        self.metrics = metrics or FORECAST_METRICS
+        self.min_samples = min_samples
+        self.min_slope = min_slope
+        self.clear_margin = clear_margin
+
+    def threshold(self, container, metric):
+        conf = self.metrics[metric]
+        if self.rules is not None and conf.get("rule") in self.rules.types:
+            rule = self.rules.rule_for(container, self.rules.types.index(conf["rule"]))
+            return float(rule["value"]) if rule.get("enabled", True) else None
+        return conf.get("threshold")
+
+    def process(self, window, snapshot):
+        """
+        Eventos de alerta temprana ({container, type, message, baseline}) para los
+        contenedores ONLINE cuya temperatura cruzaría el umbral dentro del horizonte
+        """
+        events = []
+        for container, data in snapshot.items():
+            if not isinstance(data, dict) or data.get("code") != 1:
+                continue
+            for metric, conf in self.metrics.items():
+                threshold = self.threshold(container, metric)
+                current = data.get(metric)
+                if threshold is None or not isinstance(current, (int, float)) or current >= threshold:
+                    continue  # ya en alerta (la cubre la regla de umbral) o sin datos
+                t, y = window.series(container, metric)
+                result = time_to_threshold(t, y, threshold, self.min_samples, self.min_slope)
+                if result is None or result[0] > self.horizon_min:
+                    continue
+                minutes, slope, _ = result
+                events.append({
+                    "container": container,
+                    "type": forecast_type(metric),
+                    "message": (f"⏳ PRONÓSTICO: {container} - {conf['label']} {current}°C subiendo "
+                                f"{slope:.1f}°C/h, llegaría a {threshold:g}°C en ~{minutes:.0f} min"),
+                    "baseline": threshold,
+                })
+        return events
+
+    def clear_checks(self, window):
+        """
+        Chequeos de despeje de los pronósticos para el AlertTracker: la lectura debe estar
+        `clear_margin` bajo el umbral (entrada "baseline") y la tendencia reciente no debe ser al alza
+        """
+        def make_check(metric):
+            def check(data, entry):
+                value = data.get(metric)
+                threshold = entry.get("baseline")
+                if not isinstance(value, (int, float)) or threshold is None:
+                    return False
+                if value >= threshold - self.clear_margin:
+                    return False  # todavía cerca o sobre el umbral (puede estar sonando la regla)
+                # Tendencia de las últimas muestras: la ventana completa sigue al alza un buen
+                # rato después de que la temperatura empezó a bajar
+                t, y = window.series(entry.get("container"), metric)
+                t, y = t[-self.min_samples:], y[-self.min_samples:]
+                if len(t) < self.min_samples:
+                    return True
+                slope, _ = theil_sen((t - t[-1]) / 3600.0, y)
+                return slope is None or slope <= 0
+            return check
+        return {forecast_type(metric): make_check(metric) for metric in self.metrics}
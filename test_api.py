@@ -14,29 +14,31 @@ if env_file.exists():
                 os.environ[key.strip()] = value.strip()
 
 AREA = "10000013"
+# FBOX_BASE_URL permite probar contra fbox_mock_server.py sin red
+FBOX_BASE_URL = os.environ.get("FBOX_BASE_URL", "http://america.fboxdata.com").rstrip("/")
 
 cookies = {
     "lang": "en-us",
     "language": "en",
-    "ssid": os.environ.get("FBOX_SSID"),
-    "Admin-Token": os.environ.get("FBOX_ADMIN_TOKEN")
+    "ssid": os.environ.get("FBOX_SSID", ""),
+    "Admin-Token": os.environ.get("FBOX_ADMIN_TOKEN", "")
 }
 
 headers = {
     "User-Agent": "Mozilla/5.0",
     "Accept": "application/json, text/plain, */*",
-    "Referer": "http://america.fboxdata.com/"
+    "Referer": f"{FBOX_BASE_URL}/"
 }
 
 print("🔍 Testing API connection...")
 print(f"SSID: {cookies['ssid'][:10]}...")
 print(f"Admin-Token: {cookies['Admin-Token'][:10]}...\n")
 
-# Test C01
-container_id = 290
-url = f"http://america.fboxdata.com/api/index/fbox.boxlist/detail?output=json&area_id={AREA}&id={container_id}"
+# Primer contenedor de FBOX_CONTAINERS ("C01:290,C02:291")
+container_name, _, container_id = os.environ.get("FBOX_CONTAINERS", "C01:290").split(",")[0].partition(":")
+url = f"{FBOX_BASE_URL}/api/index/fbox.boxlist/detail?output=json&area_id={AREA}&id={container_id}"
 
-print(f"📡 Testing C01 (ID: {container_id})")
+print(f"📡 Testing {container_name} (ID: {container_id})")
 print(f"URL: {url}\n")
 
 try:
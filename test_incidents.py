@@ -0,0 +1,37 @@
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent))
+
+from incidents import IncidentCorrelator
+
+# Caída de mineros (alerta de flanco): dispara, vuelve a disparar 1 h después
+# (fuera de la ventana del incidente) y se resuelve. Debe quedar un solo incidente, cerrado.
+correlator = IncidentCorrelator(window_minutes=15)
+start = datetime(2026, 10, 19, 10, 0)
+
+def notification(kind):
+    return {"kind": kind, "container": "C01", "type": "miners", "message": f"{kind} C01"}
+
+correlator.process([notification("fire")], now=start)
+correlator.process([notification("fire")], now=start + timedelta(hours=1))
+print(f"Abiertos tras el segundo disparo: {len(correlator.open)}")
+assert len(correlator.open) == 1, correlator.open
+assert correlator.open[0]["alerts"] == 2
+
+correlator.process([notification("resolve")], now=start + timedelta(hours=2))
+print(f"Abiertos tras resolver: {len(correlator.open)} / cerrados: {len(correlator.log)}")
+assert not correlator.open, correlator.open
+assert len(correlator.log) == 1 and correlator.log[0]["end"] is not None
+
+# Estado viejo con el contenedor en dos incidentes abiertos: resolver cierra ambos
+legacy = IncidentCorrelator({"next_id": 3, "open": [
+    {"id": 1, "type": "miners", "label": "miners", "start": 0, "last": 0, "end": None,
+     "members": ["C01"], "active": ["C01"], "alerts": 1},
+    {"id": 2, "type": "miners", "label": "miners", "start": 3600, "last": 3600, "end": None,
+     "members": ["C01"], "active": ["C01"], "alerts": 1},
+]})
+legacy.process([notification("resolve")], now=start)
+assert not legacy.open and len(legacy.log) == 2
+
+print("✅ Incidentes: un disparo repetido no deja incidentes abiertos")
@@ -1,8 +1,24 @@
+import os
 import sys
-sys.path.insert(0, 'c:/Users/cabja/OneDrive/Documents/fbox_telegram_repo')
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent))
 
+import storage
+import telegram_sender
+import fbox_telegram
 from fbox_telegram import generate_weekly_report, send_telegram, save_to_history
-import json
+from fbox_mock_server import start_telegram_stand_in
+
+# Sin efectos sobre el estado real: historial en memoria y Telegram simulado
+# (se configura después de importar fbox_telegram, que carga el .env)
+memory = storage.MemoryStorage()
+storage._default_storage = memory
+fbox_telegram.storage = memory
+telegram_server, telegram_url = start_telegram_stand_in()
+os.environ["TELEGRAM_API_URL"] = telegram_url
+os.environ["BOT_TOKEN"] = "test"
+fbox_telegram.CHAT_ID = "test"
+telegram_sender._sender = None
 
 # Crear datos de prueba
 test_data = {
@@ -43,6 +59,9 @@ print("\n" + "="*60)
 print(weekly_msg)
 print("="*60)
 
-print("\nEnviando a Telegram...")
-send_telegram(weekly_msg)
-print("✅ Reporte semanal de prueba enviado!")
+print("\nEnviando a Telegram (simulado)...")
+result = send_telegram(weekly_msg)
+assert result and result.get("ok"), result
+assert len(memory.read_json(fbox_telegram.HISTORY_FILE, [])) == 50
+telegram_server.shutdown()
+print(f"✅ Reporte semanal de prueba enviado! ({telegram_server.calls} llamada(s) a Telegram simulado)")
@@ -0,0 +1,47 @@
+"""
+Parseo de timestamps del historial (ISO, con o sin zona horaria) a hora de Paraguay
+
+Sin efectos al importar (no carga el .env ni librerías de Excel): lo usan los
+reportes, la exportación y la analítica. within_days es el filtro por días común
+del reporte Excel y de /exportar, para que ambos devuelvan las mismas filas.
+"""
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+import numpy as np
+import pandas as pd
+
+PARAGUAY_TZ = ZoneInfo("America/Asuncion")
+TZ_SUFFIX_PATTERN = r"(?:Z|[+-]\d{2}:?\d{2})$"
+
+
+def parse_timestamps(series):
+    """
+    Parsea timestamps ISO a datetime en hora de Paraguay, de forma vectorizada.
+    Los timestamps sin zona horaria se interpretan como hora local de Paraguay.
+    Los inválidos quedan como NaT.
+    """
+    series = series.astype(str)
+    result = pd.Series(pd.NaT, index=series.index, dtype=f"datetime64[ns, {PARAGUAY_TZ.key}]")
+    aware = series.str.contains(TZ_SUFFIX_PATTERN, regex=True)
+
+    if aware.any():
+        parsed = pd.to_datetime(series[aware], format="ISO8601", utc=True, errors="coerce")
+        result[aware] = parsed.dt.tz_convert(PARAGUAY_TZ)
+    if (~aware).any():
+        parsed = pd.to_datetime(series[~aware], format="ISO8601", errors="coerce")
+        result[~aware] = parsed.dt.tz_localize(PARAGUAY_TZ, ambiguous="NaT", nonexistent="NaT")
+    return result
+
+
+def within_days(series, days, now=None):
+    """
+    Máscara (arreglo NumPy) de los timestamps de los últimos `days` días, con corte
+    exacto a la hora actual (no por fecha). days <= 0 incluye todo; los timestamps
+    inválidos quedan fuera del período. Acepta texto o la salida de parse_timestamps.
+    """
+    if days <= 0:
+        return np.ones(len(series), dtype=bool)
+    now = now or datetime.now(PARAGUAY_TZ)
+    dt = series if isinstance(series.dtype, pd.DatetimeTZDtype) else parse_timestamps(series)
+    return (dt >= now - timedelta(days=days)).to_numpy()
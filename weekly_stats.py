@@ -0,0 +1,170 @@
+"""
+Estadísticas semanales como agregados móviles por contenedor y día
+
+Cada muestra del historial y cada alerta se suman a un bucket diario
+(weekly_stats.json) al momento de guardarse. El reporte semanal solo suma
+los últimos 7 buckets: no recorre el historial.
+"""
+import re
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+PARAGUAY_TZ = ZoneInfo("America/Asuncion")
+WEEKLY_STATS_FILE = "weekly_stats.json"
+WEEKLY_DAYS = 7
+RETENTION_DAYS = 8  # un día de margen para la ventana móvil
+
+CONTAINER_PATTERN = re.compile(r"\b(C\d{2,})\b")
+
+# Posiciones dentro de cada bucket diario
+SAMPLES, OIL_SUM, OIL_N, OIL_MAX, MINERS_MIN, HASH_SUM, HASH_N, POWER_SUM, POWER_N, ALERTS = range(10)
+
+
+def _empty_bucket():
+    return [0, 0.0, 0, None, None, 0.0, 0, 0.0, 0, 0]
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else None
+
+
+def _day(timestamp):
+    """Día 'YYYY-MM-DD' de un timestamp ISO (hora de Paraguay) o datetime"""
+    if isinstance(timestamp, datetime):
+        return timestamp.astimezone(PARAGUAY_TZ).strftime("%Y-%m-%d")
+    return str(timestamp)[:10]
+
+
+class WeeklyStats:
+    """
+    Args:
+        data: estado persistido {contenedor: {día: bucket}}
+    """
+
+    def __init__(self, data=None):
+        self.days = data if isinstance(data, dict) else {}
+        self.changed = False
+
+    @classmethod
+    def load(cls, storage):
+        return cls(storage.read_json(WEEKLY_STATS_FILE, {}))
+
+    def save(self, storage):
+        """Guarda solo si hubo cambios"""
+        if self.changed:
+            self._prune()
+            storage.write_json(WEEKLY_STATS_FILE, self.days)
+            self.changed = False
+
+    @property
+    def empty(self):
+        return not self.days
+
+    def _bucket(self, container, day):
+        per_container = self.days.setdefault(container, {})
+        if day not in per_container:
+            per_container[day] = _empty_bucket()
+        return per_container[day]
+
+    def add_sample(self, timestamp, state):
+        """Suma una muestra {contenedor: datos} del historial de estados"""
+        day = _day(timestamp)
+        for container, data in state.items():
+            if not isinstance(data, dict):
+                continue
+            b = self._bucket(container, day)
+            b[SAMPLES] += 1
+
+            oil = _number(data.get("oil_temp"))
+            if oil is not None:
+                b[OIL_SUM] += oil
+                b[OIL_N] += 1
+                b[OIL_MAX] = oil if b[OIL_MAX] is None else max(b[OIL_MAX], oil)
+
+            miners = _number(data.get("miner_online"))
+            if miners is not None:
+                b[MINERS_MIN] = miners if b[MINERS_MIN] is None else min(b[MINERS_MIN], miners)
+
+            hashrate = _number(data.get("hashrate_ph"))
+            if hashrate is not None:
+                b[HASH_SUM] += hashrate
+                b[HASH_N] += 1
+
+            power = _number(data.get("power_kw"))
+            if power is not None:
+                b[POWER_SUM] += power
+                b[POWER_N] += 1
+        self.changed = True
+
+    def add_alerts(self, timestamp, alerts):
+        """Cuenta alertas por contenedor (según los nombres C01, C02... del mensaje;
+        un incidente cuenta una alerta para cada contenedor afectado)"""
+        day = _day(timestamp)
+        for alert in alerts:
+            for container in dict.fromkeys(CONTAINER_PATTERN.findall(str(alert))):
+                self._bucket(container, day)[ALERTS] += 1
+                self.changed = True
+
+    def _prune(self):
+        cutoff = (datetime.now(PARAGUAY_TZ) - timedelta(days=RETENTION_DAYS)).strftime("%Y-%m-%d")
+        for per_container in self.days.values():
+            for day in [d for d in per_container if d < cutoff]:
+                del per_container[day]
+
+    def totals(self, days=WEEKLY_DAYS, now=None):
+        """
+        Estadísticas de los últimos `days` días por contenedor
+
+        Returns:
+            {contenedor: {"samples", "avg_oil_temp", "max_oil_temp", "min_miners",
+                          "avg_hashrate", "avg_power", "alerts"}}
+        """
+        start = ((now or datetime.now(PARAGUAY_TZ)) - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        result = {}
+        for container in sorted(self.days):
+            t = _empty_bucket()
+            for day, b in self.days[container].items():
+                if day < start:
+                    continue
+                for i in (SAMPLES, OIL_SUM, OIL_N, HASH_SUM, HASH_N, POWER_SUM, POWER_N, ALERTS):
+                    t[i] += b[i]
+                if b[OIL_MAX] is not None:
+                    t[OIL_MAX] = b[OIL_MAX] if t[OIL_MAX] is None else max(t[OIL_MAX], b[OIL_MAX])
+                if b[MINERS_MIN] is not None:
+                    t[MINERS_MIN] = b[MINERS_MIN] if t[MINERS_MIN] is None else min(t[MINERS_MIN], b[MINERS_MIN])
+            if not t[SAMPLES] and not t[ALERTS]:
+                continue
+            result[container] = {
+                "samples": t[SAMPLES],
+                "avg_oil_temp": round(t[OIL_SUM] / t[OIL_N], 1) if t[OIL_N] else None,
+                "max_oil_temp": t[OIL_MAX],
+                "min_miners": t[MINERS_MIN],
+                "avg_hashrate": round(t[HASH_SUM] / t[HASH_N], 2) if t[HASH_N] else None,
+                "avg_power": round(t[POWER_SUM] / t[POWER_N], 1) if t[POWER_N] else None,
+                "alerts": t[ALERTS],
+            }
+        return result
+
+    def format_report(self, days=WEEKLY_DAYS, now=None):
+        """Reporte semanal para Telegram"""
+        now = now or datetime.now(PARAGUAY_TZ)
+        start = now - timedelta(days=days - 1)
+        stats = self.totals(days, now)
+
+        msg = "📊 REPORTE SEMANAL FBOX\n"
+        msg += f"📅 {start.strftime('%d/%m/%Y')} - {now.strftime('%d/%m/%Y')}\n"
+        msg += "━━━━━━━━━━━━━━━━━━━━━━━━\n"
+        if not stats:
+            return msg + "\n📊 Todavía no hay datos de esta semana."
+
+        def fmt(value, suffix=""):
+            return "N/A" if value is None else f"{value}{suffix}"
+
+        for container, s in stats.items():
+            msg += f"\n📦 {container} ({s['samples']} muestras)\n"
+            msg += f"  🌡️ Temp aceite: prom {fmt(s['avg_oil_temp'], '°C')} | máx {fmt(s['max_oil_temp'], '°C')}\n"
+            msg += f"  ⛏️ Mineros online mínimo: {fmt(s['min_miners'])}\n"
+            msg += f"  💎 Hashrate prom: {fmt(s['avg_hashrate'], ' PH/s')}\n"
+            msg += f"  ⚡ Potencia prom: {fmt(s['avg_power'], ' kW')}\n"
+            msg += f"  🚨 Alertas: {s['alerts']}\n"
+        return msg